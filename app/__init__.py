@@ -432,9 +432,12 @@ def register_blueprints(app: Flask) -> None:
     app.register_blueprint(scheduler_bp, url_prefix='/scheduler')
     app.register_blueprint(sync_sessions_bp, url_prefix='/sync_sessions')
 
-    # 初始化定时任务调度器
+    # 初始化定时任务调度器（同步工作进程等独立进程通过 ENABLE_SCHEDULER=false 关闭）
     from app.scheduler import init_scheduler
 
+    if os.getenv("ENABLE_SCHEDULER", "true").lower() != "true":
+        return
+
     try:
         init_scheduler(app)
     except Exception as e:
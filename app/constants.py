@@ -114,6 +114,13 @@ class SystemConstants:
     MAX_CONNECTIONS = 20
     CONNECTION_RETRY_ATTEMPTS = 3
 
+    # 远程实例连接池常量
+    CONNECTION_POOL_MAX_SIZE = 4  # 每个实例（凭据版本）最大连接数
+    CONNECTION_POOL_IDLE_TIMEOUT = 300  # 空闲5分钟回收
+    CONNECTION_POOL_MAX_LIFETIME = 1800  # 最长存活30分钟
+    CONNECTION_POOL_WAIT_TIMEOUT = 30  # 等待可用连接的最长秒数
+    CONNECTION_POOL_SWEEP_INTERVAL = 60  # 扫描所有池键回收过期空闲连接的最短间隔秒数
+
     # 速率限制常量
     RATE_LIMIT_REQUESTS = 1000
     RATE_LIMIT_WINDOW = 300  # 5分钟
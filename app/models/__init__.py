@@ -16,10 +16,13 @@ from .credential import Credential
 # 新增模型
 from .global_param import GlobalParam
 from .instance import Instance
+from .instance_sync_state import InstanceSyncState
 from .permission_config import PermissionConfig
+from .permission_snapshot import PermissionSnapshot
 
 # 移除SyncData导入，使用新的优化同步模型
 from .sync_instance_record import SyncInstanceRecord
+from .sync_job import SyncJob
 from .sync_session import SyncSession
 
 # 导入所有模型
@@ -35,10 +38,13 @@ __all__ = [
     # 移除SyncData导出
     "SyncSession",
     "SyncInstanceRecord",
+    "InstanceSyncState",
+    "SyncJob",
     "AccountClassification",
     "ClassificationRule",
     "AccountClassificationAssignment",
     "ClassificationBatch",
     "PermissionConfig",
+    "PermissionSnapshot",
     "GlobalParam",
 ]
@@ -2,10 +2,64 @@
 鲸落 - 账户当前状态同步数据模型
 """
 
+from typing import Any
+
 from app import db
 from app.models.base_sync_data import BaseSyncData
+from app.models.permission_snapshot import PermissionSnapshot
 from app.utils.timezone import now
 
+# 由权限快照承载的权限字段（type_specific 等账户自身属性仍保存在行内）
+PERMISSION_FIELDS = (
+    "global_privileges",
+    "database_privileges",
+    "predefined_roles",
+    "role_attributes",
+    "database_privileges_pg",
+    "tablespace_privileges",
+    "server_roles",
+    "server_permissions",
+    "database_roles",
+    "database_permissions",
+    "oracle_roles",
+    "system_privileges",
+    "tablespace_privileges_oracle",
+)
+
+
+def _permission_column(name: str) -> db.Column:
+    """
+    行内权限列：列名不变，列属性名加下划线前缀，由同名的 _PermissionField 描述符对外提供访问；
+    None 写入 SQL NULL（而非 JSON null），引用权限快照的行内权限列为空
+    """
+    return db.Column(name, db.JSON(none_as_null=True), key=f"_{name}", nullable=True)
+
+
+class _PermissionField:
+    """
+    权限字段描述符
+
+    行内列有值时返回行内值（尚未迁移到快照的历史数据），否则从账户引用的权限快照读取；
+    赋值写入行内列。类级访问返回行内列属性。
+    """
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+        self.column_key = f"_{name}"
+
+    def __get__(self, obj: Any, owner: type) -> Any:  # noqa: ANN401
+        if obj is None:
+            return getattr(owner, self.column_key)
+        value = getattr(obj, self.column_key)
+        if value is None and obj.permission_digest:
+            snapshot = obj.permission_snapshot
+            if snapshot is not None:
+                return (snapshot.permissions or {}).get(self.name)
+        return value
+
+    def __set__(self, obj: Any, value: Any) -> None:  # noqa: ANN401
+        setattr(obj, self.column_key, value)
+
 
 class CurrentAccountSyncData(BaseSyncData):
     """账户当前状态表（支持复杂权限结构）"""
@@ -24,29 +78,56 @@ class CurrentAccountSyncData(BaseSyncData):
     is_active = db.Column(db.Boolean, default=True, nullable=True)
 
     # MySQL权限字段
-    global_privileges = db.Column(db.JSON, nullable=True)  # MySQL全局权限
-    database_privileges = db.Column(db.JSON, nullable=True)  # MySQL数据库权限
+    _global_privileges = _permission_column("global_privileges")  # MySQL全局权限
+    _database_privileges = _permission_column("database_privileges")  # MySQL数据库权限
 
     # PostgreSQL权限字段
-    predefined_roles = db.Column(db.JSON, nullable=True)  # PostgreSQL预定义角色
-    role_attributes = db.Column(db.JSON, nullable=True)  # PostgreSQL角色属性
-    database_privileges_pg = db.Column(db.JSON, nullable=True)  # PostgreSQL数据库权限
-    tablespace_privileges = db.Column(db.JSON, nullable=True)  # PostgreSQL表空间权限
+    _predefined_roles = _permission_column("predefined_roles")  # PostgreSQL预定义角色
+    _role_attributes = _permission_column("role_attributes")  # PostgreSQL角色属性
+    _database_privileges_pg = _permission_column("database_privileges_pg")  # PostgreSQL数据库权限
+    _tablespace_privileges = _permission_column("tablespace_privileges")  # PostgreSQL表空间权限
 
     # SQL Server权限字段
-    server_roles = db.Column(db.JSON, nullable=True)  # SQL Server服务器角色
-    server_permissions = db.Column(db.JSON, nullable=True)  # SQL Server服务器权限
-    database_roles = db.Column(db.JSON, nullable=True)  # SQL Server数据库角色
-    database_permissions = db.Column(db.JSON, nullable=True)  # SQL Server数据库权限
+    _server_roles = _permission_column("server_roles")  # SQL Server服务器角色
+    _server_permissions = _permission_column("server_permissions")  # SQL Server服务器权限
+    _database_roles = _permission_column("database_roles")  # SQL Server数据库角色
+    _database_permissions = _permission_column("database_permissions")  # SQL Server数据库权限
 
     # Oracle权限字段（移除表空间配额）
-    oracle_roles = db.Column(db.JSON, nullable=True)  # Oracle角色
-    system_privileges = db.Column(db.JSON, nullable=True)  # Oracle系统权限
-    tablespace_privileges_oracle = db.Column(db.JSON, nullable=True)  # Oracle表空间权限
+    _oracle_roles = _permission_column("oracle_roles")  # Oracle角色
+    _system_privileges = _permission_column("system_privileges")  # Oracle系统权限
+    _tablespace_privileges_oracle = _permission_column("tablespace_privileges_oracle")  # Oracle表空间权限
 
     # 通用扩展字段
     type_specific = db.Column(db.JSON, nullable=True)  # 其他类型特定字段
 
+    # 规范化权限数据的SHA-256指纹，同步时指纹一致则跳过逐字段比较
+    permission_hash = db.Column(db.String(64), nullable=True)
+
+    # 引用的权限快照（内容寻址），引用快照时行内权限列为空
+    permission_digest = db.Column(db.String(64), nullable=True, index=True)
+    permission_snapshot = db.relationship(
+        PermissionSnapshot,
+        primaryjoin="foreign(CurrentAccountSyncData.permission_digest) == PermissionSnapshot.digest",
+        viewonly=True,
+        lazy="selectin",
+    )
+
+    # 权限字段访问（行内值优先，否则读取权限快照）
+    global_privileges = _PermissionField()
+    database_privileges = _PermissionField()
+    predefined_roles = _PermissionField()
+    role_attributes = _PermissionField()
+    database_privileges_pg = _PermissionField()
+    tablespace_privileges = _PermissionField()
+    server_roles = _PermissionField()
+    server_permissions = _PermissionField()
+    database_roles = _PermissionField()
+    database_permissions = _PermissionField()
+    oracle_roles = _PermissionField()
+    system_privileges = _PermissionField()
+    tablespace_privileges_oracle = _PermissionField()
+
     # 时间戳和状态字段
     last_sync_time = db.Column(db.DateTime(timezone=True), default=now, index=True)
     last_change_type = db.Column(db.String(20), default="add")  # 'add', 'modify_privilege', 'modify_other', 'delete'
@@ -59,6 +140,16 @@ class CurrentAccountSyncData(BaseSyncData):
     # 关联实例
     instance = db.relationship("Instance", backref="current_account_sync_data")
 
+    @classmethod
+    def snapshot_reference_values(cls, digest: str) -> dict[str, Any]:
+        """
+        引用权限快照时账户行的写入值（按列属性名，可用于 bulk_update_mappings 或直接赋值）：
+        行内权限列置空，permission_digest 指向快照
+        """
+        values: dict[str, Any] = {f"_{field}": None for field in PERMISSION_FIELDS}
+        values["permission_digest"] = digest
+        return values
+
     def __repr__(self) -> str:
         return f"<CurrentAccountSyncData {self.username}@{self.db_type}>"
 
@@ -84,6 +175,8 @@ class CurrentAccountSyncData(BaseSyncData):
                 "system_privileges": self.system_privileges,
                 "tablespace_privileges_oracle": self.tablespace_privileges_oracle,
                 "type_specific": self.type_specific,
+                "permission_hash": self.permission_hash,
+                "permission_digest": self.permission_digest,
                 "last_sync_time": (self.last_sync_time.isoformat() if self.last_sync_time else None),
                 "last_change_type": self.last_change_type,
                 "last_change_time": (self.last_change_time.isoformat() if self.last_change_time else None),
@@ -126,6 +219,12 @@ class CurrentAccountSyncData(BaseSyncData):
             }
         return {}
 
+    def get_privilege_bits(self) -> Any:  # noqa: ANN401
+        """获取以 PermissionConfig 为字典编码的权限位图（PrivilegeBits）"""
+        from app.services.privilege_bitset import privilege_bitset_service
+
+        return privilege_bitset_service.bits_for_account(self)
+
     def get_can_grant_status(self) -> bool:
         """获取账户是否有授权权限"""
         try:
@@ -0,0 +1,66 @@
+"""
+鲸落 - 实例同步状态模型
+"""
+
+from app import db
+from app.utils.timezone import now
+
+
+class InstanceSyncState(db.Model):
+    """实例同步状态表 - 记录每个实例的账户目录变更令牌、同步节奏统计和同步租约，用于跳过无变化的同步、按需调度和单实例互斥"""
+
+    __tablename__ = "instance_sync_states"
+
+    id = db.Column(db.Integer, primary_key=True)
+    instance_id = db.Column(
+        db.Integer, db.ForeignKey("instances.id", ondelete="CASCADE"), nullable=False, unique=True, index=True
+    )
+    account_catalog_token = db.Column(db.String(64), nullable=True)  # 最近一次全量同步时的目录变更令牌
+    last_full_sync_at = db.Column(db.DateTime(timezone=True), nullable=True)  # 最近一次全量同步完成时间
+    # 同步节奏统计（自适应调度）
+    last_sync_at = db.Column(db.DateTime(timezone=True), nullable=True)  # 最近一次成功同步完成时间
+    change_rate_per_hour = db.Column(db.Float, nullable=True)  # 账户变更频率（次/小时，指数平滑）
+    avg_sync_seconds = db.Column(db.Float, nullable=True)  # 平均同步耗时（秒，指数平滑）
+    failure_streak = db.Column(db.Integer, nullable=False, default=0)  # 连续失败次数
+    sync_interval_seconds = db.Column(db.Integer, nullable=True)  # 当前同步间隔
+    next_due_at = db.Column(db.DateTime(timezone=True), nullable=True, index=True)  # 下次到期时间
+    # 单实例同步租约（同一实例同一时间只允许一个同步在执行）
+    lease_token = db.Column(db.BigInteger, nullable=False, default=0)  # 防护令牌，每次获取租约递增
+    lease_owner = db.Column(db.String(128), nullable=True)  # 租约持有者
+    lease_expires_at = db.Column(db.DateTime(timezone=True), nullable=True)  # 租约到期时间，为空表示未被持有
+    last_result = db.Column(db.JSON, nullable=True)  # 最近一次持有租约的同步结果摘要（供等待中的请求复用）
+    created_at = db.Column(db.DateTime(timezone=True), default=now)
+    updated_at = db.Column(db.DateTime(timezone=True), default=now, onupdate=now)
+
+    def __repr__(self) -> str:
+        return f"<InstanceSyncState instance_id={self.instance_id}>"
+
+    def to_dict(self) -> dict[str, any]:
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "instance_id": self.instance_id,
+            "account_catalog_token": self.account_catalog_token,
+            "last_full_sync_at": self.last_full_sync_at.isoformat() if self.last_full_sync_at else None,
+            "last_sync_at": self.last_sync_at.isoformat() if self.last_sync_at else None,
+            "change_rate_per_hour": self.change_rate_per_hour,
+            "avg_sync_seconds": self.avg_sync_seconds,
+            "failure_streak": self.failure_streak,
+            "sync_interval_seconds": self.sync_interval_seconds,
+            "next_due_at": self.next_due_at.isoformat() if self.next_due_at else None,
+            "lease_token": self.lease_token,
+            "lease_owner": self.lease_owner,
+            "lease_expires_at": self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            "last_result": self.last_result,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    @staticmethod
+    def get_or_create(instance_id: int) -> "InstanceSyncState":
+        """获取实例同步状态，不存在时创建（不提交，随调用方事务提交）"""
+        state = InstanceSyncState.query.filter_by(instance_id=instance_id).first()
+        if state is None:
+            state = InstanceSyncState(instance_id=instance_id, failure_streak=0)
+            db.session.add(state)
+        return state
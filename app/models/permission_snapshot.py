@@ -0,0 +1,58 @@
+"""
+鲸落 - 权限快照模型
+"""
+
+from datetime import datetime
+
+from app import db
+from app.utils.timezone import now
+
+
+class PermissionSnapshot(db.Model):
+    """权限快照表 - 按内容寻址存储账户的权限字段，权限完全相同的账户引用同一行"""
+
+    __tablename__ = "permission_snapshots"
+
+    digest = db.Column(db.String(64), primary_key=True)  # 规范化权限内容的SHA-256
+    db_type = db.Column(db.String(20), nullable=False, index=True)
+    permissions = db.Column(db.JSON, nullable=False)  # {权限字段: 值}，字段名与账户表的权限列一致
+    privilege_vocabulary = db.Column(db.String(16), nullable=True, index=True)  # 编码位图时的权限字典指纹
+    privilege_bits = db.Column(db.JSON, nullable=True)  # 以 PermissionConfig 为字典的权限位图，见 privilege_bitset
+    created_at = db.Column(db.DateTime(timezone=True), default=now)
+
+    def __repr__(self) -> str:
+        return f"<PermissionSnapshot {self.digest[:12]}@{self.db_type}>"
+
+    @classmethod
+    def delete_unreferenced(cls, created_before: datetime) -> int:
+        """
+        删除没有任何账户（包括已删除账户）引用的权限快照
+
+        只删除 created_before 之前创建的快照：同步写入快照和更新账户引用不在同一语句中，
+        新写入的快照在短时间内可能尚未被引用。
+
+        Args:
+            created_before: 只删除该时间之前创建的快照
+
+        Returns:
+            int: 删除的快照数
+        """
+        from app.models.current_account_sync_data import CurrentAccountSyncData
+
+        referenced = (
+            db.session.query(CurrentAccountSyncData.id)
+            .filter(CurrentAccountSyncData.permission_digest == cls.digest)
+            .exists()
+        )
+        return cls.query.filter(cls.created_at < created_before, ~referenced).delete(synchronize_session=False)
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "digest": self.digest,
+            "db_type": self.db_type,
+            "permissions": self.permissions,
+            "privilege_vocabulary": self.privilege_vocabulary,
+            "privilege_bits": self.privilege_bits,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
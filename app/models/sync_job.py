@@ -0,0 +1,60 @@
+"""
+鲸落 - 同步任务队列模型
+"""
+
+from app import db
+from app.utils.timezone import now
+
+
+class SyncJob(db.Model):
+    """同步任务表 - 队列模式下每个同步轮次为每个实例写入一行，由同步工作进程认领执行"""
+
+    __tablename__ = "sync_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(
+        db.String(36), db.ForeignKey("sync_sessions.session_id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    record_id = db.Column(
+        db.Integer, db.ForeignKey("sync_instance_records.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    instance_id = db.Column(db.Integer, db.ForeignKey("instances.id", ondelete="CASCADE"), nullable=False, index=True)
+    sync_type = db.Column(db.String(20), nullable=False)
+    status = db.Column(
+        db.Enum("pending", "running", "completed", "failed", name="sync_job_status_enum"),
+        nullable=False,
+        default="pending",
+        index=True,
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已认领次数，同时作为租约版本号
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    worker_id = db.Column(db.String(128), nullable=True)  # 当前持有租约的工作进程
+    lease_expires_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    heartbeat_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    started_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=now)
+
+    def __repr__(self) -> str:
+        return f"<SyncJob {self.id} instance_id={self.instance_id} status={self.status}>"
+
+    def to_dict(self) -> dict[str, any]:
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "record_id": self.record_id,
+            "instance_id": self.instance_id,
+            "sync_type": self.sync_type,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "worker_id": self.worker_id,
+            "lease_expires_at": self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            "heartbeat_at": self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+            "error_message": self.error_message,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
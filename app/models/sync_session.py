@@ -5,6 +5,7 @@
 import uuid
 
 from app import db
+from app.utils.sync_profiler import summarize_stage_profiles
 from app.utils.timezone import now
 
 
@@ -33,6 +34,7 @@ class SyncSession(db.Model):
     total_instances = db.Column(db.Integer, default=0)
     successful_instances = db.Column(db.Integer, default=0)
     failed_instances = db.Column(db.Integer, default=0)
+    stage_summary = db.Column(db.JSON)  # 各同步阶段耗时/查询数/行数/内存峰值汇总
     created_by = db.Column(db.Integer)  # 用户ID（手动同步时）
     created_at = db.Column(db.DateTime(timezone=True), default=now)
     updated_at = db.Column(db.DateTime(timezone=True), default=now, onupdate=now)
@@ -74,6 +76,7 @@ class SyncSession(db.Model):
             "total_instances": self.total_instances,
             "successful_instances": self.successful_instances,
             "failed_instances": self.failed_instances,
+            "stage_summary": self.stage_summary,
             "created_by": self.created_by,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
@@ -81,22 +84,29 @@ class SyncSession(db.Model):
 
     def update_statistics(self) -> None:
         """更新统计信息"""
-        records = self.instance_records.all()
+        # 实例记录由其他会话（同步工作线程/进程）提交，不使用身份映射中可能过期的对象
+        records = self.instance_records.populate_existing().all()
         self.total_instances = len(records)
         self.successful_instances = len([r for r in records if r.status == "completed"])
         self.failed_instances = len([r for r in records if r.status == "failed"])
+        self.stage_summary = summarize_stage_profiles((r.sync_details or {}).get("profile") for r in records)
 
-        # 更新状态
-        if self.failed_instances == 0:
-            self.status = "completed"
-        elif self.successful_instances == 0:
-            self.status = "failed"
-        else:
-            self.status = "failed"  # 部分失败也算失败
+        # 更新状态（已取消的会话保持取消状态）
+        if self.status != "cancelled":
+            if self.failed_instances == 0:
+                self.status = "completed"
+            elif self.successful_instances == 0:
+                self.status = "failed"
+            else:
+                self.status = "failed"  # 部分失败也算失败
 
         self.completed_at = now()
         self.updated_at = now()
 
+    def all_instances_finished(self) -> bool:
+        """会话的实例记录是否已全部结束（成功或失败）"""
+        return self.total_instances > 0 and self.successful_instances + self.failed_instances >= self.total_instances
+
     def get_progress_percentage(self) -> float:
         """获取进度百分比"""
         if self.total_instances == 0:
@@ -531,6 +531,7 @@ def auto_classify() -> "Response":
             instance_id=instance_id,
             batch_type=batch_type,
             created_by=current_user.id if current_user.is_authenticated else None,
+            engine=data.get("engine"),
         )
 
         if result.get("success"):
@@ -589,6 +590,7 @@ def auto_classify_optimized() -> "Response":
             instance_id=instance_id,
             batch_type=batch_type,
             created_by=current_user.id if current_user.is_authenticated else None,
+            engine=data.get("engine"),
         )
 
         if result.get("success"):
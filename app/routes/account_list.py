@@ -3,6 +3,8 @@
 鲸落 - 账户管理路由
 """
 
+from typing import Any
+
 from flask import Blueprint, Response, jsonify, render_template, request
 from flask_login import current_user, login_required
 
@@ -10,6 +12,7 @@ from app.models.current_account_sync_data import CurrentAccountSyncData
 from app.models.instance import Instance
 from app.models.tag import Tag
 from app.services.account_sync_service import account_sync_service
+from app.services.privilege_bitset import privilege_bitset_service
 from app.utils.decorators import update_required, view_required
 from app.utils.structlog_config import log_error, log_info
 from app.utils.timezone import now
@@ -18,6 +21,31 @@ from app.utils.timezone import now
 account_list_bp = Blueprint("account_list", __name__)
 
 
+def _filter_by_privilege(
+    query: Any,  # noqa: ANN401
+    db_type: str | None,
+    instance_id: int | None,
+    privilege_field: str,
+    privilege: str,
+) -> Any:  # noqa: ANN401
+    """按权限位图过滤拥有某权限的账户（需指定数据库类型），过滤失败时不过滤"""
+    if not (privilege_field and privilege and db_type and db_type != "all"):
+        return query
+    try:
+        return query.filter(
+            privilege_bitset_service.privilege_condition(db_type, privilege_field, privilege, instance_id=instance_id)
+        )
+    except Exception as e:
+        log_error(
+            "权限过滤失败",
+            module="account_list",
+            privilege_field=privilege_field,
+            privilege=privilege,
+            error=str(e),
+        )
+        return query
+
+
 @account_list_bp.route("/")
 @account_list_bp.route("/<db_type>")
 @login_required
@@ -34,6 +62,8 @@ def list_accounts(db_type: str | None = None) -> str:
     plugin = request.args.get("plugin", "").strip()
     tags = [tag for tag in request.args.getlist("tags") if tag.strip()]
     classification = request.args.get("classification", "").strip()
+    privilege_field = request.args.get("privilege_field", "").strip()
+    privilege = request.args.get("privilege", "").strip()
 
     # 构建查询
     query = CurrentAccountSyncData.query.filter_by(is_deleted=False)
@@ -63,6 +93,9 @@ def list_accounts(db_type: str | None = None) -> str:
     if is_superuser is not None:
         query = query.filter(CurrentAccountSyncData.is_superuser == (is_superuser == "true"))
 
+    # 权限过滤
+    query = _filter_by_privilege(query, db_type, instance_id, privilege_field, privilege)
+
     # 标签过滤
     if tags:
         try:
@@ -182,6 +215,8 @@ def list_accounts(db_type: str | None = None) -> str:
         plugin=plugin,
         selected_tags=tags,
         classification=classification,
+        privilege_field=privilege_field,
+        privilege=privilege,
         instances=instances,
         stats=stats,
         filter_options=filter_options,
@@ -208,6 +243,8 @@ def export_accounts() -> "Response":
     request.args.get("plugin", "").strip()
     request.args.getlist("tags")
     request.args.get("classification", "").strip()
+    privilege_field = request.args.get("privilege_field", "").strip()
+    privilege = request.args.get("privilege", "").strip()
 
     # 构建查询（与list_accounts方法保持一致）
     query = CurrentAccountSyncData.query.filter_by(is_deleted=False)
@@ -237,6 +274,9 @@ def export_accounts() -> "Response":
     if is_superuser is not None:
         query = query.filter(CurrentAccountSyncData.is_superuser == (is_superuser == "true"))
 
+    # 权限过滤
+    query = _filter_by_privilege(query, db_type, instance_id, privilege_field, privilege)
+
     # 排序
     query = query.order_by(CurrentAccountSyncData.username.asc())
 
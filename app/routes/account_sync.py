@@ -23,7 +23,6 @@ from flask_login import current_user, login_required
 from app import db
 from app.models.instance import Instance
 from app.models.sync_session import SyncSession
-from app.services.account_sync_service import account_sync_service
 from app.utils.decorators import update_required, view_required
 from app.utils.structlog_config import get_api_logger, log_error, log_info, log_warning
 
@@ -349,6 +348,8 @@ def sync_records() -> str | Response:
 @update_required
 def sync_all_accounts() -> str | Response | tuple[Response, int]:
     """同步所有实例的账户（使用新的会话管理架构）"""
+    from app.services.account_sync_orchestrator import account_sync_orchestrator
+    from app.services.sync_job_queue import sync_job_queue
     from app.services.sync_session_service import sync_session_service
 
     try:
@@ -384,110 +385,39 @@ def sync_all_accounts() -> str | Response | tuple[Response, int]:
         instance_ids = [inst.id for inst in instances]
         records = sync_session_service.add_instance_records(session.session_id, instance_ids)
 
-        success_count = 0
-        failed_count = 0
-        results = []
-
-        for instance in instances:
-            # 找到对应的记录
-            record = next((r for r in records if r.instance_id == instance.id), None)
-            if not record:
-                continue
-
-            try:
-                # 开始实例同步
-                sync_session_service.start_instance_sync(record.id)
-
-                log_info(
-                    f"开始同步实例: {instance.name}",
-                    module="account_sync",
-                    session_id=session.session_id,
-                    instance_id=instance.id,
-                )
-
-                # 使用统一的账户同步服务
-                result = account_sync_service.sync_accounts(
-                    instance, sync_type="manual_batch", session_id=session.session_id
-                )
-
-                if result["success"]:
-                    success_count += 1
-
-                    # 完成实例同步
-                    sync_session_service.complete_instance_sync(
-                        record.id,
-                        accounts_synced=result.get("synced_count", 0),
-                        accounts_created=result.get("added_count", 0),
-                        accounts_updated=result.get("modified_count", 0),
-                        accounts_deleted=result.get("removed_count", 0),
-                        sync_details=result.get("details", {}),
-                    )
-
-                    # 移除实例同步成功的日志记录，减少日志噪音
-
-                    # 同步会话记录已通过sync_session_service管理，无需额外创建记录
-                else:
-                    failed_count += 1
-
-                    # 标记实例同步失败
-                    sync_session_service.fail_instance_sync(
-                        record.id,
-                        error_message=result.get("error", "同步失败"),
-                        sync_details=result.get("details", {}),
-                    )
-
-                    log_error(
-                        f"实例同步失败: {instance.name}",
-                        module="account_sync",
-                        session_id=session.session_id,
-                        instance_id=instance.id,
-                        error=result.get("error", "同步失败"),
-                    )
-
-                    # 同步会话记录已通过sync_session_service管理，无需额外创建记录
-
-                results.append(
-                    {
-                        "instance_name": instance.name,
-                        "success": result["success"],
-                        "message": result.get("message", result.get("error", "未知错误")),
-                        "synced_count": result.get("synced_count", 0),
-                    }
-                )
-
-            except Exception as e:
-                failed_count += 1
+        # 队列模式：只为每个实例写入任务，由同步工作进程认领执行，结果在同步会话页面查看
+        if sync_job_queue.enabled:
+            jobs = sync_job_queue.enqueue_session(session.session_id, records, "manual_batch")
+            return jsonify(
+                {
+                    "success": True,
+                    "message": f"已创建 {len(jobs)} 个同步任务，由同步工作进程执行",
+                    "session_id": session.session_id,
+                    "queued": True,
+                    "total_instances": len(instances),
+                }
+            )
 
-                # 标记实例同步失败
-                if record:
-                    sync_session_service.fail_instance_sync(
-                        record.id,
-                        error_message=str(e),
-                        sync_details={"exception": str(e)},
-                    )
+        # 并发执行实例同步（线程池 + 按数据库类型/主机限流）
+        summary = account_sync_orchestrator.sync_session_instances(
+            session.session_id, instances, records, sync_type="manual_batch"
+        )
+        success_count = summary["success_count"]
+        failed_count = summary["failed_count"]
+        results = summary["results"]
 
+        for result in results:
+            if not result["success"]:
                 log_error(
-                    f"实例同步异常: {instance.name}",
+                    f"实例同步失败: {result['instance_name']}",
                     module="account_sync",
                     session_id=session.session_id,
-                    instance_id=instance.id,
-                    error=str(e),
-                )
-
-                # 同步会话记录已通过sync_session_service管理，无需额外创建记录
-
-                results.append(
-                    {
-                        "instance_name": instance.name,
-                        "success": False,
-                        "message": f"同步失败: {str(e)}",
-                        "synced_count": 0,
-                    }
+                    error=result["message"],
                 )
 
-        # 完成同步会话
-        session.update_statistics()
-        db.session.commit()
+        # 完成同步会话：实例记录由工作线程在各自的数据库会话中提交，主会话中已加载的对象已过期
+        db.session.expire_all()
+        sync_session_service.update_session_statistics(session.session_id)
 
         # 记录同步完成日志
         log_info(
@@ -7,8 +7,10 @@ import time
 
 import psutil
 from flask import Blueprint, Response
+from flask_login import login_required
 
 from app import cache, db
+from app.services.connection_factory import ConnectionFactory
 from app.utils.api_response import APIResponse
 from app.utils.structlog_config import get_system_logger
 
@@ -76,6 +78,18 @@ def detailed_health_check() -> "Response":
         return APIResponse.server_error("详细健康检查失败")
 
 
+@health_bp.route("/connection-pool")
+@login_required
+def connection_pool_stats() -> "Response":
+    """远程实例连接池统计（命中/未命中/等待）"""
+    try:
+        return APIResponse.success(data=ConnectionFactory.get_pool_stats(), message="获取连接池统计成功")
+    except Exception as e:
+        system_logger = get_system_logger()
+        system_logger.error("获取连接池统计失败", module="health", exception=e)
+        return APIResponse.server_error("获取连接池统计失败")
+
+
 def check_database_health() -> dict:
     """检查数据库健康状态"""
     try:
@@ -313,12 +313,12 @@ def _add_hardcoded_default_jobs() -> None:
     except Exception as e:
         logger.warning("任务已存在，跳过创建: cleanup_logs - %s", str(e))
 
-    # 账户同步 - 每30分钟执行
+    # 账户同步 - 每5分钟检查一次，只同步已到期的实例
     try:
         scheduler.add_job(
             sync_accounts,
             "interval",
-            minutes=30,
+            minutes=5,
             id="sync_accounts",
             name="账户同步",
         )
@@ -0,0 +1,337 @@
+"""
+鲸落 - 账户同步编排器
+以有界线程池并发执行多实例账户同步，按数据库类型和主机限制并发度
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any
+
+import yaml
+from flask import Flask, current_app
+
+from app import db
+from app.models.global_param import GlobalParam
+from app.models.instance import Instance
+from app.models.sync_instance_record import SyncInstanceRecord
+from app.services.account_sync_service import account_sync_service
+from app.services.sync_cadence_service import sync_cadence_service
+from app.services.sync_session_service import sync_session_service
+from app.utils.structlog_config import get_sync_logger
+from app.utils.sync_cancellation import (
+    CANCEL_REASON_DEADLINE,
+    CancellationToken,
+    SyncCancelled,
+    load_cancellation_config,
+    sync_cancellation,
+)
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+
+class AccountSyncOrchestrator:
+    """账户同步编排器 - 并发执行同一会话内的多实例同步"""
+
+    DEFAULT_CONCURRENCY = {
+        "max_workers": 5,
+        "max_per_host": 2,
+        "max_per_db_type": {"default": 5},
+    }
+
+    def __init__(self) -> None:
+        self.sync_logger = get_sync_logger()
+        self._lock = threading.Lock()
+        self._db_type_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._concurrency = self._load_concurrency_config()
+
+    def _load_concurrency_config(self) -> dict[str, Any]:
+        """加载并发配置，配置文件缺失或格式错误时使用默认值"""
+        concurrency = {
+            "max_workers": self.DEFAULT_CONCURRENCY["max_workers"],
+            "max_per_host": self.DEFAULT_CONCURRENCY["max_per_host"],
+            "max_per_db_type": dict(self.DEFAULT_CONCURRENCY["max_per_db_type"]),
+        }
+        if not os.path.exists(CONFIG_FILE):
+            return concurrency
+
+        try:
+            with open(CONFIG_FILE, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            loaded = (config.get("account_sync") or {}).get("concurrency") or {}
+            concurrency["max_workers"] = int(loaded.get("max_workers", concurrency["max_workers"]))
+            concurrency["max_per_host"] = int(loaded.get("max_per_host", concurrency["max_per_host"]))
+            concurrency["max_per_db_type"].update(
+                {db_type: int(limit) for db_type, limit in (loaded.get("max_per_db_type") or {}).items()}
+            )
+        except Exception as e:
+            self.sync_logger.warning(
+                "加载账户同步并发配置失败，使用默认值", module="account_sync_orchestrator", error=str(e)
+            )
+        return concurrency
+
+    def _get_max_workers(self) -> int:
+        """获取工作线程数，全局参数 max_concurrent_syncs 优先于配置文件"""
+        max_workers = self._concurrency["max_workers"]
+        try:
+            param = GlobalParam.query.filter_by(key="max_concurrent_syncs").first()
+            if param and str(param.value).strip():
+                max_workers = int(param.value)
+        except Exception as e:
+            self.sync_logger.warning(
+                "读取max_concurrent_syncs失败，使用配置值", module="account_sync_orchestrator", error=str(e)
+            )
+        return max(1, max_workers)
+
+    def _get_slot(
+        self, slots: dict[str, threading.BoundedSemaphore], key: str, limit: int
+    ) -> threading.BoundedSemaphore:
+        """获取（必要时创建）指定键的并发信号量"""
+        with self._lock:
+            if key not in slots:
+                slots[key] = threading.BoundedSemaphore(max(1, limit))
+            return slots[key]
+
+    @contextmanager
+    def _acquire_slots(self, db_type: str, host: str) -> Iterator[None]:
+        """
+        占用数据库类型和主机并发槽位
+
+        固定按 db_type -> host 的顺序获取，避免交叉等待导致死锁
+        """
+        per_db_type = self._concurrency["max_per_db_type"]
+        db_type_slot = self._get_slot(
+            self._db_type_slots, db_type, per_db_type.get(db_type, per_db_type.get("default", 5))
+        )
+        host_slot = self._get_slot(self._host_slots, host, self._concurrency["max_per_host"])
+        with db_type_slot, host_slot:
+            yield
+
+    @staticmethod
+    def _interleave(instances: list[Instance]) -> list[Instance]:
+        """按主机轮转排序，避免同一主机的实例挤在队首占满工作线程"""
+        by_host: dict[str, list[Instance]] = defaultdict(list)
+        for instance in instances:
+            by_host[instance.host or ""].append(instance)
+
+        ordered: list[Instance] = []
+        queues = list(by_host.values())
+        while queues:
+            for queue in queues:
+                ordered.append(queue.pop(0))
+            queues = [queue for queue in queues if queue]
+        return ordered
+
+    def sync_session_instances(
+        self,
+        session_id: str,
+        instances: list[Instance],
+        records: list[SyncInstanceRecord],
+        sync_type: str,
+    ) -> dict[str, Any]:
+        """
+        并发同步会话内的所有实例
+
+        Args:
+            session_id: 同步会话ID
+            instances: 需要同步的实例列表
+            records: 会话对应的实例记录
+            sync_type: 同步类型 ('manual_batch', 'manual_task', 'scheduled_task')
+
+        Returns:
+            Dict: 汇总结果（成功/失败数量、账户统计及每个实例的结果）
+        """
+        app = current_app._get_current_object()
+        record_ids = {record.instance_id: record.id for record in records}
+        jobs = [
+            {
+                "instance_id": instance.id,
+                "instance_name": instance.name,
+                "db_type": instance.db_type,
+                "host": instance.host or "",
+                "record_id": record_ids[instance.id],
+            }
+            for instance in self._interleave(instances)
+            if instance.id in record_ids
+        ]
+
+        max_workers = min(self._get_max_workers(), max(1, len(jobs)))
+        self.sync_logger.info(
+            "开始并发同步实例",
+            module="account_sync_orchestrator",
+            session_id=session_id,
+            instance_count=len(jobs),
+            max_workers=max_workers,
+        )
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="account_sync") as executor:
+            futures = [executor.submit(self.run_instance_job, app, session_id, sync_type, job) for job in jobs]
+            outcomes = {job["instance_id"]: future.result() for job, future in zip(jobs, futures, strict=True)}
+
+        summary = {
+            "success_count": 0,
+            "failed_count": 0,
+            "total_synced_count": 0,
+            "total_added_count": 0,
+            "total_removed_count": 0,
+            "total_modified_count": 0,
+            "results": [],
+        }
+        # 结果按调用方传入的实例顺序返回
+        for instance in instances:
+            outcome = outcomes.get(instance.id)
+            if outcome is None:
+                continue
+            if outcome["success"]:
+                summary["success_count"] += 1
+                summary["total_synced_count"] += outcome["synced_count"]
+                summary["total_added_count"] += outcome["added_count"]
+                summary["total_removed_count"] += outcome["removed_count"]
+                summary["total_modified_count"] += outcome["modified_count"]
+            else:
+                summary["failed_count"] += 1
+            summary["results"].append(
+                {
+                    "instance_name": outcome["instance_name"],
+                    "success": outcome["success"],
+                    "message": outcome["message"],
+                    "synced_count": outcome["synced_count"],
+                }
+            )
+        return summary
+
+    def run_instance_job(self, app: Flask, session_id: str, sync_type: str, job: dict[str, Any]) -> dict[str, Any]:
+        """
+        在独立的应用上下文和数据库会话中同步单个实例（线程池工作线程和队列工作进程共用）
+
+        Args:
+            app: Flask应用对象
+            session_id: 同步会话ID
+            sync_type: 同步类型
+            job: 实例任务信息
+
+        Returns:
+            Dict: 单个实例的同步结果
+        """
+        outcome = {
+            "instance_name": job["instance_name"],
+            "success": False,
+            "message": "",
+            "synced_count": 0,
+            "added_count": 0,
+            "modified_count": 0,
+            "removed_count": 0,
+        }
+        started_at = None
+        cancelled_reason = None
+        attached = False
+        token = CancellationToken(session_id)
+        with app.app_context():
+            try:
+                # 会话已取消的实例不再占用并发槽位
+                token.check()
+                with self._acquire_slots(job["db_type"], job["host"]):
+                    token.check()
+                    instance = Instance.query.get(job["instance_id"])
+                    if not instance:
+                        raise ValueError(f"实例不存在: {job['instance_id']}")
+
+                    started_at = time.perf_counter()
+                    token.start_deadline(load_cancellation_config()["instance_timeout_seconds"])
+                    sync_session_service.start_instance_sync(job["record_id"])
+                    with sync_cancellation(token):
+                        result = account_sync_service.sync_accounts(
+                            instance, sync_type=sync_type, session_id=session_id
+                        )
+                    # 复用了其他同步的结果：本次没有实际同步，不计入同步节奏统计
+                    attached = (result.get("details") or {}).get("outcome") == "attached"
+
+                    if result.get("success"):
+                        outcome.update(
+                            success=True,
+                            message=result.get("message", "同步成功"),
+                            synced_count=result.get("synced_count", 0),
+                            added_count=result.get("added_count", 0),
+                            modified_count=result.get("modified_count", 0),
+                            removed_count=result.get("removed_count", 0),
+                        )
+                        sync_session_service.complete_instance_sync(
+                            job["record_id"],
+                            accounts_synced=outcome["synced_count"],
+                            accounts_created=outcome["added_count"],
+                            accounts_updated=outcome["modified_count"],
+                            accounts_deleted=outcome["removed_count"],
+                            sync_details=result.get("details", {}),
+                        )
+                    else:
+                        outcome["message"] = result.get("message", result.get("error", "未知错误"))
+                        sync_session_service.fail_instance_sync(
+                            job["record_id"],
+                            error_message=outcome["message"],
+                            sync_details=result.get("details", {}),
+                        )
+                        self.sync_logger.warning(
+                            "实例同步失败",
+                            module="account_sync_orchestrator",
+                            session_id=session_id,
+                            instance_name=job["instance_name"],
+                            instance_id=job["instance_id"],
+                            error_msg=outcome["message"],
+                        )
+            except SyncCancelled as e:
+                # 离开 with 块时已释放并发槽位；未提交的写入回滚，中断的远程连接已被丢弃
+                db.session.rollback()
+                cancelled_reason = e.reason
+                outcome["message"] = e.message
+                sync_session_service.fail_instance_sync(
+                    job["record_id"],
+                    error_message=e.message,
+                    sync_details={"outcome": e.reason},
+                )
+                self.sync_logger.warning(
+                    "实例同步已中止",
+                    module="account_sync_orchestrator",
+                    session_id=session_id,
+                    instance_name=job["instance_name"],
+                    instance_id=job["instance_id"],
+                    reason=e.reason,
+                )
+            except Exception as e:
+                db.session.rollback()
+                outcome["message"] = f"同步异常: {str(e)}"
+                sync_session_service.fail_instance_sync(
+                    job["record_id"],
+                    error_message=str(e),
+                    sync_details={"exception": str(e)},
+                )
+                self.sync_logger.error(
+                    "实例同步异常",
+                    module="account_sync_orchestrator",
+                    session_id=session_id,
+                    instance_name=job["instance_name"],
+                    instance_id=job["instance_id"],
+                    exception=str(e),
+                )
+            finally:
+                # 更新实例同步节奏统计（变更频率/耗时/连续失败），决定下次到期时间；
+                # 手动取消不计入统计，超时按失败计入以拉长慢实例的同步间隔
+                if started_at is not None and not attached and cancelled_reason in (None, CANCEL_REASON_DEADLINE):
+                    sync_cadence_service.record_outcome(
+                        job["instance_id"],
+                        session_id,
+                        success=outcome["success"],
+                        duration_seconds=time.perf_counter() - started_at,
+                        added_count=outcome["added_count"],
+                        removed_count=outcome["removed_count"],
+                    )
+                db.session.remove()
+        return outcome
+
+
+# 全局编排器实例
+account_sync_orchestrator = AccountSyncOrchestrator()
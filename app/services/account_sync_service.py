@@ -3,16 +3,79 @@
 统一入口处理所有类型的账户同步逻辑
 """
 
+import os
+from collections.abc import Callable
+from datetime import timedelta
+from functools import wraps
 from typing import Any
 from uuid import uuid4
 
+import yaml
+
 from app import db
 from app.models import Instance
+from app.models.current_account_sync_data import CurrentAccountSyncData
+from app.models.instance_sync_state import InstanceSyncState
+from app.models.sync_session import SyncSession
+from app.services.circuit_breaker import instance_circuit_breaker
+from app.services.classification_matrix_engine import load_classification_config
 from app.services.connection_factory import ConnectionFactory
 from app.services.sync_data_manager import SyncDataManager
+from app.services.sync_lease_service import fence_current_lease, sync_lease_service
 from app.services.sync_session_service import sync_session_service
 from app.utils.structlog_config import get_sync_logger
-from app.utils.timezone import now
+from app.utils.sync_cancellation import SyncCancelled
+from app.utils.sync_profiler import profile_stage, sync_profile
+from app.utils.timezone import UTC_TZ, now
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+
+def _profiled_sync(func: Callable[..., dict[str, Any]]) -> Callable[..., dict[str, Any]]:
+    """在阶段剖析上下文中执行实例同步，并将剖析结果写入返回结果的 details.profile"""
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> dict[str, Any]:  # noqa: ANN401
+        with sync_profile() as profiler:
+            result = func(*args, **kwargs)
+        if profiler is not None:
+            result["details"] = {**(result.get("details") or {}), "profile": profiler.to_dict()}
+        return result
+
+    return wrapper
+
+
+def _single_flight(func: Callable[..., dict[str, Any]]) -> Callable[..., dict[str, Any]]:
+    """在实例同步租约下执行：同一实例已有同步在执行时等待并复用其结果，不重复同步"""
+
+    @wraps(func)
+    def wrapper(
+        self: "AccountSyncService", instance: Instance, *args: Any, **kwargs: Any  # noqa: ANN401
+    ) -> dict[str, Any]:
+        return sync_lease_service.run_single_flight(instance.id, lambda: func(self, instance, *args, **kwargs))
+
+    return wrapper
+
+
+def _classify_after_sync(func: Callable[..., dict[str, Any]]) -> Callable[..., dict[str, Any]]:
+    """
+    无会话的单实例同步完成后对新增、变更的账户执行增量分类（在实例同步租约之外执行，复用他人结果的同步不重复分类）；
+    会话内的实例同步在会话全部实例结束后统一分类，见 classify_session_accounts
+    """
+
+    @wraps(func)
+    def wrapper(
+        self: "AccountSyncService", instance: Instance, *args: Any, **kwargs: Any  # noqa: ANN401
+    ) -> dict[str, Any]:
+        started_at = now()
+        result = func(self, instance, *args, **kwargs)
+        outcome = (result.get("details") or {}).get("outcome")
+        changed = result.get("added_count", 0) + result.get("modified_count", 0)
+        if result.get("success") and changed and outcome != "attached":
+            self._classify_changed_accounts([instance.id], started_at, instance_name=instance.name)
+        return result
+
+    return wrapper
 
 
 class AccountSyncService:
@@ -29,8 +92,27 @@ class AccountSyncService:
     def __init__(self) -> None:
         self.sync_logger = get_sync_logger()
         self.sync_data_manager = SyncDataManager()
+        self.change_detection = self._load_change_detection_config()
         # 使用连接工厂创建连接
 
+    def _load_change_detection_config(self) -> dict[str, Any]:
+        """加载目录变更检测配置，配置文件缺失或格式错误时使用默认值"""
+        change_detection = {"enabled": True, "max_skip_seconds": 86400}
+        if not os.path.exists(CONFIG_FILE):
+            return change_detection
+
+        try:
+            with open(CONFIG_FILE, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            loaded = (config.get("account_sync") or {}).get("change_detection") or {}
+            change_detection["enabled"] = bool(loaded.get("enabled", change_detection["enabled"]))
+            change_detection["max_skip_seconds"] = int(
+                loaded.get("max_skip_seconds", change_detection["max_skip_seconds"])
+            )
+        except Exception as e:
+            self.sync_logger.warning("加载变更检测配置失败，使用默认值", module="account_sync_unified", error=str(e))
+        return change_detection
+
     def sync_accounts(
         self,
         instance: Instance,
@@ -102,27 +184,55 @@ class AccountSyncService:
                 "removed_count": 0,
             }
 
+    def _circuit_open_result(self, instance: Instance, reason: str) -> dict[str, Any]:
+        """实例连接熔断中：不尝试建连，直接返回跳过结果（会话模式下实例记录标记为失败并注明跳过原因）"""
+        self.sync_logger.info(
+            "实例连接熔断中，跳过同步",
+            module="account_sync_unified",
+            instance_name=instance.name,
+            instance_id=instance.id,
+            reason=reason,
+        )
+        return {
+            "success": False,
+            "skipped": True,
+            "error": reason,
+            "synced_count": 0,
+            "added_count": 0,
+            "modified_count": 0,
+            "removed_count": 0,
+            "details": {"outcome": "skipped-circuit-open", "circuit": instance_circuit_breaker.get_state(instance.id)},
+        }
+
+    @_classify_after_sync
+    @_single_flight
+    @_profiled_sync
     def _sync_single_instance(self, instance: Instance) -> dict[str, Any]:
         """
         单实例同步 - 无会话管理
         用于实例页面的直接同步调用
         """
+        conn = None
         try:
-            # 获取数据库连接（强制创建新连接以确保数据库上下文正确）
-            conn = ConnectionFactory.create_connection(instance)
-            if not conn or not conn.connect():
+            # 从连接池获取数据库连接（归还时会重置事务和数据库上下文）
+            with profile_stage("connect"):
+                circuit_reason = instance_circuit_breaker.check(instance)
+                if not circuit_reason:
+                    conn = ConnectionFactory.acquire_connection(instance, bypass_circuit_breaker=True)
+            if circuit_reason:
+                return self._circuit_open_result(instance, circuit_reason)
+            if not conn:
                 return {"success": False, "error": "无法获取数据库连接"}
 
             # 更新数据库版本信息
-            self._update_database_version(instance, conn)
+            with profile_stage("version"):
+                self._update_database_version(instance, conn)
 
             # 生成临时会话ID用于日志追踪
             temp_session_id = str(uuid4())
 
-            # 执行同步
-            result = self.sync_data_manager.sync_accounts(
-                instance=instance, connection=conn, session_id=temp_session_id
-            )
+            # 执行同步（账户目录未变化时跳过）
+            result = self._sync_accounts_if_changed(instance, conn, temp_session_id)
 
             # 调试日志：检查权限数据
             if result.get("success"):
@@ -134,15 +244,15 @@ class AccountSyncService:
                     modified_count=result.get("modified_count", 0),
                 )
 
-            # 关闭连接
-            if hasattr(conn, "disconnect"):
-                conn.disconnect()
-            elif hasattr(conn, "close"):
-                conn.close()
+            # 归还连接
+            ConnectionFactory.release_connection(conn)
+            conn = None
 
             # 更新实例最后连接时间
             instance.last_connected_at = now()
-            db.session.commit()
+            with profile_stage("commit"):
+                fence_current_lease()
+                db.session.commit()
 
             self.sync_logger.info(
                 "单实例同步完成",
@@ -156,11 +266,22 @@ class AccountSyncService:
 
             return result
 
+        except SyncCancelled as e:
+            # 单实例同步不受会话取消控制，只会因租约被其他同步接管而中止
+            db.session.rollback()
+            self.sync_logger.warning(
+                "单实例同步已中止", module="account_sync_unified", instance_name=instance.name, reason=e.reason
+            )
+            return {"success": False, "error": e.message, "details": {"outcome": e.reason}}
         except Exception as e:
             self.sync_logger.error(
                 "单实例同步失败", module="account_sync_unified", instance_name=instance.name, error=str(e)
             )
             return {"success": False, "error": f"同步失败: {str(e)}"}
+        finally:
+            # 异常中断的连接状态不确定，直接丢弃
+            if conn is not None:
+                ConnectionFactory.release_connection(conn, discard=True)
 
     def _sync_with_session(self, instance: Instance, sync_type: str, created_by: int | None) -> dict[str, Any]:
         """
@@ -213,31 +334,40 @@ class AccountSyncService:
             )
             return {"success": False, "error": f"会话同步失败: {str(e)}"}
 
+    @_single_flight
+    @_profiled_sync
     def _sync_with_existing_session(self, instance: Instance, session_id: str) -> dict[str, Any]:
         """
         使用现有会话ID进行同步
         """
+        conn = None
         try:
-            # 获取数据库连接（强制创建新连接以确保数据库上下文正确）
-            conn = ConnectionFactory.create_connection(instance)
-            if not conn or not conn.connect():
+            # 从连接池获取数据库连接（归还时会重置事务和数据库上下文）
+            with profile_stage("connect"):
+                circuit_reason = instance_circuit_breaker.check(instance)
+                if not circuit_reason:
+                    conn = ConnectionFactory.acquire_connection(instance, bypass_circuit_breaker=True)
+            if circuit_reason:
+                return self._circuit_open_result(instance, circuit_reason)
+            if not conn:
                 return {"success": False, "error": "无法获取数据库连接"}
 
             # 更新数据库版本信息
-            self._update_database_version(instance, conn)
+            with profile_stage("version"):
+                self._update_database_version(instance, conn)
 
-            # 执行同步
-            result = self.sync_data_manager.sync_accounts(instance=instance, connection=conn, session_id=session_id)
+            # 执行同步（账户目录未变化时跳过）
+            result = self._sync_accounts_if_changed(instance, conn, session_id)
 
-            # 关闭连接
-            if hasattr(conn, "disconnect"):
-                conn.disconnect()
-            elif hasattr(conn, "close"):
-                conn.close()
+            # 归还连接
+            ConnectionFactory.release_connection(conn)
+            conn = None
 
             # 更新实例最后连接时间
             instance.last_connected_at = now()
-            db.session.commit()
+            with profile_stage("commit"):
+                fence_current_lease()
+                db.session.commit()
 
             return result
 
@@ -250,6 +380,120 @@ class AccountSyncService:
                 error=str(e),
             )
             return {"success": False, "error": f"同步失败: {str(e)}"}
+        finally:
+            if conn is not None:
+                ConnectionFactory.release_connection(conn, discard=True)
+
+    def _sync_accounts_if_changed(
+        self, instance: Instance, conn: Any, session_id: str  # noqa: ANN401
+    ) -> dict[str, Any]:
+        """
+        比较账户目录变更令牌，未变化时跳过全量同步（不独立提交，等待统一事务）
+
+        令牌与上次全量同步时一致且距上次全量同步未超过 max_skip_seconds 时，
+        只刷新账户 last_sync_time 并返回 skipped-unchanged 结果。
+        """
+        catalog_token = None
+        if self.change_detection["enabled"]:
+            with profile_stage("change_token"):
+                catalog_token = self.sync_data_manager.get_catalog_change_token(instance, conn)
+            state = InstanceSyncState.query.filter_by(instance_id=instance.id).first() if catalog_token else None
+            if state and state.account_catalog_token == catalog_token and self._within_skip_window(state):
+                return self._skip_unchanged_sync(instance, catalog_token)
+
+        result = self.sync_data_manager.sync_accounts(instance=instance, connection=conn, session_id=session_id)
+
+        if result.get("success"):
+            # 令牌在拉取账户之前获取，拉取期间发生的变更会在下次同步时被检测到
+            state = InstanceSyncState.get_or_create(instance.id)
+            state.account_catalog_token = catalog_token
+            state.last_full_sync_at = now()
+        return result
+
+    def classify_session_accounts(self, session: SyncSession) -> None:
+        """
+        同步会话的全部实例结束后执行一次增量分类（由提交最后一个实例结果的工作线程/进程调用）
+
+        只覆盖会话内同步成功且有新增、变更账户的实例；复用其他同步结果的实例由那次同步负责分类
+        """
+        instance_ids = [
+            record.instance_id
+            for record in session.instance_records.all()
+            if record.status == "completed"
+            and (record.accounts_created or 0) + (record.accounts_updated or 0)
+            and (record.sync_details or {}).get("outcome") != "attached"
+        ]
+        if instance_ids:
+            self._classify_changed_accounts(instance_ids, session.started_at, session_id=session.session_id)
+
+    def _classify_changed_accounts(
+        self, instance_ids: list[int], changed_since: Any, **log_fields: Any  # noqa: ANN401
+    ) -> None:
+        """增量分类本次同步新增、变更的账户；分类失败只记录日志，不影响同步结果"""
+        if not load_classification_config()["after_sync"]:
+            return
+        from app.services.optimized_account_classification_service import OptimizedAccountClassificationService
+
+        try:
+            result = OptimizedAccountClassificationService().auto_classify_accounts_incremental(
+                instance_ids=instance_ids, changed_since=changed_since
+            )
+        except Exception as e:
+            db.session.rollback()
+            result = {"success": False, "error": str(e)}
+        if result.get("success"):
+            self.sync_logger.info(
+                "同步后增量分类完成",
+                module="account_sync_unified",
+                **log_fields,
+                instance_count=len(instance_ids),
+                batch_id=result.get("batch_id"),
+                skipped=result.get("skipped", False),
+                total_accounts=result.get("total_accounts", 0),
+                total_matches=result.get("total_matches", 0),
+            )
+        else:
+            self.sync_logger.warning(
+                "同步后增量分类未完成",
+                module="account_sync_unified",
+                **log_fields,
+                instance_count=len(instance_ids),
+                error=result.get("error"),
+            )
+
+    def _within_skip_window(self, state: InstanceSyncState) -> bool:
+        """距上次全量同步是否仍在允许跳过的时间窗口内"""
+        last_full_sync_at = state.last_full_sync_at
+        if last_full_sync_at is None:
+            return False
+        if last_full_sync_at.tzinfo is None:
+            last_full_sync_at = last_full_sync_at.replace(tzinfo=UTC_TZ)
+        return now() - last_full_sync_at < timedelta(seconds=self.change_detection["max_skip_seconds"])
+
+    def _skip_unchanged_sync(self, instance: Instance, catalog_token: str) -> dict[str, Any]:
+        """账户目录未变化：只刷新 last_sync_time"""
+        with profile_stage("persist"):
+            touched_count = CurrentAccountSyncData.query.filter_by(
+                instance_id=instance.id, db_type=instance.db_type, is_deleted=False
+            ).update({"last_sync_time": now()}, synchronize_session=False)
+
+        self.sync_logger.info(
+            "账户目录未变化，跳过同步",
+            module="account_sync_unified",
+            instance_name=instance.name,
+            db_type=instance.db_type,
+            account_count=touched_count,
+        )
+        return {
+            "success": True,
+            "skipped": True,
+            "message": "账户目录未变化，跳过同步",
+            "synced_count": touched_count,
+            "added_count": 0,
+            "modified_count": 0,
+            "removed_count": 0,
+            "details": {"outcome": "skipped-unchanged", "catalog_token": catalog_token},
+        }
 
     def _update_database_version(self, instance: Instance, conn: Any) -> None:  # noqa: ANN401
         """更新数据库版本信息（不独立提交，等待统一事务）"""
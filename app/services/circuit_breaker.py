@@ -0,0 +1,240 @@
+"""
+鲸落 - 实例连接熔断器
+按实例记录建连失败，连续失败后熔断并快速跳过不可达实例；状态保存在共享缓存中，所有工作进程可见
+"""
+
+import os
+import socket
+import threading
+import time
+from typing import Any
+
+import yaml
+
+from app import cache
+from app.models.instance import Instance
+from app.utils.structlog_config import get_db_logger
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class InstanceCircuitBreaker:
+    """
+    实例连接熔断器
+
+    - closed: 正常建连，连续失败达到 failure_threshold 次后熔断
+    - open: 熔断期间直接拒绝建连；熔断时长从 open_seconds 开始，每次重新熔断翻倍，不超过 max_open_seconds
+    - half_open: 熔断到期后只允许一个调用方试探（共享缓存 add 抢占），
+      先做 TCP 端口探测，探测通过才尝试完整建连；建连成功（含复用通过探活的池连接）则闭合，失败则重新熔断
+
+    缓存不可用时退化为进程内状态。
+    """
+
+    DEFAULT_CIRCUIT_CONFIG = {
+        "enabled": True,
+        "failure_threshold": 3,
+        "open_seconds": 300,
+        "max_open_seconds": 3600,
+        "probe_timeout_seconds": 3,
+    }
+
+    KEY_PREFIX = "whalefall:circuit"
+
+    def __init__(self) -> None:
+        self.db_logger = get_db_logger()
+        self.config = self._load_circuit_config()
+        self._local_lock = threading.Lock()
+        self._local_states: dict[str, dict[str, Any]] = {}
+
+    def _load_circuit_config(self) -> dict[str, Any]:
+        """加载熔断配置，配置文件缺失或格式错误时使用默认值"""
+        circuit = dict(self.DEFAULT_CIRCUIT_CONFIG)
+        if not os.path.exists(CONFIG_FILE):
+            return circuit
+
+        try:
+            with open(CONFIG_FILE, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            loaded = (config.get("account_sync") or {}).get("circuit_breaker") or {}
+            circuit["enabled"] = bool(loaded.get("enabled", circuit["enabled"]))
+            for key in ("failure_threshold", "open_seconds", "max_open_seconds", "probe_timeout_seconds"):
+                circuit[key] = max(1, int(loaded.get(key, circuit[key])))
+            circuit["max_open_seconds"] = max(circuit["max_open_seconds"], circuit["open_seconds"])
+        except Exception as e:
+            self.db_logger.warning("加载熔断配置失败，使用默认值", module="circuit_breaker", error=str(e))
+        return circuit
+
+    # ---- 状态存取（共享缓存，失败时退化为进程内字典） ----
+
+    def _state_key(self, instance_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{instance_id}"
+
+    def _state_ttl(self) -> int:
+        # 连续失败计数和熔断状态在最长熔断时长的两倍后自然过期
+        return self.config["max_open_seconds"] * 2
+
+    def _load(self, instance_id: int) -> dict[str, Any]:
+        key = self._state_key(instance_id)
+        try:
+            state = cache.get(key)
+        except Exception:
+            with self._local_lock:
+                state = self._local_states.get(key)
+        return dict(state) if state else {"state": CIRCUIT_CLOSED, "failures": 0, "open_count": 0}
+
+    def _save(self, instance_id: int, state: dict[str, Any] | None) -> None:
+        key = self._state_key(instance_id)
+        try:
+            if state is None:
+                cache.delete(key)
+            else:
+                cache.set(key, state, timeout=self._state_ttl())
+        except Exception:
+            with self._local_lock:
+                if state is None:
+                    self._local_states.pop(key, None)
+                else:
+                    self._local_states[key] = state
+
+    def _acquire_trial(self, instance_id: int) -> bool:
+        """抢占半开试探权，同一时间只有一个调用方可以试探"""
+        key = f"{self._state_key(instance_id)}:trial"
+        timeout = self.config["probe_timeout_seconds"] + 60
+        try:
+            return bool(cache.add(key, os.getpid(), timeout=timeout))
+        except Exception:
+            with self._local_lock:
+                expires_at = self._local_states.get(key, {}).get("expires_at", 0)
+                if expires_at > time.time():
+                    return False
+                self._local_states[key] = {"expires_at": time.time() + timeout}
+                return True
+
+    def _release_trial(self, instance_id: int) -> None:
+        key = f"{self._state_key(instance_id)}:trial"
+        try:
+            cache.delete(key)
+        except Exception:
+            with self._local_lock:
+                self._local_states.pop(key, None)
+
+    # ---- 对外接口 ----
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用熔断"""
+        return self.config["enabled"]
+
+    def check(self, instance: Instance) -> str | None:
+        """
+        建连前检查
+
+        Args:
+            instance: 数据库实例
+
+        Returns:
+            Optional[str]: 拒绝建连的原因，允许建连时返回None
+        """
+        if not self.enabled:
+            return None
+
+        state = self._load(instance.id)
+        if state["state"] == CIRCUIT_CLOSED:
+            return None
+
+        remaining = state.get("open_until", 0) - time.time()
+        if state["state"] == CIRCUIT_OPEN and remaining > 0:
+            return f"实例连接已熔断，{int(remaining) + 1} 秒后重试（最近错误: {state.get('last_error') or '未知'}）"
+
+        # 熔断到期（或半开试探者异常退出）：只允许一个调用方试探
+        if not self._acquire_trial(instance.id):
+            return "实例连接熔断半开，其他进程正在试探"
+
+        probe_error = self._probe(instance)
+        if probe_error:
+            self._release_trial(instance.id)
+            self.record_failure(instance, probe_error, reopen=True)
+            return f"实例连接已熔断，TCP探测失败: {probe_error}"
+
+        state["state"] = CIRCUIT_HALF_OPEN
+        self._save(instance.id, state)
+        self.db_logger.info(
+            "实例连接熔断半开，尝试建连", module="circuit_breaker", instance_id=instance.id, instance_name=instance.name
+        )
+        return None
+
+    def _probe(self, instance: Instance) -> str | None:
+        """TCP 端口探测，成功返回None，失败返回错误信息"""
+        try:
+            with socket.create_connection((instance.host, instance.port), timeout=self.config["probe_timeout_seconds"]):
+                return None
+        except OSError as e:
+            return str(e) or type(e).__name__
+
+    def record_success(self, instance: Instance) -> None:
+        """建连成功（新建连接或通过探活的池连接）：闭合熔断器并清除失败计数"""
+        if not self.enabled:
+            return
+        state = self._load(instance.id)
+        if state["state"] == CIRCUIT_CLOSED and not state.get("failures"):
+            return
+        self._save(instance.id, None)
+        self._release_trial(instance.id)
+        if state["state"] != CIRCUIT_CLOSED:
+            self.db_logger.info(
+                "实例连接恢复，熔断器闭合",
+                module="circuit_breaker",
+                instance_id=instance.id,
+                instance_name=instance.name,
+            )
+
+    def record_failure(self, instance: Instance, error: str, *, reopen: bool = False) -> None:
+        """
+        建连失败：累加失败次数，达到阈值或半开试探失败时熔断
+
+        Args:
+            instance: 数据库实例
+            error: 失败原因
+            reopen: 为True时无论失败次数直接重新熔断（半开探测失败）
+        """
+        if not self.enabled:
+            return
+        state = self._load(instance.id)
+        state["failures"] = state.get("failures", 0) + 1
+        state["last_error"] = error[:200]
+
+        if reopen or state["state"] == CIRCUIT_HALF_OPEN or state["failures"] >= self.config["failure_threshold"]:
+            state["open_count"] = state.get("open_count", 0) + 1
+            open_seconds = min(
+                self.config["max_open_seconds"], self.config["open_seconds"] * 2 ** (state["open_count"] - 1)
+            )
+            state["state"] = CIRCUIT_OPEN
+            state["open_until"] = time.time() + open_seconds
+            self._release_trial(instance.id)
+            self.db_logger.warning(
+                "实例连接熔断",
+                module="circuit_breaker",
+                instance_id=instance.id,
+                instance_name=instance.name,
+                failures=state["failures"],
+                open_seconds=open_seconds,
+                error=state["last_error"],
+            )
+        self._save(instance.id, state)
+
+    def get_state(self, instance_id: int) -> dict[str, Any]:
+        """获取实例熔断状态"""
+        return self._load(instance_id)
+
+    def reset(self, instance_id: int) -> None:
+        """手动闭合熔断器"""
+        self._save(instance_id, None)
+        self._release_trial(instance_id)
+
+
+# 全局实例熔断器
+instance_circuit_breaker = InstanceCircuitBreaker()
@@ -0,0 +1,225 @@
+"""
+鲸落 - 账户分类位矩阵引擎
+大规模全量分类时的可选引擎（需要安装 numpy）：每种数据库类型的账户权限编码为布尔矩阵，
+规则子句编码为权限列向量，一次矩阵乘法评估所有规则；结果与逐条评估的规则引擎完全一致
+"""
+
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any
+
+import yaml
+
+from app.services.classification_rule_engine import (
+    CLAUSE_ALL,
+    CLAUSE_ANY,
+    AccountPermissionView,
+    CompiledRule,
+)
+from app.services.privilege_bitset import privilege_bitset_service
+from app.utils.structlog_config import log_warning
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时只能使用逐条评估的规则引擎
+    np = None
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+ENGINE_SCALAR = "scalar"  # 逐条评估（CompiledRule.matches）
+ENGINE_MATRIX = "matrix"  # 位矩阵批量评估
+ENGINE_AUTO = "auto"  # 账户数达到 matrix_min_accounts 且已安装 numpy 时使用位矩阵
+ENGINES = (ENGINE_SCALAR, ENGINE_MATRIX, ENGINE_AUTO)
+
+# 权限视图对应的账户权限字段（列按 PermissionConfig 字典顺序排列）
+VIEW_FIELDS = {
+    "mysql.global_privileges": "global_privileges",
+    "sqlserver.server_permissions": "server_permissions",
+    "sqlserver.server_roles": "server_roles",
+    "postgresql.role_attributes": "role_attributes",
+    "oracle.oracle_roles": "oracle_roles",
+    "oracle.system_privileges": "system_privileges",
+}
+
+# 每次参与矩阵运算的行数，限制中间矩阵的内存
+ROW_CHUNK_SIZE = 50000
+
+
+def numpy_available() -> bool:
+    """是否可以使用位矩阵引擎"""
+    return np is not None
+
+
+@lru_cache(maxsize=1)
+def load_classification_config() -> dict[str, Any]:
+    """加载分类配置（account_sync.classification），配置文件缺失或格式错误时使用默认值"""
+    engine_config = {"engine": ENGINE_SCALAR, "matrix_min_accounts": 20000, "after_sync": True}
+    if not os.path.exists(CONFIG_FILE):
+        return engine_config
+    try:
+        with open(CONFIG_FILE, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        loaded = (config.get("account_sync") or {}).get("classification") or {}
+        engine = str(loaded.get("engine", engine_config["engine"])).lower()
+        if engine in ENGINES:
+            engine_config["engine"] = engine
+        engine_config["matrix_min_accounts"] = max(
+            0, int(loaded.get("matrix_min_accounts", engine_config["matrix_min_accounts"]))
+        )
+        engine_config["after_sync"] = bool(loaded.get("after_sync", engine_config["after_sync"]))
+    except Exception:
+        return engine_config
+    return engine_config
+
+
+def resolve_engine(engine: str | None, account_count: int) -> str:
+    """
+    确定本次分类使用的引擎
+
+    Args:
+        engine: 请求的引擎（scalar/matrix/auto），None 时使用配置
+        account_count: 待分类账户数
+
+    Returns:
+        str: scalar 或 matrix；请求位矩阵但未安装 numpy 时回退为 scalar
+    """
+    config = load_classification_config()
+    engine = (engine or config["engine"]).lower()
+    if engine not in ENGINES:
+        log_warning(f"未知的分类引擎 {engine}，使用逐条评估", module="account_classification")
+        return ENGINE_SCALAR
+    if engine == ENGINE_AUTO:
+        return ENGINE_MATRIX if numpy_available() and account_count >= config["matrix_min_accounts"] else ENGINE_SCALAR
+    if engine == ENGINE_MATRIX and not numpy_available():
+        log_warning("位矩阵分类引擎需要安装 numpy，回退为逐条评估", module="account_classification")
+        return ENGINE_SCALAR
+    return engine
+
+
+class MatrixRuleEvaluator:
+    """
+    位矩阵规则评估
+
+    - 行：数据库类型相同的不同权限视图（引用同一权限快照的账户共享一行）
+    - 列：规则引用的权限，按 PermissionConfig 字典顺序排列，字典外的权限追加在后；
+      规则未引用的权限不影响任何子句的结果，不参与运算
+    - 子句：权限矩阵乘以子句的权限列向量得到每行拥有的子句权限数，
+      全部（=子句权限数）、任一（>0）、排除（=0）均为整列比较；再按规则的组合方式合并子句
+
+    与 CompiledRule.matches 一致：账户无权限数据、子句引用的字段无法解析、规则表达式无效时不匹配。
+    """
+
+    def __init__(
+        self,
+        rules: list[CompiledRule],
+        permission_index: dict[str, list[tuple[AccountPermissionView, list[Any]]]],
+    ) -> None:
+        if np is None:
+            msg = "位矩阵分类引擎需要安装 numpy"
+            raise RuntimeError(msg)
+        self.permission_index = permission_index
+        self._results: dict[int, Any] = {}
+
+        rules_by_db_type = defaultdict(list)
+        for rule in rules:
+            rules_by_db_type[rule.db_type].append(rule)
+        for db_type, db_rules in rules_by_db_type.items():
+            views = [view for view, _ in permission_index.get(db_type, ())]
+            for start in range(0, len(views), ROW_CHUNK_SIZE):
+                chunk_results = self._evaluate_chunk(db_type, db_rules, views[start : start + ROW_CHUNK_SIZE])
+                for rule in db_rules:
+                    self._results.setdefault(id(rule), []).append(chunk_results[id(rule)])
+        self._results = {key: np.concatenate(parts) for key, parts in self._results.items()}
+
+    def _columns(self, db_type: str, view_name: str, rules: list[CompiledRule]) -> dict[str, int]:
+        """视图的列：规则引用的权限 -> 列序号"""
+        referenced = {
+            privilege
+            for rule in rules
+            for clause in rule.clauses
+            if clause.view == view_name
+            for privilege in clause.privileges
+        }
+        vocabulary = privilege_bitset_service.get_vocabulary(db_type).bits.get(VIEW_FIELDS.get(view_name), {})
+        ordered = sorted(referenced, key=lambda name: (vocabulary.get(name, len(vocabulary)), repr(name)))
+        return {name: column for column, name in enumerate(ordered)}
+
+    def _evaluate_chunk(
+        self, db_type: str, rules: list[CompiledRule], views: list[AccountPermissionView]
+    ) -> dict[int, Any]:
+        """评估一批行，返回 规则 -> 布尔向量"""
+        row_count = len(views)
+        valid = np.fromiter((view.valid for view in views), dtype=bool, count=row_count)
+
+        # 每个权限视图：一次矩阵乘法得到该视图所有子句的命中权限数
+        clause_results: dict[tuple[int, int], Any] = {}
+        unresolved: dict[str, Any] = {}
+        for view_name in sorted({clause.view for rule in rules for clause in rule.clauses}):
+            columns = self._columns(db_type, view_name, rules)
+            matrix, unresolved[view_name] = self._encode_view(views, view_name, columns)
+            clauses = [
+                (id(rule), index, clause)
+                for rule in rules
+                for index, clause in enumerate(rule.clauses)
+                if clause.view == view_name
+            ]
+            selector = np.zeros((len(columns), len(clauses)), dtype=np.float32)
+            for position, (_, _, clause) in enumerate(clauses):
+                selector[[columns[name] for name in clause.privileges], position] = 1
+            # 0/1 计数在 float32 中精确（列数远小于 2^24）
+            counts = matrix @ selector
+            for position, (rule_key, index, clause) in enumerate(clauses):
+                hits = counts[:, position]
+                if clause.mode == CLAUSE_ALL:
+                    clause_results[(rule_key, index)] = hits == len(clause.privileges)
+                elif clause.mode == CLAUSE_ANY:
+                    clause_results[(rule_key, index)] = hits > 0
+                else:
+                    clause_results[(rule_key, index)] = hits == 0
+
+        results = {}
+        for rule in rules:
+            if rule.never:
+                results[id(rule)] = np.zeros(row_count, dtype=bool)
+                continue
+            matched = valid.copy()
+            if rule.clauses:
+                parts = [clause_results[(id(rule), index)] for index in range(len(rule.clauses))]
+                matched &= np.logical_or.reduce(parts) if rule.match_any else np.logical_and.reduce(parts)
+                for view_name in {clause.view for clause in rule.clauses}:
+                    matched &= ~unresolved[view_name]
+            results[id(rule)] = matched
+        return results
+
+    @staticmethod
+    def _encode_view(views: list[AccountPermissionView], view_name: str, columns: dict[str, int]) -> tuple[Any, Any]:
+        """编码权限矩阵，返回 (行×列 float32 矩阵, 字段无法解析的行)"""
+        rows, cols = [], []
+        unresolved = np.zeros(len(views), dtype=bool)
+        for row, view in enumerate(views):
+            if not view.valid:
+                continue
+            actual = view.get(view_name)
+            if actual is None:
+                unresolved[row] = True
+                continue
+            for name in actual:
+                column = columns.get(name)
+                if column is not None:
+                    rows.append(row)
+                    cols.append(column)
+        matrix = np.zeros((len(views), len(columns)), dtype=np.float32)
+        matrix[rows, cols] = 1
+        return matrix, unresolved
+
+    def matching_accounts(self, rule: CompiledRule) -> list[Any]:
+        """匹配规则的账户（顺序与逐条评估时一致）"""
+        groups = self.permission_index.get(rule.db_type, ())
+        matched = self._results.get(id(rule))
+        if matched is None:
+            return []
+        accounts = []
+        for row in np.flatnonzero(matched):
+            accounts.extend(groups[row][1])
+        return accounts
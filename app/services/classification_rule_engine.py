@@ -0,0 +1,299 @@
+"""
+鲸落 - 账户分类规则引擎
+规则在每个分类批次中编译一次为谓词对象（冻结的必需/排除权限集合 + 组合方式），
+账户权限规范化一次为冻结集合，评估只做集合运算
+"""
+
+import json
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from app.models.account_classification import ClassificationRule
+
+CLAUSE_ALL = "all"  # 拥有全部权限
+CLAUSE_ANY = "any"  # 拥有任一权限
+CLAUSE_NONE = "none"  # 不拥有任何权限
+
+# 旧格式规则（字符串表达式）：(数据库类型, 表达式) -> (权限字段, 权限名称)，字段值须为列表且包含该权限
+LEGACY_RULES = {
+    ("sqlserver", "server_roles.sysadmin"): ("server_roles", "sysadmin"),
+    ("mysql", "global_privileges.SUPER"): ("global_privileges", "SUPER"),
+    ("postgresql", "role_attributes.CREATEROLE"): ("role_attributes", "CREATEROLE"),
+    ("oracle", "system_privileges.GRANT ANY PRIVILEGE"): ("system_privileges", "GRANT ANY PRIVILEGE"),
+}
+
+
+def _hashable_items(value: Iterable[Any]) -> frozenset:
+    """列表成员判断等价的冻结集合（不可哈希的项不会等于规则中的权限名称）"""
+    return frozenset(item for item in value if isinstance(item, Hashable))
+
+
+def _mysql_global_privileges(permissions: dict[str, Any]) -> frozenset | None:
+    """MySQL全局权限：字符串列表，或旧格式 [{"privilege", "granted"}]"""
+    value = permissions.get("global_privileges", [])
+    try:
+        if isinstance(value, list):
+            return frozenset(value)
+        return frozenset(item["privilege"] for item in value if item.get("granted", False))
+    except Exception:
+        return None
+
+
+def _sqlserver_server_permissions(permissions: dict[str, Any]) -> frozenset | None:
+    """SQL Server服务器权限：字符串列表，或旧格式 [{"permission", "granted"}]"""
+    value = permissions.get("server_permissions", [])
+    try:
+        if value and isinstance(value[0], str):
+            return _hashable_items(value)
+        return frozenset(item["permission"] for item in value if isinstance(item, dict) and item.get("granted", False))
+    except Exception:
+        return None
+
+
+def _sqlserver_server_roles(permissions: dict[str, Any]) -> frozenset | None:
+    """SQL Server服务器角色：字符串列表，或旧格式 [{"role"}]"""
+    value = permissions.get("server_roles", [])
+    try:
+        if value and isinstance(value[0], str):
+            return _hashable_items(value)
+        return _hashable_items(item["role"] if isinstance(item, dict) else item for item in value)
+    except Exception:
+        return None
+
+
+def _postgresql_role_attributes(permissions: dict[str, Any]) -> frozenset | None:
+    """PostgreSQL角色属性：取值为真的属性名"""
+    value = permissions.get("role_attributes", {})
+    if not isinstance(value, dict):
+        return None
+    return frozenset(key for key, item in value.items() if item)
+
+
+def _membership(field: str) -> Any:  # noqa: ANN401
+    """按成员判断的权限字段（列表项，或字典的键）"""
+
+    def view(permissions: dict[str, Any]) -> frozenset | None:
+        value = permissions.get(field, [])
+        if isinstance(value, dict):
+            return frozenset(value)
+        if isinstance(value, list | tuple):
+            return _hashable_items(value)
+        return None
+
+    return view
+
+
+def _legacy_list(field: str) -> Any:  # noqa: ANN401
+    """旧格式规则：字段值须为列表"""
+
+    def view(permissions: dict[str, Any]) -> frozenset | None:
+        value = permissions.get(field, [])
+        return _hashable_items(value) if isinstance(value, list) else None
+
+    return view
+
+
+# 权限视图：视图名 -> 由账户权限字典（get_permissions_by_db_type）构建冻结集合的函数，无法解析时返回None
+PERMISSION_VIEWS = {
+    "mysql.global_privileges": _mysql_global_privileges,
+    "sqlserver.server_permissions": _sqlserver_server_permissions,
+    "sqlserver.server_roles": _sqlserver_server_roles,
+    "postgresql.role_attributes": _postgresql_role_attributes,
+    "oracle.oracle_roles": _membership("oracle_roles"),
+    "oracle.system_privileges": _membership("system_privileges"),
+    **{f"legacy.{field}": _legacy_list(field) for _, (field, _) in LEGACY_RULES.items()},
+}
+
+
+# 分类读取的账户权限字段：各权限视图只读取这些 get_permissions_by_db_type 键（与账户权限字段同名），
+# 其余字段（数据库级权限、type_specific 等）不影响分类结果，分类读取路径不加载
+CLASSIFICATION_FIELDS = {
+    "mysql": ("global_privileges",),
+    "sqlserver": ("server_permissions", "server_roles"),
+    "postgresql": ("role_attributes",),
+    "oracle": ("oracle_roles", "system_privileges"),
+}
+
+
+class ClassificationAccount:
+    """
+    分类用的轻量账户记录（只包含分类需要的列）
+
+    db_type 为实例的数据库类型（规则按实例类型分组评估）；permissions 只包含 CLASSIFICATION_FIELDS 中的字段，
+    账户自身类型不在其中时为空字典，与 get_permissions_by_db_type 的分类结果一致。
+    """
+
+    __slots__ = ("id", "instance_id", "db_type", "permission_digest", "permissions")
+
+    def __init__(
+        self,
+        account_id: int,
+        instance_id: int,
+        db_type: str,
+        permission_digest: str | None,
+        permissions: dict[str, Any],
+    ) -> None:
+        self.id = account_id
+        self.instance_id = instance_id
+        self.db_type = db_type
+        self.permission_digest = permission_digest
+        self.permissions = permissions
+
+    def get_permissions_by_db_type(self) -> dict[str, Any]:
+        return self.permissions
+
+
+class AccountPermissionView:
+    """
+    账户权限的规范化视图：各权限视图的冻结集合按需构建并缓存，同一账户（或同一权限快照）只构建一次
+
+    valid 为假（账户没有权限数据）时任何规则都不匹配。
+    """
+
+    __slots__ = ("permissions", "valid", "_sets")
+
+    def __init__(self, permissions: dict[str, Any]) -> None:
+        self.permissions = permissions
+        self.valid = bool(permissions)
+        self._sets: dict[str, frozenset | None] = {}
+
+    def get(self, view: str) -> frozenset | None:
+        """权限视图的冻结集合，字段无法解析时返回None"""
+        try:
+            return self._sets[view]
+        except KeyError:
+            value = self._sets[view] = PERMISSION_VIEWS[view](self.permissions)
+            return value
+
+
+@dataclass(frozen=True, slots=True)
+class RuleClause:
+    """规则子句：权限视图 + 冻结的权限集合 + 判断方式"""
+
+    view: str
+    privileges: frozenset
+    mode: str
+
+    def test(self, actual: frozenset) -> bool:
+        if self.mode == CLAUSE_ALL:
+            return self.privileges <= actual
+        if self.mode == CLAUSE_ANY:
+            return not self.privileges.isdisjoint(actual)
+        return self.privileges.isdisjoint(actual)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    """
+    编译后的分类规则
+
+    - clauses 为空时匹配所有有权限数据的账户
+    - match_any 为真时任一子句成立即匹配，否则须全部成立
+    - 任一子句引用的权限字段无法解析时不匹配；never 为真（表达式无效）时不匹配任何账户
+    """
+
+    rule_id: int
+    classification_id: int
+    db_type: str
+    rule_name: str
+    clauses: tuple[RuleClause, ...] = ()
+    match_any: bool = False
+    never: bool = False
+
+    def matches(self, view: AccountPermissionView) -> bool:
+        """评估规则是否匹配账户"""
+        if self.never or not view.valid:
+            return False
+        if self.match_any:
+            # 须检查全部子句：任一字段无法解析时整条规则不匹配
+            matched = False
+            for clause in self.clauses:
+                actual = view.get(clause.view)
+                if actual is None:
+                    return False
+                matched = matched or clause.test(actual)
+            return matched or not self.clauses
+        for clause in self.clauses:
+            actual = view.get(clause.view)
+            if actual is None or not clause.test(actual):
+                return False
+        return True
+
+
+def _frozen(expression: dict[str, Any], key: str) -> frozenset:
+    """规则中的权限列表（缺失或为空时为空集合）"""
+    return frozenset(expression.get(key) or ())
+
+
+def _clause(view: str, privileges: frozenset, mode: str) -> tuple[RuleClause, ...]:
+    return (RuleClause(view, privileges, mode),) if privileges else ()
+
+
+@lru_cache(maxsize=1024)
+def _compile_expression(db_type: str, rule_expression: str | None) -> tuple[tuple[RuleClause, ...], bool, bool]:
+    """
+    编译规则表达式（按表达式文本缓存）
+
+    Returns:
+        Tuple: (子句, 是否任一子句成立即匹配, 是否不匹配任何账户)
+    """
+    # 与 ClassificationRule.get_rule_expression 一致：无法解析的表达式按旧格式处理
+    try:
+        expression = json.loads(rule_expression)
+    except (json.JSONDecodeError, TypeError):
+        expression = {}
+    if not expression:
+        legacy = LEGACY_RULES.get((db_type, rule_expression))
+        if legacy is None:
+            return (), False, True
+        field, name = legacy
+        return _clause(f"legacy.{field}", frozenset((name,)), CLAUSE_ALL), False, False
+
+    try:
+        rule_type = expression.get("type")
+        if rule_type == "mysql_permissions":
+            operator = expression.get("operator", "OR").upper()
+            mode = CLAUSE_ALL if operator == "AND" else CLAUSE_ANY
+            clauses = _clause("mysql.global_privileges", _frozen(expression, "global_privileges"), mode)
+            clauses += _clause("mysql.global_privileges", _frozen(expression, "exclude_privileges"), CLAUSE_NONE)
+            return clauses, False, False
+        if rule_type == "sqlserver_permissions":
+            operator = expression.get("operator", "OR").upper()
+            clauses = _clause("sqlserver.server_permissions", _frozen(expression, "server_permissions"), CLAUSE_ALL)
+            clauses += _clause("sqlserver.server_roles", _frozen(expression, "server_roles"), CLAUSE_ALL)
+            return clauses, operator != "AND", False
+        if rule_type == "postgresql_permissions":
+            return (
+                _clause("postgresql.role_attributes", _frozen(expression, "role_attributes"), CLAUSE_ALL),
+                False,
+                False,
+            )
+        if rule_type == "oracle_permissions":
+            clauses = _clause("oracle.oracle_roles", _frozen(expression, "roles"), CLAUSE_ALL)
+            clauses += _clause("oracle.system_privileges", _frozen(expression, "system_privileges"), CLAUSE_ALL)
+            return clauses, False, False
+    except Exception:
+        # 表达式格式错误（如权限列表不可迭代）：与逐条评估时的异常一致，按不匹配处理
+        return (), False, True
+    return (), False, True
+
+
+def compile_rule(rule: ClassificationRule) -> CompiledRule:
+    """编译分类规则"""
+    clauses, match_any, never = _compile_expression(rule.db_type, rule.rule_expression)
+    return CompiledRule(
+        rule_id=rule.id,
+        classification_id=rule.classification_id,
+        db_type=rule.db_type,
+        rule_name=rule.rule_name,
+        clauses=clauses,
+        match_any=match_any,
+        never=never,
+    )
+
+
+def build_permission_view(account: Any) -> AccountPermissionView:  # noqa: ANN401
+    """构建账户（ClassificationAccount 或 CurrentAccountSyncData）的权限视图"""
+    return AccountPermissionView(account.get_permissions_by_db_type())
@@ -6,17 +6,28 @@
 """
 
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
 from typing import Any
+from uuid import uuid4
 
 from app.models.instance import Instance
+from app.services.circuit_breaker import instance_circuit_breaker
+from app.services.connection_pool import connection_pool
 from app.utils.database_type_utils import DatabaseTypeUtils
 from app.utils.structlog_config import get_db_logger, log_error
+from app.utils.sync_profiler import record_remote_query
 from app.utils.version_parser import DatabaseVersionParser
 
 
 class DatabaseConnection(ABC):
     """数据库连接抽象基类"""
 
+    # 连接池探活语句
+    PING_QUERY = "SELECT 1"
+
+    # 流式查询每批从服务端获取的默认行数
+    DEFAULT_FETCH_SIZE = 1000
+
     def __init__(self, instance: Instance) -> None:
         self.instance = instance
         self.db_logger = get_db_logger()
@@ -43,6 +54,75 @@ class DatabaseConnection(ABC):
     def get_version(self) -> str | None:
         """获取数据库版本"""
 
+    def iter_query(
+        self, query: str, params: tuple | dict | None = None, *, fetch_size: int | None = None
+    ) -> Iterator[Any]:
+        """
+        流式执行查询，逐行产出结果而不在客户端物化完整结果集
+
+        默认实现退化为 execute_query；各驱动子类使用服务端游标或非缓冲游标按 fetch_size 分批获取。
+        结果消费完（或生成器关闭）之前不能在同一连接上执行其他查询。
+
+        Args:
+            query: SQL语句
+            params: 查询参数
+            fetch_size: 每批获取的行数，为空时使用 DEFAULT_FETCH_SIZE
+        """
+        yield from self.execute_query(query, params)
+
+    def _stream_rows(
+        self,
+        cursor: Any,  # noqa: ANN401
+        query: str,
+        params: tuple | dict | None,
+        fetch_size: int,
+    ) -> Iterator[Any]:
+        """在游标上执行查询并按 fetch_size 分批产出行，结束时记录远程查询行数并关闭游标"""
+        row_count = 0
+        try:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                row_count += len(rows)
+                yield from rows
+        finally:
+            record_remote_query(row_count)
+            cursor.close()
+
+    def _ensure_connected(self) -> None:
+        """确保连接已建立"""
+        if not self.is_connected and not self.connect():
+            error_msg = "无法建立数据库连接"
+            raise Exception(error_msg)
+
+    def ping(self) -> bool:
+        """探活：连接可用返回True（供连接池pre-ping使用）"""
+        if not self.is_connected or not self.connection:
+            return False
+        try:
+            self.execute_query(self.PING_QUERY)
+            return True
+        except Exception:
+            return False
+
+    def reset(self) -> bool:
+        """
+        归还连接池前重置会话状态
+
+        回滚未结束的只读事务，避免长时间处于 idle in transaction。
+
+        Returns:
+            bool: 重置成功返回True，失败时连接应被丢弃
+        """
+        try:
+            if self.connection is not None and hasattr(self.connection, "rollback"):
+                self.connection.rollback()
+            return True
+        except Exception:
+            return False
+
 
 class MySQLConnection(DatabaseConnection):
     """MySQL数据库连接"""
@@ -126,10 +206,20 @@ class MySQLConnection(DatabaseConnection):
         cursor = self.connection.cursor()
         try:
             cursor.execute(query, params or ())
-            return cursor.fetchall()
+            rows = cursor.fetchall()
+            record_remote_query(len(rows))
+            return rows
         finally:
             cursor.close()
 
+    def iter_query(self, query: str, params: tuple | None = None, *, fetch_size: int | None = None) -> Iterator[Any]:
+        """流式执行MySQL查询（SSCursor 非缓冲游标，结果按需从网络读取）"""
+        import pymysql.cursors
+
+        self._ensure_connected()
+        cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+        yield from self._stream_rows(cursor, query, params, fetch_size or self.DEFAULT_FETCH_SIZE)
+
     def get_version(self) -> str | None:
         """获取MySQL版本"""
         try:
@@ -219,10 +309,20 @@ class PostgreSQLConnection(DatabaseConnection):
         cursor = self.connection.cursor()
         try:
             cursor.execute(query, params or ())
-            return cursor.fetchall()
+            rows = cursor.fetchall()
+            record_remote_query(len(rows))
+            return rows
         finally:
             cursor.close()
 
+    def iter_query(self, query: str, params: tuple | None = None, *, fetch_size: int | None = None) -> Iterator[Any]:
+        """流式执行PostgreSQL查询（命名服务端游标，每批 FETCH fetch_size 行）"""
+        self._ensure_connected()
+        fetch_size = fetch_size or self.DEFAULT_FETCH_SIZE
+        cursor = self.connection.cursor(name=f"whalefall_stream_{uuid4().hex[:12]}")
+        cursor.itersize = fetch_size
+        yield from self._stream_rows(cursor, query, params, fetch_size)
+
     def get_version(self) -> str | None:
         """获取PostgreSQL版本"""
         try:
@@ -267,6 +367,21 @@ class SQLServerConnection(DatabaseConnection):
             )
             return False
 
+    def reset(self) -> bool:
+        """归还连接池前回滚事务并切回默认数据库（同步过程中可能执行过USE）"""
+        if not super().reset():
+            return False
+        database_name = (
+            self.instance.database_name
+            or DatabaseTypeUtils.get_database_type_config("sqlserver").default_schema
+            or "master"
+        )
+        try:
+            self.execute_query(f"USE [{database_name.replace(']', ']]')}]")
+            return True
+        except Exception:
+            return False
+
     def _try_pymssql_connection(self, username: str, password: str, database_name: str) -> bool:
         """尝试使用pymssql连接 (适用于Linux/Unix环境)"""
         try:
@@ -336,13 +451,21 @@ class SQLServerConnection(DatabaseConnection):
             cursor.execute(query, params or ())
             # 检查是否有结果集
             try:
-                return cursor.fetchall()
+                rows = cursor.fetchall()
             except Exception:
                 # 如果没有结果集（如USE语句），返回空列表
-                return []
+                rows = []
+            record_remote_query(len(rows))
+            return rows
         finally:
             cursor.close()
 
+    def iter_query(self, query: str, params: tuple | None = None, *, fetch_size: int | None = None) -> Iterator[Any]:
+        """流式执行SQL Server查询（pymssql 游标不缓冲结果集，fetchmany 按需读取TDS数据流）"""
+        self._ensure_connected()
+        cursor = self.connection.cursor()
+        yield from self._stream_rows(cursor, query, params, fetch_size or self.DEFAULT_FETCH_SIZE)
+
     def get_version(self) -> str | None:
         """获取SQL Server版本"""
         try:
@@ -360,6 +483,11 @@ class SQLServerConnection(DatabaseConnection):
 class OracleConnection(DatabaseConnection):
     """Oracle数据库连接"""
 
+    PING_QUERY = "SELECT 1 FROM DUAL"
+
+    # 语句缓存大小：批量权限查询按固定长度 IN 列表分批，SQL文本种类有限，全部缓存以复用已解析的游标
+    STATEMENT_CACHE_SIZE = 40
+
     def connect(self) -> bool:
         """建立Oracle连接"""
         try:
@@ -395,6 +523,7 @@ class OracleConnection(DatabaseConnection):
                     user=(self.instance.credential.username if self.instance.credential else ""),
                     password=password,
                     dsn=dsn,
+                    stmtcachesize=self.STATEMENT_CACHE_SIZE,
                 )
             except Exception as e:
                 # 如果服务名格式失败，尝试SID格式
@@ -405,6 +534,7 @@ class OracleConnection(DatabaseConnection):
                             user=(self.instance.credential.username if self.instance.credential else ""),
                             password=password,
                             dsn=sid_dsn,
+                            stmtcachesize=self.STATEMENT_CACHE_SIZE,
                         )
                     except Exception:
                         # 如果SID格式也失败，抛出原始错误
@@ -468,10 +598,24 @@ class OracleConnection(DatabaseConnection):
         cursor = self.connection.cursor()
         try:
             cursor.execute(query, params or ())
-            return cursor.fetchall()
+            rows = cursor.fetchall()
+            record_remote_query(len(rows))
+            return rows
         finally:
             cursor.close()
 
+    def iter_query(
+        self, query: str, params: tuple | dict | None = None, *, fetch_size: int | None = None
+    ) -> Iterator[Any]:
+        """流式执行Oracle查询（按 fetch_size 设置 arraysize 和 prefetchrows，减少网络往返）"""
+        self._ensure_connected()
+        fetch_size = fetch_size or self.DEFAULT_FETCH_SIZE
+        cursor = self.connection.cursor()
+        cursor.arraysize = fetch_size
+        # 预取与批大小一致：execute 的往返即带回第一批数据
+        cursor.prefetchrows = fetch_size
+        yield from self._stream_rows(cursor, query, params, fetch_size)
+
     def get_version(self) -> str | None:
         """获取Oracle版本"""
         try:
@@ -520,6 +664,74 @@ class ConnectionFactory:
         connection_class = ConnectionFactory.CONNECTION_CLASSES[db_type]
         return connection_class(instance)
 
+    @staticmethod
+    def open_connection(instance: Instance) -> DatabaseConnection | None:
+        """
+        创建并建立数据库连接，建连失败计入实例熔断器（成功由 acquire_connection 统一记录）
+
+        Args:
+            instance: 数据库实例
+
+        Returns:
+            已连接的数据库连接对象，类型不支持或建连失败返回None
+        """
+        connection = ConnectionFactory.create_connection(instance)
+        if connection is None:
+            return None
+        if not connection.connect():
+            instance_circuit_breaker.record_failure(instance, f"无法连接 {instance.host}:{instance.port}")
+            return None
+        return connection
+
+    @staticmethod
+    def acquire_connection(instance: Instance, *, bypass_circuit_breaker: bool = False) -> DatabaseConnection | None:
+        """
+        从连接池获取已连接的数据库连接
+
+        同一实例（且凭据未变化）的连接会被复用，使用完毕须调用 release_connection 归还。
+        实例熔断期间直接返回None，不再尝试建连。新建连接和通过探活的池连接都计为建连成功，
+        熔断半开时的试探由池连接完成也会闭合熔断器。
+
+        Args:
+            instance: 数据库实例
+            bypass_circuit_breaker: 为True时跳过熔断检查（调用方已自行检查，或手动连接测试）
+
+        Returns:
+            已连接的数据库连接对象，类型不支持、熔断中、建连失败或等待超时返回None
+        """
+        if not bypass_circuit_breaker:
+            reason = instance_circuit_breaker.check(instance)
+            if reason:
+                get_db_logger().info(
+                    "实例连接熔断中，跳过建连", module="connection", instance_id=instance.id, reason=reason
+                )
+                return None
+        connection = connection_pool.acquire(instance, ConnectionFactory.open_connection)
+        if connection is not None:
+            instance_circuit_breaker.record_success(instance)
+        return connection
+
+    @staticmethod
+    def release_connection(connection: DatabaseConnection | None, *, discard: bool = False) -> None:
+        """
+        归还连接到连接池
+
+        Args:
+            connection: acquire_connection 返回的连接
+            discard: 为True时关闭连接而不放回池中
+        """
+        connection_pool.release(connection, discard=discard)
+
+    @staticmethod
+    def get_pool_stats() -> dict[str, Any]:
+        """
+        获取连接池统计信息（命中/未命中/等待等）
+
+        Returns:
+            统计信息字典
+        """
+        return connection_pool.get_stats()
+
     @staticmethod
     def test_connection(instance: Instance) -> dict[str, Any]:
         """
@@ -0,0 +1,410 @@
+"""
+鲸落 - 远程数据库连接池
+按实例ID + 凭据版本复用 DatabaseConnection，减少重复握手开销
+"""
+
+import hashlib
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from app.constants import SystemConstants
+from app.utils.structlog_config import get_db_logger
+
+if TYPE_CHECKING:
+    from app.models.instance import Instance
+    from app.services.connection_factory import DatabaseConnection
+
+
+@dataclass
+class PooledConnection:
+    """池内连接及其生命周期信息"""
+
+    connection: "DatabaseConnection"
+    instance_id: int
+    pool_key: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_used_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _PoolBucket:
+    """单个连接池键对应的连接集合"""
+
+    idle: deque = field(default_factory=deque)
+    in_use: int = 0
+    # 等待该池键名额的线程数（持有连接集合引用但未占用名额，有等待者时不能删除池键）
+    waiters: int = 0
+
+
+class ConnectionPool:
+    """
+    远程数据库连接池
+
+    - 池键: 实例ID + 凭据版本（凭据或连接参数变化后旧连接自动失效）
+    - max_size: 每个池键的最大连接数（空闲 + 使用中）
+    - idle_timeout: 空闲超过该秒数的连接被回收
+    - max_lifetime: 存活超过该秒数的连接在归还时关闭重建
+    - pre_ping: 取出空闲连接前先探活，失败则丢弃重建
+    - sweep_interval: 获取/归还连接时按该间隔扫描所有池键，回收不再被使用的实例的过期空闲连接
+
+    被回收的连接都在释放锁之后关闭，关闭远程连接不会阻塞其他实例获取连接。
+    """
+
+    def __init__(
+        self,
+        max_size: int = SystemConstants.CONNECTION_POOL_MAX_SIZE,
+        idle_timeout: float = SystemConstants.CONNECTION_POOL_IDLE_TIMEOUT,
+        max_lifetime: float = SystemConstants.CONNECTION_POOL_MAX_LIFETIME,
+        wait_timeout: float = SystemConstants.CONNECTION_POOL_WAIT_TIMEOUT,
+        sweep_interval: float = SystemConstants.CONNECTION_POOL_SWEEP_INTERVAL,
+        *,
+        pre_ping: bool = True,
+    ) -> None:
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.sweep_interval = sweep_interval
+        self.pre_ping = pre_ping
+        self._last_sweep = time.monotonic()
+        self.db_logger = get_db_logger()
+        # Condition 默认基于 RLock，统计计数可在持锁时重入；
+        # 所有池键共用一个 Condition，归还名额时必须 notify_all，否则可能只唤醒等待其他池键的线程
+        self._condition = threading.Condition()
+        self._buckets: dict[str, _PoolBucket] = {}
+        self._instance_keys: dict[int, str] = {}
+        self._leased: dict[int, PooledConnection] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_timeouts": 0,
+            "wait_seconds": 0.0,
+            "created": 0,
+            "closed": 0,
+            "ping_failures": 0,
+            "idle_evictions": 0,
+            "lifetime_recycles": 0,
+            "stale_credential_evictions": 0,
+        }
+
+    @staticmethod
+    def build_pool_key(instance: "Instance") -> str:
+        """
+        生成池键：实例ID + 凭据版本
+
+        凭据版本由凭据ID、用户名、密文密码以及主机/端口/库名计算，
+        任一变化都会得到新的池键。
+        """
+        credential = instance.credential
+        version_source = "|".join(
+            str(part)
+            for part in (
+                instance.credential_id,
+                credential.username if credential else "",
+                credential.password if credential else "",
+                instance.host,
+                instance.port,
+                instance.database_name or "",
+            )
+        )
+        credential_version = hashlib.sha256(version_source.encode()).hexdigest()[:16]
+        return f"{instance.id}:{credential_version}"
+
+    def acquire(
+        self, instance: "Instance", factory: Callable[["Instance"], "DatabaseConnection | None"]
+    ) -> "DatabaseConnection | None":
+        """
+        获取实例连接，优先复用空闲连接
+
+        Args:
+            instance: 数据库实例
+            factory: 池中无可用连接时用于创建并建立新连接的函数，返回已连接的连接，失败返回None
+
+        Returns:
+            已连接的 DatabaseConnection，失败返回None
+        """
+        pool_key = self.build_pool_key(instance)
+        reserved = self._reserve_slot(instance, pool_key)
+        if reserved is None:
+            return None
+        bucket, pooled = reserved
+
+        # 探活和建连均在锁外进行，避免阻塞其他实例
+        try:
+            if pooled is not None:
+                pooled.connection.instance = instance
+                if not self.pre_ping or pooled.connection.ping():
+                    pooled.last_used_at = time.monotonic()
+                    self._mark_leased(pooled, hit=True)
+                    return pooled.connection
+
+                self._count("ping_failures")
+                self._close(pooled.connection)
+                pooled = None
+
+            connection = factory(instance)
+        except BaseException:
+            # 包括 SyncCancelled：探活或建连中断时关闭探活中的连接并归还占用的名额
+            if pooled is not None:
+                self._close(pooled.connection)
+            self._release_slot(bucket)
+            raise
+        if connection is None:
+            self._release_slot(bucket)
+            return None
+
+        self._count("created")
+        self._mark_leased(
+            PooledConnection(connection=connection, instance_id=instance.id, pool_key=pool_key), hit=False
+        )
+        return connection
+
+    def release(self, connection: "DatabaseConnection | None", *, discard: bool = False) -> None:
+        """
+        归还连接
+
+        Args:
+            connection: acquire 返回的连接
+            discard: 为True时直接关闭连接（如执行过程中发生异常）
+        """
+        if connection is None:
+            return
+
+        with self._condition:
+            pooled = self._leased.pop(id(connection), None)
+        if pooled is None:
+            # 非池管理的连接，直接关闭
+            self._close(connection)
+            return
+
+        now = time.monotonic()
+        expired = self.max_lifetime and now - pooled.created_at >= self.max_lifetime
+        if expired:
+            self._count("lifetime_recycles")
+        keep = not discard and not expired and connection.is_connected and connection.reset()
+
+        with self._condition:
+            bucket = self._buckets.get(pooled.pool_key)
+            # 凭据版本已变化的旧连接不再放回池中
+            keep = keep and bucket is not None and self._instance_keys.get(pooled.instance_id) == pooled.pool_key
+            if bucket is not None:
+                bucket.in_use -= 1
+                if keep:
+                    pooled.last_used_at = now
+                    bucket.idle.append(pooled)
+            self._condition.notify_all()
+            to_close = self._sweep_expired()
+
+        if not keep:
+            self._close(connection)
+        self._close_all(to_close)
+
+    @contextmanager
+    def connection(
+        self, instance: "Instance", factory: Callable[["Instance"], "DatabaseConnection | None"]
+    ) -> Iterator["DatabaseConnection | None"]:
+        """上下文管理器形式的 acquire/release，异常（包括 SyncCancelled 等 BaseException）时丢弃连接"""
+        conn = self.acquire(instance, factory)
+        discard = True
+        try:
+            yield conn
+            discard = False
+        finally:
+            self.release(conn, discard=discard)
+
+    def clear(self, instance_id: int | None = None) -> int:
+        """
+        关闭空闲连接
+
+        Args:
+            instance_id: 仅清理指定实例，为None时清理全部
+
+        Returns:
+            int: 关闭的连接数
+        """
+        to_close = []
+        with self._condition:
+            for pool_key, bucket in self._buckets.items():
+                if instance_id is not None and not pool_key.startswith(f"{instance_id}:"):
+                    continue
+                to_close.extend(pooled.connection for pooled in bucket.idle)
+                bucket.idle.clear()
+        for connection in to_close:
+            self._close(connection)
+        return len(to_close)
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取连接池命中/未命中/等待统计"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+            requests = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / requests, 4) if requests else 0.0
+            stats["idle"] = sum(len(bucket.idle) for bucket in self._buckets.values())
+            stats["in_use"] = sum(bucket.in_use for bucket in self._buckets.values())
+            stats["pools"] = {
+                pool_key: {"idle": len(bucket.idle), "in_use": bucket.in_use}
+                for pool_key, bucket in self._buckets.items()
+                if bucket.idle or bucket.in_use
+            }
+            stats["config"] = {
+                "max_size": self.max_size,
+                "idle_timeout": self.idle_timeout,
+                "max_lifetime": self.max_lifetime,
+                "wait_timeout": self.wait_timeout,
+                "sweep_interval": self.sweep_interval,
+                "pre_ping": self.pre_ping,
+            }
+        return stats
+
+    def _reserve_slot(self, instance: "Instance", pool_key: str) -> tuple[_PoolBucket, PooledConnection | None] | None:
+        """
+        占用池键下的一个连接名额，已达上限时等待归还
+
+        Returns:
+            (池键对应的连接集合, 取出的空闲连接或None表示需要新建)，等待超时返回None
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        wait_started = 0.0
+        to_close = []
+
+        try:
+            with self._condition:
+                to_close.extend(self._retire_stale_key(instance.id, pool_key))
+                to_close.extend(self._sweep_expired())
+                bucket = self._buckets.setdefault(pool_key, _PoolBucket())
+
+                while True:
+                    to_close.extend(self._evict_expired(bucket, time.monotonic()))
+                    pooled = self._take_idle(bucket)
+                    if pooled is not None:
+                        bucket.in_use += 1
+                        break
+                    if bucket.in_use < self.max_size:
+                        bucket.in_use += 1
+                        break
+
+                    # 已达上限，等待其他线程归还
+                    if not waited:
+                        waited = True
+                        wait_started = time.monotonic()
+                        self._stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["wait_timeouts"] += 1
+                        self._stats["wait_seconds"] += time.monotonic() - wait_started
+                        self.db_logger.warning(
+                            "等待连接池连接超时",
+                            module="connection_pool",
+                            instance_id=instance.id,
+                            max_size=self.max_size,
+                            wait_timeout=self.wait_timeout,
+                        )
+                        return None
+                    bucket.waiters += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        bucket.waiters -= 1
+
+                if waited:
+                    self._stats["wait_seconds"] += time.monotonic() - wait_started
+        finally:
+            self._close_all(to_close)
+        return bucket, pooled
+
+    def _retire_stale_key(self, instance_id: int, pool_key: str) -> list["DatabaseConnection"]:
+        """凭据版本变化时移出旧池键下的空闲连接，返回待关闭的连接（调用方需持有锁）"""
+        old_key = self._instance_keys.get(instance_id)
+        self._instance_keys[instance_id] = pool_key
+        if old_key is None or old_key == pool_key:
+            return []
+
+        old_bucket = self._buckets.get(old_key)
+        if old_bucket is None:
+            return []
+        retired = [pooled.connection for pooled in old_bucket.idle]
+        self._stats["stale_credential_evictions"] += len(retired)
+        old_bucket.idle.clear()
+        if not old_bucket.in_use and not old_bucket.waiters:
+            del self._buckets[old_key]
+        return retired
+
+    def _sweep_expired(self) -> list["DatabaseConnection"]:
+        """
+        按 sweep_interval 扫描所有池键，移出过期空闲连接并删除空的池键（调用方需持有锁）
+
+        Returns:
+            待关闭的连接
+        """
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return []
+        self._last_sweep = now
+        evicted = []
+        for pool_key, bucket in list(self._buckets.items()):
+            evicted.extend(self._evict_expired(bucket, now))
+            # 无空闲、无使用中连接且无等待者的池键不再被任何线程引用
+            if not bucket.idle and not bucket.in_use and not bucket.waiters:
+                del self._buckets[pool_key]
+        return evicted
+
+    def _evict_expired(self, bucket: _PoolBucket, now: float) -> list["DatabaseConnection"]:
+        """移出空闲超时或超过最大存活时间的连接，返回待关闭的连接（调用方需持有锁）"""
+        kept = deque()
+        evicted = []
+        for pooled in bucket.idle:
+            if self.idle_timeout and now - pooled.last_used_at >= self.idle_timeout:
+                self._stats["idle_evictions"] += 1
+                evicted.append(pooled.connection)
+            elif self.max_lifetime and now - pooled.created_at >= self.max_lifetime:
+                self._stats["lifetime_recycles"] += 1
+                evicted.append(pooled.connection)
+            else:
+                kept.append(pooled)
+        bucket.idle = kept
+        return evicted
+
+    @staticmethod
+    def _take_idle(bucket: _PoolBucket) -> PooledConnection | None:
+        """取出最近归还的空闲连接（LIFO，使冷连接更快被回收）"""
+        return bucket.idle.pop() if bucket.idle else None
+
+    def _release_slot(self, bucket: _PoolBucket) -> None:
+        """归还未能交付连接的名额并唤醒等待者"""
+        with self._condition:
+            bucket.in_use -= 1
+            self._condition.notify_all()
+
+    def _mark_leased(self, pooled: PooledConnection, *, hit: bool) -> None:
+        with self._condition:
+            self._leased[id(pooled.connection)] = pooled
+            self._stats["hits" if hit else "misses"] += 1
+
+    def _count(self, stat: str) -> None:
+        with self._condition:
+            self._stats[stat] += 1
+
+    def _close_all(self, connections: list["DatabaseConnection"]) -> None:
+        """在锁外关闭被回收的连接"""
+        for connection in connections:
+            self._close(connection)
+
+    def _close(self, connection: "DatabaseConnection") -> None:
+        """关闭底层连接，忽略关闭过程中的异常"""
+        try:
+            connection.disconnect()
+        except Exception as e:
+            self.db_logger.warning("关闭池连接失败", module="connection_pool", error=str(e))
+        self._count("closed")
+
+
+# 全局连接池实例
+connection_pool = ConnectionPool()
@@ -26,10 +26,12 @@ class ConnectionTestService:
             测试结果
         """
         connection_obj = None
+        failed = False
         try:
-            # 创建连接
-            connection_obj = ConnectionFactory.create_connection(instance)
-            if not connection_obj.connect():
+            # 从连接池获取连接（复用的连接已经过pre-ping探活）；
+            # 手动测试不受熔断限制，测试成功会闭合该实例的熔断器
+            connection_obj = ConnectionFactory.acquire_connection(instance, bypass_circuit_breaker=True)
+            if not connection_obj:
                 return {"success": False, "error": "无法建立数据库连接"}
 
             # 获取数据库版本信息
@@ -49,6 +51,7 @@ class ConnectionTestService:
             }
 
         except Exception as e:
+            failed = True
             # 即使连接失败，也记录尝试时间
             try:
                 from app import db
@@ -97,16 +100,13 @@ class ConnectionTestService:
 
             return {"success": False, "error": f"连接失败: {error_message}"}
         finally:
-            # 确保连接被正确关闭，防止资源泄漏
+            # 确保连接被归还到连接池（异常时丢弃），防止资源泄漏
             if connection_obj is not None:
                 try:
-                    if hasattr(connection_obj, "disconnect"):
-                        connection_obj.disconnect()
-                    elif hasattr(connection_obj, "close"):
-                        connection_obj.close()
+                    ConnectionFactory.release_connection(connection_obj, discard=failed)
                 except Exception as close_error:
                     self.test_logger.warning(
-                        "关闭数据库连接时发生错误",
+                        "归还数据库连接时发生错误",
                         module="connection_test",
                         instance_id=instance.id,
                         error=str(close_error)
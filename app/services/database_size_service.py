@@ -5,26 +5,9 @@
 
 from typing import Any
 
-import pymysql
-
-# 可选导入数据库驱动
-try:
-    import psycopg
-except ImportError:
-    psycopg = None
-
-try:
-    import pyodbc
-except ImportError:
-    pyodbc = None
-
-try:
-    import oracledb
-except ImportError:
-    oracledb = None
-
 from app import db
 from app.models import Instance
+from app.services.connection_factory import ConnectionFactory
 from app.utils.structlog_config import get_system_logger
 from app.utils.timezone import now
 
@@ -48,11 +31,14 @@ class DatabaseSizeService:
         Returns:
             Dict: 同步结果
         """
+        db_conn = None
+        failed = False
         try:
-            # 获取数据库连接
-            conn = self._get_connection(instance)
-            if not conn:
+            # 从共享连接池获取数据库连接
+            db_conn = ConnectionFactory.acquire_connection(instance)
+            if not db_conn:
                 return {"success": False, "error": "无法获取数据库连接"}
+            conn = db_conn.connection
 
             # 根据数据库类型获取大小信息
             if instance.db_type == "mysql":
@@ -78,81 +64,16 @@ class DatabaseSizeService:
             return result
 
         except Exception as e:
-            self.logger.error("数据库大小同步失败: {str(e)}")
+            failed = True
+            logger.error("数据库大小同步失败", module="database_size", instance_id=instance.id, error=str(e))
             return {
                 "success": False,
                 "error": f"{instance.db_type.upper()}数据库大小同步失败: {str(e)}",
                 "database_size": 0,
             }
-
-    def _get_connection(self, instance: Instance) -> Any | None:  # noqa: ANN401
-        """获取数据库连接"""
-        try:
-            if instance.db_type == "mysql":
-                return pymysql.connect(
-                    host=instance.host,
-                    port=instance.port,
-                    database=instance.database_name or "mysql",
-                    user=instance.credential.username,
-                    password=instance.credential.get_plain_password(),
-                )
-            if instance.db_type == "postgresql":
-                if psycopg is None:
-                    error_msg = "psycopg模块未安装，无法连接PostgreSQL"
-                    raise ImportError(error_msg)
-                return psycopg.connect(
-                    host=instance.host,
-                    port=instance.port,
-                    dbname=instance.database_name or "postgres",
-                    user=instance.credential.username,
-                    password=instance.credential.get_plain_password(),
-                )
-            if instance.db_type == "sqlserver":
-                import pymssql
-
-                return pymssql.connect(
-                    server=instance.host,
-                    port=instance.port,
-                    user=instance.credential.username,
-                    password=instance.credential.get_plain_password(),
-                    database=instance.database_name or "master",
-                    timeout=30,
-                    tds_version="7.4",
-                )
-            if instance.db_type == "oracle":
-                if oracledb is None:
-                    error_msg = "oracledb模块未安装，无法连接Oracle"
-                    raise ImportError(error_msg)
-
-                # 优先使用Thick模式连接（适用于所有Oracle版本，包括11g）
-                try:
-                    # 初始化Thick模式（需要Oracle Instant Client）
-                    oracledb.init_oracle_client()
-                    return oracledb.connect(
-                        user=instance.credential.username,
-                        password=instance.credential.get_plain_password(),
-                        dsn=f"{instance.host}:{instance.port}/{instance.database_name or 'ORCL'}",
-                    )
-                except oracledb.DatabaseError as e:
-                    # 如果Thick模式失败，尝试Thin模式（适用于Oracle 12c+）
-                    if "DPI-1047" in str(e) or "Oracle Client library" in str(e):
-                        # Thick模式失败，尝试Thin模式
-                        try:
-                            return oracledb.connect(
-                                user=instance.credential.username,
-                                password=instance.credential.get_plain_password(),
-                                dsn=f"{instance.host}:{instance.port}/{instance.database_name or 'ORCL'}",
-                            )
-                        except oracledb.DatabaseError:
-                            # 如果Thin模式也失败，抛出原始错误
-                            raise e from None
-                    else:
-                        raise
-            else:
-                return None
-        except Exception:
-            self.logger.error("数据库连接失败: {str(e)}")
-            return None
+        finally:
+            if db_conn is not None:
+                ConnectionFactory.release_connection(db_conn, discard=failed)
 
     def _get_mysql_size(self, instance: Instance, conn: Any) -> dict[str, Any]:  # noqa: ANN401
         """获取MySQL数据库大小"""
@@ -173,19 +94,14 @@ class DatabaseSizeService:
             result = cursor.fetchone()
             size_mb = result[0] if result and result[0] else 0
 
-            cursor.close()
-            conn.close()
-
             return {
                 "success": True,
                 "message": f"成功获取MySQL数据库大小: {size_mb} MB",
                 "database_size": size_mb,
             }
 
-        except Exception as e:
+        finally:
             cursor.close()
-            conn.close()
-            raise e
 
     def _get_postgresql_size(self, _instance: Instance, conn: Any) -> dict[str, Any]:  # noqa: ANN401
         """获取PostgreSQL数据库大小"""
@@ -204,19 +120,14 @@ class DatabaseSizeService:
             result = cursor.fetchone()
             size_mb = result[1] if result and result[1] else 0
 
-            cursor.close()
-            conn.close()
-
             return {
                 "success": True,
                 "message": f"成功获取PostgreSQL数据库大小: {size_mb:.2f} MB",
                 "database_size": round(size_mb, 2),
             }
 
-        except Exception as e:
+        finally:
             cursor.close()
-            conn.close()
-            raise e
 
     def _get_sqlserver_size(self, _instance: Instance, conn: Any) -> dict[str, Any]:  # noqa: ANN401
         """获取SQL Server数据库大小"""
@@ -237,19 +148,14 @@ class DatabaseSizeService:
             result = cursor.fetchone()
             size_mb = result[0] if result and result[0] else 0
 
-            cursor.close()
-            conn.close()
-
             return {
                 "success": True,
                 "message": f"成功获取SQL Server数据库大小: {size_mb:.2f} MB",
                 "database_size": round(size_mb, 2),
             }
 
-        except Exception as e:
+        finally:
             cursor.close()
-            conn.close()
-            raise e
 
     def _get_oracle_size(self, _instance: Instance, conn: Any) -> dict[str, Any]:  # noqa: ANN401
         """获取Oracle数据库大小"""
@@ -276,19 +182,14 @@ class DatabaseSizeService:
             results = cursor.fetchall()
             total_size_mb = sum(result[0] for result in results if result[0])
 
-            cursor.close()
-            conn.close()
-
             return {
                 "success": True,
                 "message": f"成功获取Oracle数据库大小: {total_size_mb:.2f} MB",
                 "database_size": round(total_size_mb, 2),
             }
 
-        except Exception as e:
+        finally:
             cursor.close()
-            conn.close()
-            raise e
 
 
 # 全局实例
@@ -1,23 +1,105 @@
 """
 鲸落 - 优化后的账户分类管理服务
-支持全量重新分类、按规则逐个处理、多分类支持
+支持全量重新分类、增量分类、按规则逐个处理、多分类支持
 """
 
+import hashlib
+import json
+import threading
 import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
 from typing import Any
 
+from sqlalchemy import func, or_, select, text
+
 from app import db
 from app.models.account_classification import (
     AccountClassification,
     AccountClassificationAssignment,
     ClassificationRule,
 )
+from app.models.classification_batch import ClassificationBatch
 from app.models.current_account_sync_data import CurrentAccountSyncData
 from app.models.instance import Instance
+from app.models.permission_snapshot import PermissionSnapshot
 from app.services.classification_batch_service import ClassificationBatchService
+from app.services.classification_matrix_engine import ENGINE_MATRIX, MatrixRuleEvaluator, resolve_engine
+from app.services.classification_rule_engine import (
+    CLASSIFICATION_FIELDS,
+    AccountPermissionView,
+    ClassificationAccount,
+    CompiledRule,
+    build_permission_view,
+    compile_rule,
+)
 from app.utils.structlog_config import log_error, log_info
 from app.utils.time_utils import time_utils
 
+# 增量分类的 PostgreSQL 咨询锁键：线程池和各同步工作进程中的增量分类串行执行
+INCREMENTAL_LOCK_KEY = 0x5748414C
+
+# 等待其他增量分类完成的最长时间（秒）及轮询间隔
+INCREMENTAL_LOCK_TIMEOUT_SECONDS = 600
+INCREMENTAL_LOCK_POLL_SECONDS = 1
+
+# 没有咨询锁的数据库（开发环境 SQLite）只能在本进程内串行
+_incremental_lock = threading.Lock()
+
+# 查找增量分类基准批次时检查的最近完成批次数
+BASELINE_BATCH_LOOKBACK = 50
+
+# 按账户ID查询、按分配ID更新时每条语句的 IN 列表长度
+ASSIGNMENT_CHUNK_SIZE = 1000
+
+
+def _chunks(values: list[Any]) -> Iterator[list[Any]]:
+    """按 ASSIGNMENT_CHUNK_SIZE 分段"""
+    for start in range(0, len(values), ASSIGNMENT_CHUNK_SIZE):
+        yield values[start : start + ASSIGNMENT_CHUNK_SIZE]
+
+
+@contextmanager
+def _incremental_pass_lock(timeout: float = INCREMENTAL_LOCK_TIMEOUT_SECONDS) -> Iterator[bool]:
+    """
+    增量分类互斥锁（同时结束的同步会话变更账户集合会重叠），返回是否在超时前获得锁
+
+    PostgreSQL 使用会话级咨询锁，持有在独立连接上，不受分类过程中 db.session 提交的影响；
+    进程异常退出时连接断开，锁随之释放
+    """
+    if db.engine.dialect.name != "postgresql":
+        acquired = _incremental_lock.acquire(timeout=timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _incremental_lock.release()
+        return
+
+    deadline = time.monotonic() + timeout
+    with db.engine.connect() as connection:
+        while True:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": INCREMENTAL_LOCK_KEY}
+            ).scalar()
+            connection.commit()
+            if acquired or time.monotonic() >= deadline:
+                break
+            time.sleep(INCREMENTAL_LOCK_POLL_SECONDS)
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                try:
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INCREMENTAL_LOCK_KEY})
+                    connection.commit()
+                except Exception:
+                    # 解锁失败时丢弃连接，避免锁随连接留在连接池中
+                    connection.invalidate()
+                    raise
+
 
 class OptimizedAccountClassificationService:
     """优化后的账户分类管理服务"""
@@ -31,6 +113,7 @@ class OptimizedAccountClassificationService:
         instance_id: int = None,
         batch_type: str = "manual",
         created_by: int = None,
+        engine: str | None = None,
     ) -> dict[str, Any]:
         """
         优化后的自动分类账户 - 全量重新分类
@@ -39,11 +122,14 @@ class OptimizedAccountClassificationService:
             instance_id: 实例ID，None表示所有实例
             batch_type: 批次类型
             created_by: 创建者用户ID
+            engine: 分类引擎（scalar/matrix/auto），None表示使用配置 account_sync.classification.engine
 
         Returns:
             Dict: 分类结果
         """
         start_time = time.time()
+        # 读取账户之前的时间：此后变更的账户由下一次增量分类处理
+        classified_at = time_utils.now()
 
         try:
             # 1. 获取所有活跃规则，按优先级排序
@@ -56,6 +142,8 @@ class OptimizedAccountClassificationService:
             if not accounts:
                 return {"success": False, "error": "没有需要分类的账户"}
 
+            engine = resolve_engine(engine, len(accounts))
+
             # 3. 创建批次记录
             self.batch_id = ClassificationBatchService.create_batch(
                 batch_type=batch_type,
@@ -71,16 +159,23 @@ class OptimizedAccountClassificationService:
                 total_rules=len(rules),
                 total_accounts=len(accounts),
                 instance_id=instance_id,
+                engine=engine,
             )
 
             # 4. 全量重新分类
-            result = self._full_reclassify_accounts(accounts, rules)
+            result = self._full_reclassify_accounts(accounts, rules, engine=engine)
 
-            # 5. 完成批次
+            # 5. 完成批次（记录分类基准，供后续增量分类使用）
             ClassificationBatchService.complete_batch(
                 self.batch_id,
                 status="completed",
-                batch_details=result,
+                batch_details={
+                    **result,
+                    "mode": "full",
+                    "instance_id": instance_id,
+                    "classified_at": classified_at.isoformat(),
+                    "rule_signatures": self._rule_signatures(rules),
+                },
             )
 
             # 6. 性能监控
@@ -100,6 +195,191 @@ class OptimizedAccountClassificationService:
             log_error(f"优化后的自动分类失败: {e}", module="account_classification")
             return {"success": False, "error": f"自动分类失败: {str(e)}"}
 
+    def auto_classify_accounts_incremental(
+        self,
+        instance_ids: list[int] | None = None,
+        changed_since: datetime | None = None,
+        batch_type: str = "incremental",
+        created_by: int = None,
+        engine: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        增量分类 - 只重新分类上次分类之后变更的账户
+
+        重新分类的账户：
+        - last_change_time 晚于基准批次（最近一次完成的全实例分类或增量分类）的账户
+        - 规则或其分类在基准批次之后被新增、编辑、停用或删除的数据库类型的全部账户
+        - instance_ids 的账户中 last_change_time 不早于 changed_since 的账户（同步结束时传入同步开始时间，
+          覆盖与其他分类批次并发提交的变更）
+
+        没有基准批次时执行全量重新分类。不同进程的增量分类串行执行，等待超时时返回失败。
+
+        Args:
+            instance_ids: 刚完成同步的实例ID列表
+            changed_since: 本次同步（会话）的开始时间
+            batch_type: 批次类型
+            created_by: 创建者用户ID
+            engine: 分类引擎（scalar/matrix/auto），None表示使用配置
+
+        Returns:
+            Dict: 分类结果，没有需要重新分类的账户时 skipped 为真
+        """
+        with _incremental_pass_lock() as acquired:
+            if not acquired:
+                return {"success": False, "error": "等待其他增量分类完成超时"}
+            start_time = time.time()
+            classified_at = time_utils.now()
+            rules = self._get_rules_sorted_by_priority()
+            baseline = self._get_incremental_baseline()
+            if baseline is None:
+                if not rules:
+                    return {"success": True, "skipped": True, "message": "没有可用的分类规则"}
+                log_info("没有可作为基准的分类批次，执行全量重新分类", module="account_classification")
+                return self.auto_classify_accounts_optimized(
+                    batch_type=batch_type, created_by=created_by, engine=engine
+                )
+
+            try:
+                signatures = self._rule_signatures(rules)
+                previous_signatures = baseline["rule_signatures"]
+                changed_db_types = sorted(
+                    db_type
+                    for db_type in signatures.keys() | previous_signatures.keys()
+                    if signatures.get(db_type) != previous_signatures.get(db_type)
+                )
+
+                accounts = self._get_changed_accounts(
+                    baseline["classified_at"], changed_db_types, instance_ids, changed_since
+                )
+                if not accounts:
+                    return {
+                        "success": True,
+                        "skipped": True,
+                        "message": "没有需要重新分类的账户",
+                        "changed_db_types": changed_db_types,
+                    }
+
+                engine = resolve_engine(engine, len(accounts))
+                self.batch_id = ClassificationBatchService.create_batch(
+                    batch_type=batch_type,
+                    created_by=created_by,
+                    total_rules=len(rules),
+                    active_rules=len(rules),
+                )
+
+                log_info(
+                    "开始增量分类",
+                    module="account_classification",
+                    batch_id=self.batch_id,
+                    baseline_batch_id=baseline["batch_id"],
+                    total_rules=len(rules),
+                    total_accounts=len(accounts),
+                    changed_db_types=changed_db_types,
+                    instance_ids=instance_ids,
+                    engine=engine,
+                )
+
+                # 规则已全部停用或删除时只清除这些账户的分类
+                result = self._full_reclassify_accounts(accounts, rules, engine=engine)
+                result["changed_db_types"] = changed_db_types
+
+                ClassificationBatchService.complete_batch(
+                    self.batch_id,
+                    status="completed",
+                    batch_details={
+                        **result,
+                        "mode": "incremental",
+                        "instance_id": None,
+                        "baseline_batch_id": baseline["batch_id"],
+                        "classified_at": classified_at.isoformat(),
+                        "rule_signatures": signatures,
+                    },
+                )
+
+                duration = time.time() - start_time
+                self._log_performance_stats(duration, len(accounts), len(rules), result)
+
+                return {
+                    "success": True,
+                    "message": "增量分类完成",
+                    "batch_id": self.batch_id,
+                    **result,
+                }
+
+            except Exception as e:
+                if self.batch_id:
+                    ClassificationBatchService.complete_batch(self.batch_id, status="failed", error_message=str(e))
+                log_error(f"增量分类失败: {e}", module="account_classification")
+                return {"success": False, "error": f"增量分类失败: {str(e)}"}
+
+    @staticmethod
+    def _rule_signatures(rules: list[ClassificationRule]) -> dict[str, str]:
+        """各数据库类型活跃规则的指纹（规则或其分类的新增、编辑、停用、删除都会改变指纹）"""
+        entries = defaultdict(list)
+        for rule in rules:
+            classification = rule.classification
+            entries[rule.db_type].append(
+                [
+                    rule.id,
+                    rule.classification_id,
+                    rule.rule_expression,
+                    rule.updated_at.isoformat() if rule.updated_at else None,
+                    classification.updated_at.isoformat() if classification and classification.updated_at else None,
+                ]
+            )
+        return {
+            db_type: hashlib.sha256(json.dumps(sorted(items), ensure_ascii=False).encode("utf-8")).hexdigest()
+            for db_type, items in entries.items()
+        }
+
+    def _get_incremental_baseline(self) -> dict[str, Any] | None:
+        """
+        增量分类的基准：最近一次完成的全实例全量分类或增量分类
+
+        只按单个实例执行的全量分类不能作为基准（其他实例的变更未被处理）；
+        未记录分类基准的旧批次同样跳过。
+        """
+        try:
+            batches = (
+                ClassificationBatch.query.filter_by(status="completed")
+                .order_by(ClassificationBatch.started_at.desc())
+                .limit(BASELINE_BATCH_LOOKBACK)
+                .all()
+            )
+            for batch in batches:
+                try:
+                    details = json.loads(batch.batch_details or "{}")
+                except (json.JSONDecodeError, TypeError):
+                    continue
+                if "rule_signatures" not in details or details.get("instance_id") is not None:
+                    continue
+                return {
+                    "batch_id": batch.batch_id,
+                    "classified_at": datetime.fromisoformat(details["classified_at"]),
+                    "rule_signatures": details["rule_signatures"],
+                }
+        except Exception as e:
+            log_error(f"获取增量分类基准批次失败: {e}", module="account_classification")
+        return None
+
+    def _get_changed_accounts(
+        self,
+        classified_at: datetime,
+        changed_db_types: list[str],
+        instance_ids: list[int] | None,
+        changed_since: datetime | None,
+    ) -> list[ClassificationAccount]:
+        """获取需要增量分类的账户"""
+        conditions = [CurrentAccountSyncData.last_change_time > classified_at]
+        if changed_db_types:
+            conditions.append(Instance.db_type.in_(changed_db_types))
+        if instance_ids and changed_since:
+            conditions.append(
+                CurrentAccountSyncData.instance_id.in_(instance_ids)
+                & (CurrentAccountSyncData.last_change_time >= changed_since)
+            )
+        return self._load_classification_accounts(or_(*conditions))
+
     def _get_rules_sorted_by_priority(self) -> list[ClassificationRule]:
         """获取按优先级排序的规则"""
         try:
@@ -116,57 +396,125 @@ class OptimizedAccountClassificationService:
             log_error(f"获取规则失败: {e}", module="account_classification")
             return []
 
-    def _get_accounts_to_classify(self, instance_id: int = None) -> list[CurrentAccountSyncData]:
+    def _get_accounts_to_classify(self, instance_id: int = None) -> list[ClassificationAccount]:
         """获取需要分类的账户"""
         try:
-            query = CurrentAccountSyncData.query.join(Instance).filter(
-                Instance.is_active.is_(True),
-                Instance.deleted_at.is_(None),
-                CurrentAccountSyncData.is_deleted.is_(False),
-            )
-
-            if instance_id:
-                query = query.filter(CurrentAccountSyncData.instance_id == instance_id)
-
-            return query.all()
+            conditions = [CurrentAccountSyncData.instance_id == instance_id] if instance_id else []
+            return self._load_classification_accounts(*conditions)
         except Exception as e:
             log_error(f"获取账户失败: {e}", module="account_classification")
             return []
 
+    def _load_classification_accounts(self, *conditions: Any) -> list[ClassificationAccount]:  # noqa: ANN401
+        """
+        分类读取路径：活跃实例下未删除的账户，按账户数据库类型各一次联表查询，
+        只选取 id、instance_id、实例数据库类型、权限快照摘要和分类读取的权限列（不加载ORM实体）；
+        引用权限快照的账户按摘要批量读取快照，每个快照只读取、解析一次，引用同一快照的账户共享权限字典
+
+        Args:
+            conditions: 附加过滤条件（可引用 CurrentAccountSyncData 和 Instance 的列）
+        """
+        filters = (
+            Instance.is_active.is_(True),
+            Instance.deleted_at.is_(None),
+            CurrentAccountSyncData.is_deleted.is_(False),
+            *conditions,
+        )
+        accounts = []
+        snapshot_accounts = []
+        for db_type, fields in [*CLASSIFICATION_FIELDS.items(), (None, ())]:
+            type_filter = (
+                CurrentAccountSyncData.db_type == db_type
+                if db_type
+                else CurrentAccountSyncData.db_type.not_in(list(CLASSIFICATION_FIELDS))
+            )
+            rows = db.session.execute(
+                select(
+                    CurrentAccountSyncData.id,
+                    CurrentAccountSyncData.instance_id,
+                    Instance.db_type,
+                    CurrentAccountSyncData.permission_digest,
+                    *(getattr(CurrentAccountSyncData, field) for field in fields),
+                )
+                .join(Instance, CurrentAccountSyncData.instance_id == Instance.id)
+                .where(type_filter, *filters)
+            )
+            for account_id, instance_id, instance_db_type, digest, *values in rows:
+                account = ClassificationAccount(
+                    account_id, instance_id, instance_db_type, digest, dict(zip(fields, values, strict=True))
+                )
+                accounts.append(account)
+                if digest and fields:
+                    snapshot_accounts.append((account, fields))
+
+        self._fill_permissions_from_snapshots(snapshot_accounts)
+        return accounts
+
+    @staticmethod
+    def _fill_permissions_from_snapshots(
+        snapshot_accounts: list[tuple[ClassificationAccount, tuple[str, ...]]],
+    ) -> None:
+        """行内权限列为空时从引用的权限快照读取（与 CurrentAccountSyncData 的权限字段描述符一致）"""
+        snapshots: dict[str, dict[str, Any]] = {}
+        for chunk in _chunks(sorted({account.permission_digest for account, _ in snapshot_accounts})):
+            rows = db.session.execute(
+                select(PermissionSnapshot.digest, PermissionSnapshot.permissions).where(
+                    PermissionSnapshot.digest.in_(chunk)
+                )
+            )
+            snapshots.update((digest, permissions or {}) for digest, permissions in rows)
+        shared: dict[tuple[str, tuple[str, ...]], dict[str, Any]] = {}
+        for account, fields in snapshot_accounts:
+            snapshot = snapshots.get(account.permission_digest)
+            if snapshot is None:
+                continue
+            if all(value is None for value in account.permissions.values()):
+                key = (account.permission_digest, fields)
+                permissions = shared.get(key)
+                if permissions is None:
+                    permissions = shared[key] = {field: snapshot.get(field) for field in fields}
+                account.permissions = permissions
+            else:
+                for field in fields:
+                    if account.permissions[field] is None:
+                        account.permissions[field] = snapshot.get(field)
+
     def _full_reclassify_accounts(
-        self, accounts: list[CurrentAccountSyncData], rules: list[ClassificationRule]
+        self, accounts: list[ClassificationAccount], rules: list[ClassificationRule], engine: str = "scalar"
     ) -> dict[str, Any]:
-        """全量重新分类账户"""
+        """
+        重新分类账户：在内存中计算目标分类分配，与当前活跃分配比较后在一个事务内只写入差异
+        （engine 为 matrix 时以位矩阵一次评估所有规则，结果与逐条评估一致）
+        """
         try:
-            # 1. 清除所有现有分类分配
-            self._clear_all_classifications(accounts)
+            # 1. 规则编译一次，账户权限按数据库类型分组并规范化一次
+            compiled_rules = [compile_rule(rule) for rule in rules]
+            permission_index = self._build_permission_index(accounts)
+            matrix = MatrixRuleEvaluator(compiled_rules, permission_index) if engine == ENGINE_MATRIX else None
 
-            # 2. 按规则逐个处理
-            total_classifications_added = 0
+            # 2. 按规则逐个计算目标分配 (账户ID, 分类ID)
+            desired_assignments: set[tuple[int, int]] = set()
             total_matches = 0
             failed_count = 0
             errors = []
 
-            for rule in rules:
+            for rule in compiled_rules:
                 try:
                     # 获取匹配该规则的账户
-                    matched_accounts = self._find_accounts_matching_rule(rule, accounts)
+                    if matrix is not None:
+                        matched_accounts = matrix.matching_accounts(rule)
+                    else:
+                        matched_accounts = self._find_accounts_matching_rule(rule, permission_index)
 
                     if matched_accounts:
-                        # 批量添加分类
-                        added_count = self._add_classification_to_accounts_batch(
-                            matched_accounts, rule.classification_id
-                        )
-
-                        total_classifications_added += added_count
+                        desired_assignments.update((account.id, rule.classification_id) for account in matched_accounts)
                         total_matches += len(matched_accounts)
 
                         log_info(
                             f"规则 {rule.rule_name} 处理完成",
                             module="account_classification",
-                            rule_id=rule.id,
+                            rule_id=rule.rule_id,
                             matched_accounts=len(matched_accounts),
-                            added_classifications=added_count,
                             batch_id=self.batch_id,
                         )
 
@@ -177,72 +525,175 @@ class OptimizedAccountClassificationService:
                     log_error(
                         error_msg,
                         module="account_classification",
-                        rule_id=rule.id,
+                        rule_id=rule.rule_id,
                         batch_id=self.batch_id,
                     )
 
-            # 3. 更新账户的最后分类时间
+            # 3. 与当前活跃分配比较，只写入新增和停用
+            changes = self._apply_assignment_diff([account.id for account in accounts], desired_assignments)
+
+            # 4. 更新账户的最后分类时间
             self._update_accounts_classification_time(accounts)
 
             return {
                 "total_accounts": len(accounts),
                 "total_rules": len(rules),
                 "classified_accounts": len({acc.id for acc in accounts}),
-                "total_classifications_added": total_classifications_added,
+                "total_classifications_added": changes["added"],
+                "total_classifications_removed": changes["removed"],
+                "unchanged_classifications": changes["unchanged"],
                 "total_matches": total_matches,
                 "failed_count": failed_count,
                 "errors": errors,
+                "engine": engine,
             }
 
         except Exception as e:
             log_error(f"全量重新分类失败: {e}", module="account_classification")
             raise
 
-    def _clear_all_classifications(self, accounts: list[CurrentAccountSyncData]) -> None:
-        """清除所有现有分类分配"""
+    def _apply_assignment_diff(
+        self, account_ids: list[int], desired_assignments: set[tuple[int, int]]
+    ) -> dict[str, int]:
+        """
+        将账户的活跃分类分配更新为目标分配（一个事务，写入量与实际变化成正比）
+
+        - 目标中已有活跃分配的保持不变（同一账户分类重复的活跃分配只保留最早的一条）
+        - 不在目标中的活跃分配（包括手动分配）停用，与全部清除后重新分配的结果一致
+        - 目标中缺少的分配优先重新激活该账户分类最近的非活跃分配，没有时新增
+
+        Returns:
+            Dict: added（新增或重新激活）、removed（停用）、unchanged（保持不变）
+        """
         try:
-            account_ids = [account.id for account in accounts]
-
-            # 批量更新，将现有分类分配标记为非活跃
-            AccountClassificationAssignment.query.filter(
-                AccountClassificationAssignment.account_id.in_(account_ids),
-                AccountClassificationAssignment.is_active.is_(True),
-            ).update(
-                {
-                    "is_active": False,
-                    "updated_at": time_utils.now(),
-                },
-                synchronize_session=False,
-            )
+            current_time = time_utils.now()
+            current_assignments = self._load_active_assignments(account_ids)
+
+            deactivate_ids = []
+            for key, assignment_ids in current_assignments.items():
+                deactivate_ids.extend(assignment_ids[1:] if key in desired_assignments else assignment_ids)
+            missing = desired_assignments - current_assignments.keys()
+
+            reactivate_ids = self._find_reactivatable_assignments(missing)
+
+            for chunk in _chunks(deactivate_ids):
+                AccountClassificationAssignment.query.filter(AccountClassificationAssignment.id.in_(chunk)).update(
+                    {"is_active": False, "updated_at": current_time}, synchronize_session=False
+                )
+
+            auto_assignment = {
+                "assigned_by": None,
+                "assignment_type": "auto",
+                "confidence_score": None,
+                "notes": None,
+                "batch_id": self.batch_id,
+                "is_active": True,
+                "updated_at": current_time,
+            }
+            if reactivate_ids:
+                db.session.bulk_update_mappings(
+                    AccountClassificationAssignment,
+                    [{"id": assignment_id, **auto_assignment} for assignment_id in reactivate_ids.values()],
+                )
+            new_assignments = [
+                {"account_id": account_id, "classification_id": classification_id, "created_at": current_time}
+                | auto_assignment
+                for account_id, classification_id in sorted(missing - reactivate_ids.keys())
+            ]
+            if new_assignments:
+                db.session.bulk_insert_mappings(AccountClassificationAssignment, new_assignments)
 
             db.session.commit()
 
             log_info(
-                f"已清除 {len(account_ids)} 个账户的现有分类",
+                "分类分配差异写入完成",
                 module="account_classification",
                 batch_id=self.batch_id,
+                added_count=len(new_assignments),
+                reactivated_count=len(reactivate_ids),
+                deactivated_count=len(deactivate_ids),
+                unchanged_count=len(desired_assignments) - len(missing),
             )
+            return {
+                "added": len(missing),
+                "removed": len(deactivate_ids),
+                "unchanged": len(desired_assignments) - len(missing),
+            }
 
         except Exception as e:
-            log_error(f"清除分类失败: {e}", module="account_classification")
+            log_error(f"写入分类分配失败: {e}", module="account_classification")
             db.session.rollback()
             raise
 
-    def _find_accounts_matching_rule(
-        self, rule: ClassificationRule, accounts: list[CurrentAccountSyncData]
-    ) -> list[CurrentAccountSyncData]:
-        """查找匹配规则的账户"""
-        matched_accounts = []
-
+    @staticmethod
+    def _load_active_assignments(account_ids: list[int]) -> dict[tuple[int, int], list[int]]:
+        """账户的活跃分类分配：(账户ID, 分类ID) -> 分配ID列表（按ID升序）"""
+        current_assignments: dict[tuple[int, int], list[int]] = defaultdict(list)
+        for chunk in _chunks(account_ids):
+            rows = (
+                db.session.query(
+                    AccountClassificationAssignment.id,
+                    AccountClassificationAssignment.account_id,
+                    AccountClassificationAssignment.classification_id,
+                )
+                .filter(
+                    AccountClassificationAssignment.account_id.in_(chunk),
+                    AccountClassificationAssignment.is_active.is_(True),
+                )
+                .order_by(AccountClassificationAssignment.id)
+                .all()
+            )
+            for assignment_id, account_id, classification_id in rows:
+                current_assignments[(account_id, classification_id)].append(assignment_id)
+        return current_assignments
+
+    @staticmethod
+    def _find_reactivatable_assignments(missing: set[tuple[int, int]]) -> dict[tuple[int, int], int]:
+        """缺少的分配中可重新激活的：(账户ID, 分类ID) -> 最近的非活跃分配ID"""
+        reactivate_ids = {}
+        for chunk in _chunks(sorted({account_id for account_id, _ in missing})):
+            rows = (
+                db.session.query(
+                    AccountClassificationAssignment.account_id,
+                    AccountClassificationAssignment.classification_id,
+                    func.max(AccountClassificationAssignment.id),
+                )
+                .filter(
+                    AccountClassificationAssignment.account_id.in_(chunk),
+                    AccountClassificationAssignment.is_active.is_(False),
+                )
+                .group_by(AccountClassificationAssignment.account_id, AccountClassificationAssignment.classification_id)
+                .all()
+            )
+            for account_id, classification_id, assignment_id in rows:
+                if (account_id, classification_id) in missing:
+                    reactivate_ids[(account_id, classification_id)] = assignment_id
+        return reactivate_ids
+
+    def _build_permission_index(
+        self, accounts: list[ClassificationAccount]
+    ) -> dict[str, list[tuple[AccountPermissionView, list[ClassificationAccount]]]]:
+        """按实例数据库类型分组账户并构建权限视图，引用同一权限快照的账户共享一个视图（只评估一次）"""
+        groups: dict[str, dict[Any, tuple[AccountPermissionView, list[ClassificationAccount]]]] = defaultdict(dict)
         for account in accounts:
-            # 检查数据库类型是否匹配
-            if account.instance.db_type != rule.db_type:
-                continue
-
-            # 评估规则
-            if self._evaluate_rule(account, rule):
-                matched_accounts.append(account)
+            key = account.permission_digest or ("account", account.id)
+            bucket = groups[account.db_type]
+            entry = bucket.get(key)
+            if entry is None:
+                entry = bucket[key] = (build_permission_view(account), [])
+            entry[1].append(account)
+        return {db_type: list(bucket.values()) for db_type, bucket in groups.items()}
 
+    def _find_accounts_matching_rule(
+        self,
+        rule: CompiledRule,
+        permission_index: dict[str, list[tuple[AccountPermissionView, list[ClassificationAccount]]]],
+    ) -> list[ClassificationAccount]:
+        """查找匹配规则的账户（只评估数据库类型相同的账户）"""
+        matched_accounts = []
+        for view, accounts in permission_index.get(rule.db_type, ()):
+            if rule.matches(view):
+                matched_accounts.extend(accounts)
         return matched_accounts
 
     def evaluate_rule(self, rule: ClassificationRule, account: CurrentAccountSyncData) -> bool:
@@ -250,267 +701,14 @@ class OptimizedAccountClassificationService:
         return self._evaluate_rule(account, rule)
 
     def _evaluate_rule(self, account: CurrentAccountSyncData, rule: ClassificationRule) -> bool:
-        """评估规则是否匹配账户"""
+        """评估规则是否匹配账户（规则编译结果按表达式缓存）"""
         try:
-            rule_expression = rule.get_rule_expression()
-            if not rule_expression:
-                return self._evaluate_legacy_rule(account, rule)
-
-            # 根据规则类型进行不同的匹配逻辑
-            if rule_expression.get("type") == "mysql_permissions":
-                return self._evaluate_mysql_rule(account, rule_expression)
-            if rule_expression.get("type") == "sqlserver_permissions":
-                return self._evaluate_sqlserver_rule(account, rule_expression)
-            if rule_expression.get("type") == "postgresql_permissions":
-                return self._evaluate_postgresql_rule(account, rule_expression)
-            if rule_expression.get("type") == "oracle_permissions":
-                return self._evaluate_oracle_rule(account, rule_expression)
-
-            return False
-
+            return compile_rule(rule).matches(build_permission_view(account))
         except Exception as e:
             log_error(f"评估规则失败: {e}", module="account_classification")
             return False
 
-    def _evaluate_mysql_rule(self, account: CurrentAccountSyncData, rule_expression: dict) -> bool:
-        """评估MySQL规则"""
-        try:
-            permissions = account.get_permissions_by_db_type()
-            if not permissions:
-                return False
-
-            operator = rule_expression.get("operator", "OR").upper()
-
-            # 检查全局权限
-            required_global = rule_expression.get("global_privileges", [])
-            if required_global:
-                actual_global = permissions.get("global_privileges", [])
-                if isinstance(actual_global, list):
-                    actual_global_set = set(actual_global)
-                else:
-                    actual_global_set = {p["privilege"] for p in actual_global if p.get("granted", False)}
-
-                if operator == "AND":
-                    if not all(perm in actual_global_set for perm in required_global):
-                        return False
-                else:
-                    if not any(perm in actual_global_set for perm in required_global):
-                        return False
-
-            # 检查排除权限
-            exclude_global = rule_expression.get("exclude_privileges", [])
-            if exclude_global:
-                actual_global = permissions.get("global_privileges", [])
-                if isinstance(actual_global, list):
-                    actual_global_set = set(actual_global)
-                else:
-                    actual_global_set = {p["privilege"] for p in actual_global if p.get("granted", False)}
-
-                if any(perm in actual_global_set for perm in exclude_global):
-                    return False
-
-            return True
-
-        except Exception as e:
-            log_error(f"评估MySQL规则失败: {e}", module="account_classification")
-            return False
-
-    def _evaluate_sqlserver_rule(self, account: CurrentAccountSyncData, rule_expression: dict) -> bool:
-        """评估SQL Server规则"""
-        try:
-            permissions = account.get_permissions_by_db_type()
-            if not permissions:
-                return False
-
-            operator = rule_expression.get("operator", "OR").upper()
-            match_results = []
-
-            # 检查服务器权限
-            required_server_perms = rule_expression.get("server_permissions", [])
-            if required_server_perms:
-                server_perms_data = permissions.get("server_permissions", [])
-                if server_perms_data and isinstance(server_perms_data[0], str):
-                    actual_server_perms = server_perms_data
-                else:
-                    actual_server_perms = [
-                        p["permission"] if isinstance(p, dict) else p
-                        for p in server_perms_data
-                        if isinstance(p, dict) and p.get("granted", False)
-                    ]
-
-                server_perms_match = all(perm in actual_server_perms for perm in required_server_perms)
-                match_results.append(server_perms_match)
-
-            # 检查服务器角色
-            required_server_roles = rule_expression.get("server_roles", [])
-            if required_server_roles:
-                server_roles_data = permissions.get("server_roles", [])
-                if server_roles_data and isinstance(server_roles_data[0], str):
-                    actual_server_roles = server_roles_data
-                else:
-                    actual_server_roles = [r["role"] if isinstance(r, dict) else r for r in server_roles_data]
-
-                server_roles_match = all(role in actual_server_roles for role in required_server_roles)
-                match_results.append(server_roles_match)
-
-            # 根据操作符决定匹配逻辑
-            if not match_results:
-                return True
-
-            if operator == "AND":
-                return all(match_results)
-            return any(match_results)
-
-        except Exception as e:
-            log_error(f"评估SQL Server规则失败: {e}", module="account_classification")
-            return False
-
-    def _evaluate_postgresql_rule(self, account: CurrentAccountSyncData, rule_expression: dict) -> bool:
-        """评估PostgreSQL规则"""
-        try:
-            permissions = account.get_permissions_by_db_type()
-            if not permissions:
-                return False
-
-            # 检查角色属性权限
-            required_role_attrs = rule_expression.get("role_attributes", [])
-            for required_attr in required_role_attrs:
-                role_attrs = permissions.get("role_attributes", {})
-                if not role_attrs.get(required_attr, False):
-                    return False
-
-            return True
-
-        except Exception as e:
-            log_error(f"评估PostgreSQL规则失败: {e}", module="account_classification")
-            return False
-
-    def _evaluate_oracle_rule(self, account: CurrentAccountSyncData, rule_expression: dict) -> bool:
-        """评估Oracle规则"""
-        try:
-            permissions = account.get_permissions_by_db_type()
-            if not permissions:
-                return False
-
-            # 检查角色
-            required_roles = rule_expression.get("roles", [])
-            if required_roles:
-                account_roles = permissions.get("oracle_roles", [])
-                for required_role in required_roles:
-                    if required_role not in account_roles:
-                        return False
-
-            # 检查系统权限
-            required_system_perms = rule_expression.get("system_privileges", [])
-            if required_system_perms:
-                account_system_perms = permissions.get("system_privileges", [])
-                for required_perm in required_system_perms:
-                    if required_perm not in account_system_perms:
-                        return False
-
-            return True
-
-        except Exception as e:
-            log_error(f"评估Oracle规则失败: {e}", module="account_classification")
-            return False
-
-    def _evaluate_legacy_rule(self, account: CurrentAccountSyncData, rule: ClassificationRule) -> bool:
-        """评估旧格式规则（字符串格式）"""
-        try:
-            permissions = account.get_permissions_by_db_type()
-            if not permissions:
-                return False
-
-            rule_expression = rule.rule_expression
-
-            if rule.db_type == "sqlserver":
-                if rule_expression == "server_roles.sysadmin":
-                    server_roles = permissions.get("server_roles", [])
-                    return isinstance(server_roles, list) and "sysadmin" in server_roles
-
-            elif rule.db_type == "mysql":
-                if rule_expression == "global_privileges.SUPER":
-                    global_privileges = permissions.get("global_privileges", [])
-                    return isinstance(global_privileges, list) and "SUPER" in global_privileges
-
-            elif rule.db_type == "postgresql":
-                if rule_expression == "role_attributes.CREATEROLE":
-                    role_attributes = permissions.get("role_attributes", [])
-                    return isinstance(role_attributes, list) and "CREATEROLE" in role_attributes
-
-            elif rule.db_type == "oracle" and rule_expression == "system_privileges.GRANT ANY PRIVILEGE":
-                system_privileges = permissions.get("system_privileges", [])
-                return isinstance(system_privileges, list) and "GRANT ANY PRIVILEGE" in system_privileges
-
-            return False
-
-        except Exception as e:
-            log_error(f"评估旧格式规则失败: {e}", module="account_classification")
-            return False
-
-    def _add_classification_to_accounts_batch(
-        self, matched_accounts: list[CurrentAccountSyncData], classification_id: int
-    ) -> int:
-        """批量添加分类到账户"""
-        try:
-            if not matched_accounts:
-                return 0
-
-            # 获取账户ID列表
-            account_ids = [account.id for account in matched_accounts]
-
-            # 查询已存在的分类分配（包括所有批次）
-            existing_assignments = (
-                db.session.query(AccountClassificationAssignment.account_id)
-                .filter(
-                    AccountClassificationAssignment.account_id.in_(account_ids),
-                    AccountClassificationAssignment.classification_id == classification_id,
-                    AccountClassificationAssignment.is_active.is_(True),
-                )
-                .all()
-            )
-
-            existing_account_ids = {assignment.account_id for assignment in existing_assignments}
-
-            # 准备新的分类分配
-            new_assignments = []
-            for account in matched_accounts:
-                if account.id not in existing_account_ids:
-                    new_assignments.append(
-                        {
-                            "account_id": account.id,
-                            "classification_id": classification_id,
-                            "assigned_by": None,
-                            "assignment_type": "auto",
-                            "notes": None,
-                            "batch_id": self.batch_id,
-                            "is_active": True,
-                            "created_at": time_utils.now(),
-                            "updated_at": time_utils.now(),
-                        }
-                    )
-
-            # 批量插入
-            if new_assignments:
-                db.session.bulk_insert_mappings(AccountClassificationAssignment, new_assignments)
-                db.session.commit()
-
-                log_info(
-                    "批量添加分类完成",
-                    module="account_classification",
-                    classification_id=classification_id,
-                    added_count=len(new_assignments),
-                    batch_id=self.batch_id,
-                )
-
-            return len(new_assignments)
-
-        except Exception as e:
-            log_error(f"批量添加分类失败: {e}", module="account_classification")
-            db.session.rollback()
-            return 0
-
-    def _update_accounts_classification_time(self, accounts: list[CurrentAccountSyncData]) -> None:
+    def _update_accounts_classification_time(self, accounts: list[ClassificationAccount]) -> None:
         """更新账户的最后分类时间"""
         # 注意：不再更新last_classified_at和last_classification_batch_id字段
         # 这些字段在数据库模型中不存在，已移除相关更新操作
@@ -604,33 +802,19 @@ class OptimizedAccountClassificationService:
     def get_rule_matched_accounts_count(self, rule_id: int) -> int:
         """获取规则匹配的账户数量（重新评估规则）"""
         try:
-            from app.models.account_classification import ClassificationRule
-            from app.models.current_account_sync_data import CurrentAccountSyncData
-
             # 获取规则
             rule = ClassificationRule.query.get(rule_id)
             if not rule:
                 return 0
 
-            # 获取所有活跃的账户
-            accounts = (
-                CurrentAccountSyncData.query.join(Instance, CurrentAccountSyncData.instance_id == Instance.id)
-                .filter(
-                    Instance.is_active.is_(True),
-                    CurrentAccountSyncData.is_deleted.is_(False),
-                    Instance.deleted_at.is_(None),
-                    Instance.db_type == rule.db_type,  # 只匹配相同数据库类型
-                )
-                .all()
-            )
+            # 只读取相同数据库类型的活跃账户
+            accounts = self._load_classification_accounts(Instance.db_type == rule.db_type)
 
             # 重新评估规则，统计匹配的账户数量
-            matched_count = 0
-            for account in accounts:
-                if self._evaluate_rule(account, rule):
-                    matched_count += 1
-
-            return matched_count
+            matched_accounts = self._find_accounts_matching_rule(
+                compile_rule(rule), self._build_permission_index(accounts)
+            )
+            return len(matched_accounts)
 
         except Exception as e:
             log_error(f"获取规则匹配账户数量失败: {str(e)}", module="account_classification")
@@ -0,0 +1,543 @@
+"""
+鲸落 - 权限位图编码
+以 PermissionConfig 为字典，把账户的每个权限字段编码为一个整数位图，字典外的权限放入溢出列表；
+权限比较、分类和“谁拥有某权限”查询可以直接做位运算，无需反复解析JSON并构建集合
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+import yaml
+from sqlalchemy import and_, false, or_
+
+from app import db
+from app.utils.structlog_config import get_sync_logger
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+# 账户权限字段对应的 PermissionConfig 权限类别（按数据库类型）
+PRIVILEGE_FIELD_CATEGORIES: dict[str, dict[str, str]] = {
+    "mysql": {
+        "global_privileges": "global_privileges",
+        "database_privileges": "database_privileges",
+    },
+    "postgresql": {
+        "predefined_roles": "predefined_roles",
+        "role_attributes": "role_attributes",
+        "database_privileges_pg": "database_privileges",
+        "tablespace_privileges": "tablespace_privileges",
+    },
+    "sqlserver": {
+        "server_roles": "server_roles",
+        "server_permissions": "server_permissions",
+        "database_roles": "database_roles",
+        "database_permissions": "database_privileges",
+    },
+    "oracle": {
+        "oracle_roles": "roles",
+        "system_privileges": "system_privileges",
+        "tablespace_privileges_oracle": "tablespace_privileges",
+    },
+}
+
+# 按库/表空间分组的权限字段（{范围: [权限]}），每个范围单独编码，字段位图为各范围的并集
+SCOPED_PRIVILEGE_FIELDS = frozenset(
+    {
+        "database_privileges",
+        "database_privileges_pg",
+        "tablespace_privileges",
+        "database_roles",
+        "database_permissions",
+        "tablespace_privileges_oracle",
+    }
+)
+
+# 旧格式权限项（字典）中权限名称所在的键
+_LEGACY_NAME_KEYS = ("privilege", "permission", "role", "name")
+
+
+@lru_cache(maxsize=1)
+def load_bitset_config() -> dict[str, float]:
+    """加载权限位图配置（account_sync.privilege_bitset），配置文件缺失或格式错误时使用默认值"""
+    bitset = {"vocabulary_ttl_seconds": 300.0}
+    if not os.path.exists(CONFIG_FILE):
+        return bitset
+    try:
+        with open(CONFIG_FILE, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        loaded = (config.get("account_sync") or {}).get("privilege_bitset") or {}
+        for key in bitset:
+            bitset[key] = max(0.0, float(loaded.get(key, bitset[key])))
+    except Exception:
+        return bitset
+    return bitset
+
+
+def _privilege_name(item: Any) -> str | None:  # noqa: ANN401
+    """权限项的名称：字符串直接使用；旧格式字典取 privilege/permission/role 键，granted 为假时视为未授予"""
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        if not item.get("granted", True):
+            return None
+        for key in _LEGACY_NAME_KEYS:
+            if item.get(key):
+                return str(item[key])
+    return None
+
+
+def privilege_names(value: Any) -> set[str]:  # noqa: ANN401
+    """权限字段值中的权限名称：列表逐项取名称，字典（如 role_attributes）取值为 True 的键"""
+    if isinstance(value, dict):
+        return {str(key) for key, item in value.items() if item is True}
+    if isinstance(value, list | tuple | set | frozenset):
+        return {name for item in value if (name := _privilege_name(item)) is not None}
+    return set()
+
+
+class PrivilegeVocabulary:
+    """
+    单个数据库类型的权限字典：权限字段 -> {权限名称: 位序号}
+
+    位序号按 PermissionConfig.id 顺序分配（包含已停用的配置），新增配置只追加高位；
+    token 为字典内容的指纹，持久化的位图与当前字典 token 不一致时需重新编码。
+    """
+
+    def __init__(self, db_type: str, entries: Iterable[tuple[str, str]]) -> None:
+        self.db_type = db_type
+        categories: dict[str, dict[str, int]] = {}
+        fingerprint = hashlib.sha256(db_type.encode("utf-8"))
+        for category, name in entries:
+            bits = categories.setdefault(category, {})
+            if name not in bits:
+                bits[name] = len(bits)
+                fingerprint.update(f"\n{category}\t{name}".encode())
+        self.token = fingerprint.hexdigest()[:16]
+        self.bits = {
+            field_name: categories.get(category, {})
+            for field_name, category in PRIVILEGE_FIELD_CATEGORIES.get(db_type, {}).items()
+        }
+
+    def mask(self, field_name: str, names: Iterable[str]) -> int:
+        """权限名称对应的位图，字典外的名称忽略"""
+        bits = self.bits.get(field_name, {})
+        mask = 0
+        for name in names:
+            if name in bits:
+                mask |= 1 << bits[name]
+        return mask
+
+    def encode_names(self, field_name: str, names: Iterable[str]) -> tuple[int, frozenset[str]]:
+        """编码权限名称，返回 (位图, 字典外的权限名称)"""
+        bits = self.bits.get(field_name, {})
+        mask = 0
+        overflow = set()
+        for name in names:
+            if name in bits:
+                mask |= 1 << bits[name]
+            else:
+                overflow.add(name)
+        return mask, frozenset(overflow)
+
+    def decode_mask(self, field_name: str, mask: int) -> set[str]:
+        """位图对应的权限名称"""
+        return {name for name, bit in self.bits.get(field_name, {}).items() if mask >> bit & 1}
+
+
+@dataclass
+class PrivilegeBits:
+    """账户权限的位图表示（字段位图 + 溢出列表，分范围字段另有各范围的位图）"""
+
+    vocabulary: PrivilegeVocabulary
+    masks: dict[str, int] = field(default_factory=dict)
+    overflow: dict[str, frozenset[str]] = field(default_factory=dict)
+    scopes: dict[str, dict[str, int]] = field(default_factory=dict)
+    scope_overflow: dict[str, dict[str, frozenset[str]]] = field(default_factory=dict)
+
+    def get(self, field_name: str, scope: str | None = None) -> tuple[int, frozenset[str]]:
+        """字段（或分范围字段某个库/表空间）的 (位图, 溢出权限)"""
+        if scope is None:
+            return self.masks.get(field_name, 0), self.overflow.get(field_name, frozenset())
+        return (
+            self.scopes.get(field_name, {}).get(scope, 0),
+            self.scope_overflow.get(field_name, {}).get(scope, frozenset()),
+        )
+
+    def has(self, field_name: str, name: str, *, scope: str | None = None) -> bool:
+        """是否拥有权限，指定 scope 时只检查该库/表空间"""
+        mask, overflow = self.get(field_name, scope)
+        bit = self.vocabulary.mask(field_name, (name,))
+        return bool(mask & bit) if bit else name in overflow
+
+    def has_all(self, field_name: str, names: Iterable[str]) -> bool:
+        """是否拥有全部权限"""
+        mask, overflow = self.get(field_name)
+        known, unknown = self.vocabulary.encode_names(field_name, names)
+        return mask & known == known and unknown <= overflow
+
+    def has_any(self, field_name: str, names: Iterable[str]) -> bool:
+        """是否拥有任一权限"""
+        mask, overflow = self.get(field_name)
+        known, unknown = self.vocabulary.encode_names(field_name, names)
+        return bool(mask & known) or not unknown.isdisjoint(overflow)
+
+    def names(self, field_name: str, scope: str | None = None) -> set[str]:
+        """字段（或某个库/表空间）中的全部权限名称"""
+        mask, overflow = self.get(field_name, scope)
+        return self.vocabulary.decode_mask(field_name, mask) | overflow
+
+    def diff(self, previous: "PrivilegeBits") -> dict[str, Any]:
+        """
+        与旧权限比较（两者须使用同一字典）
+
+        Returns:
+            Dict: 有变化的字段 -> {"added": [...], "removed": [...]}；分范围字段为 {范围: {"added", "removed"}}
+        """
+        changes = {}
+        for field_name in self.vocabulary.bits:
+            if field_name not in SCOPED_PRIVILEGE_FIELDS:
+                delta = self._delta(field_name, self.get(field_name), previous.get(field_name))
+                if delta:
+                    changes[field_name] = delta
+                continue
+
+            scope_changes = {}
+            scopes = set()
+            for bits in (self, previous):
+                scopes.update(bits.scopes.get(field_name, {}), bits.scope_overflow.get(field_name, {}))
+            for scope in sorted(scopes):
+                delta = self._delta(field_name, self.get(field_name, scope), previous.get(field_name, scope))
+                if delta:
+                    scope_changes[scope] = delta
+            if scope_changes:
+                changes[field_name] = scope_changes
+        return changes
+
+    def _delta(
+        self, field_name: str, current: tuple[int, frozenset[str]], previous: tuple[int, frozenset[str]]
+    ) -> dict[str, list[str]] | None:
+        """单个字段的增删权限，无变化返回None"""
+        if current == previous:
+            return None
+        (current_mask, current_overflow), (previous_mask, previous_overflow) = current, previous
+        added = self.vocabulary.decode_mask(field_name, current_mask & ~previous_mask)
+        removed = self.vocabulary.decode_mask(field_name, previous_mask & ~current_mask)
+        return {
+            "added": sorted(added | (current_overflow - previous_overflow)),
+            "removed": sorted(removed | (previous_overflow - current_overflow)),
+        }
+
+    def to_json(self) -> dict[str, Any]:
+        """持久化格式：位图以十六进制字符串保存（超过64位的位图在各数据库的JSON中都不丢精度），空项省略"""
+        data: dict[str, Any] = {"vocabulary": self.vocabulary.token}
+        masks = {key: format(mask, "x") for key, mask in self.masks.items() if mask}
+        overflow = {key: sorted(names) for key, names in self.overflow.items() if names}
+        scopes = {
+            key: {scope: format(mask, "x") for scope, mask in scope_masks.items()}
+            for key, scope_masks in self.scopes.items()
+            if scope_masks
+        }
+        scope_overflow = {
+            key: {scope: sorted(names) for scope, names in scope_names.items() if names}
+            for key, scope_names in self.scope_overflow.items()
+            if any(scope_names.values())
+        }
+        for key, value in (
+            ("masks", masks),
+            ("overflow", overflow),
+            ("scopes", scopes),
+            ("scope_overflow", scope_overflow),
+        ):
+            if value:
+                data[key] = value
+        return data
+
+    @classmethod
+    def from_json(cls, vocabulary: PrivilegeVocabulary, data: dict[str, Any] | None) -> "PrivilegeBits | None":
+        """解析持久化的位图，字典已变化（token 不一致）时返回None"""
+        if not data or data.get("vocabulary") != vocabulary.token:
+            return None
+        return cls(
+            vocabulary=vocabulary,
+            masks={key: int(mask, 16) for key, mask in (data.get("masks") or {}).items()},
+            overflow={key: frozenset(names) for key, names in (data.get("overflow") or {}).items()},
+            scopes={
+                key: {scope: int(mask, 16) for scope, mask in scope_masks.items()}
+                for key, scope_masks in (data.get("scopes") or {}).items()
+            },
+            scope_overflow={
+                key: {scope: frozenset(names) for scope, names in scope_names.items()}
+                for key, scope_names in (data.get("scope_overflow") or {}).items()
+            },
+        )
+
+
+class PrivilegeBitsetService:
+    """
+    权限位图服务
+
+    - 字典：按数据库类型从 PermissionConfig 加载，进程内缓存 vocabulary_ttl_seconds 秒
+    - 编码：同步写入权限快照时一并编码并持久化（permission_snapshots.privilege_bits），每个不同的权限组合只编码一次
+    - 读取：持久化位图的字典 token 与当前字典不一致时按权限JSON重新编码；定时清理任务把过期的位图写回
+    """
+
+    def __init__(self) -> None:
+        self.sync_logger = get_sync_logger()
+        self._lock = threading.Lock()
+        self._vocabularies: dict[str, tuple[float, PrivilegeVocabulary]] = {}
+
+    def get_vocabulary(self, db_type: str) -> PrivilegeVocabulary:
+        """获取数据库类型的权限字典"""
+        ttl = load_bitset_config()["vocabulary_ttl_seconds"]
+        with self._lock:
+            cached = self._vocabularies.get(db_type)
+            if cached is not None and time.monotonic() - cached[0] < ttl:
+                return cached[1]
+
+        from app.models.permission_config import PermissionConfig
+
+        try:
+            entries = (
+                db.session.query(PermissionConfig.category, PermissionConfig.permission_name)
+                .filter(PermissionConfig.db_type == db_type)
+                .order_by(PermissionConfig.id)
+                .all()
+            )
+        except Exception as e:
+            # 字典不可用时所有权限进入溢出列表，结果仍然正确；下次加载成功后位图按新 token 重新编码
+            self.sync_logger.warning("加载权限字典失败", module="privilege_bitset", db_type=db_type, error=str(e))
+            entries = []
+
+        vocabulary = PrivilegeVocabulary(db_type, entries)
+        with self._lock:
+            self._vocabularies[db_type] = (time.monotonic(), vocabulary)
+        return vocabulary
+
+    def invalidate(self, db_type: str | None = None) -> None:
+        """清除权限字典缓存（权限配置变更后调用）"""
+        with self._lock:
+            if db_type is None:
+                self._vocabularies.clear()
+            else:
+                self._vocabularies.pop(db_type, None)
+
+    def encode(self, db_type: str, permissions: dict[str, Any]) -> PrivilegeBits:
+        """
+        编码权限字段
+
+        Args:
+            db_type: 数据库类型
+            permissions: {权限字段: 值}，字段名与账户表的权限列一致
+
+        Returns:
+            PrivilegeBits: 权限位图
+        """
+        vocabulary = self.get_vocabulary(db_type)
+        bits = PrivilegeBits(vocabulary=vocabulary)
+        for field_name in vocabulary.bits:
+            value = permissions.get(field_name)
+            if field_name in SCOPED_PRIVILEGE_FIELDS and isinstance(value, dict):
+                scope_masks, scope_overflow = {}, {}
+                for scope, scope_value in value.items():
+                    mask, overflow = vocabulary.encode_names(field_name, privilege_names(scope_value))
+                    scope_masks[str(scope)] = mask
+                    if overflow:
+                        scope_overflow[str(scope)] = overflow
+                bits.scopes[field_name] = scope_masks
+                bits.scope_overflow[field_name] = scope_overflow
+                union_mask = 0
+                for mask in scope_masks.values():
+                    union_mask |= mask
+                bits.masks[field_name] = union_mask
+                bits.overflow[field_name] = frozenset().union(*scope_overflow.values())
+            else:
+                bits.masks[field_name], bits.overflow[field_name] = vocabulary.encode_names(
+                    field_name, privilege_names(value)
+                )
+        return bits
+
+    def load(self, db_type: str, data: dict[str, Any] | None, permissions: dict[str, Any]) -> PrivilegeBits:
+        """读取持久化的位图，字典已变化时按权限JSON重新编码"""
+        bits = PrivilegeBits.from_json(self.get_vocabulary(db_type), data)
+        return bits if bits is not None else self.encode(db_type, permissions)
+
+    def bits_for_account(self, account: Any) -> PrivilegeBits:  # noqa: ANN401
+        """账户的权限位图：引用权限快照的账户使用快照中持久化的位图"""
+        snapshot = account.permission_snapshot if account.permission_digest else None
+        if snapshot is not None:
+            return self.load(account.db_type, snapshot.privilege_bits, snapshot.permissions)
+        fields = PRIVILEGE_FIELD_CATEGORIES.get(account.db_type, {})
+        return self.encode(account.db_type, {field_name: getattr(account, field_name) for field_name in fields})
+
+    def privilege_condition(
+        self,
+        db_type: str,
+        field_name: str,
+        privilege: str,
+        *,
+        scope: str | None = None,
+        instance_id: int | None = None,
+    ) -> Any:  # noqa: ANN401
+        """
+        “拥有某权限”的账户查询条件，可与账户列表的其他过滤条件组合
+
+        先在权限快照（每个不同的权限组合一行）上做位运算筛选出快照键；
+        尚未迁移到权限快照的账户逐个判断后按ID匹配。
+
+        Args:
+            db_type: 数据库类型
+            field_name: 权限字段，如 global_privileges、server_roles
+            privilege: 权限名称
+            scope: 分范围字段的库/表空间名称，为空时检查所有范围
+            instance_id: 只逐个判断该实例中未迁移到权限快照的账户
+
+        Returns:
+            SQLAlchemy 过滤条件
+
+        Raises:
+            ValueError: 权限字段不属于该数据库类型
+        """
+        from app.models.current_account_sync_data import CurrentAccountSyncData
+
+        if field_name not in PRIVILEGE_FIELD_CATEGORIES.get(db_type, {}):
+            msg = f"{db_type} 没有权限字段 {field_name}"
+            raise ValueError(msg)
+
+        matched_digests = self._matching_snapshot_digests(db_type, field_name, privilege, scope)
+        legacy_query = CurrentAccountSyncData.query.filter(
+            CurrentAccountSyncData.db_type == db_type,
+            CurrentAccountSyncData.is_deleted.is_(False),
+            CurrentAccountSyncData.permission_digest.is_(None),
+        )
+        if instance_id is not None:
+            legacy_query = legacy_query.filter(CurrentAccountSyncData.instance_id == instance_id)
+        legacy_ids = [
+            account.id
+            for account in legacy_query
+            if self.bits_for_account(account).has(field_name, privilege, scope=scope)
+        ]
+
+        conditions = []
+        if matched_digests:
+            conditions.append(CurrentAccountSyncData.permission_digest.in_(matched_digests))
+        if legacy_ids:
+            conditions.append(CurrentAccountSyncData.id.in_(legacy_ids))
+        if not conditions:
+            return false()
+        return and_(CurrentAccountSyncData.db_type == db_type, or_(*conditions))
+
+    def find_account_ids_with_privilege(
+        self,
+        db_type: str,
+        field_name: str,
+        privilege: str,
+        *,
+        scope: str | None = None,
+        instance_id: int | None = None,
+    ) -> list[int]:
+        """
+        查询拥有某权限的账户（未删除）
+
+        Args:
+            db_type: 数据库类型
+            field_name: 权限字段，如 global_privileges、server_roles
+            privilege: 权限名称
+            scope: 分范围字段的库/表空间名称，为空时检查所有范围
+            instance_id: 只查询该实例的账户
+
+        Returns:
+            List[int]: 账户ID（升序）
+        """
+        from app.models.current_account_sync_data import CurrentAccountSyncData
+
+        query = db.session.query(CurrentAccountSyncData.id).filter(
+            CurrentAccountSyncData.is_deleted.is_(False),
+            self.privilege_condition(db_type, field_name, privilege, scope=scope, instance_id=instance_id),
+        )
+        if instance_id is not None:
+            query = query.filter(CurrentAccountSyncData.instance_id == instance_id)
+        return sorted(account_id for (account_id,) in query)
+
+    def _matching_snapshot_digests(self, db_type: str, field_name: str, privilege: str, scope: str | None) -> list[str]:
+        """拥有某权限的权限快照键：持久化位图直接做位运算，字典已变化的快照按权限JSON重新编码"""
+        from app.models.permission_snapshot import PermissionSnapshot
+
+        vocabulary = self.get_vocabulary(db_type)
+        matched_digests = []
+        stale_digests = []
+        for digest, data in db.session.query(PermissionSnapshot.digest, PermissionSnapshot.privilege_bits).filter(
+            PermissionSnapshot.db_type == db_type
+        ):
+            bits = PrivilegeBits.from_json(vocabulary, data)
+            if bits is None:
+                stale_digests.append(digest)
+            elif bits.has(field_name, privilege, scope=scope):
+                matched_digests.append(digest)
+
+        for start in range(0, len(stale_digests), 1000):
+            rows = db.session.query(PermissionSnapshot.digest, PermissionSnapshot.permissions).filter(
+                PermissionSnapshot.digest.in_(stale_digests[start : start + 1000])
+            )
+            matched_digests.extend(
+                digest
+                for digest, permissions in rows
+                if self.encode(db_type, permissions).has(field_name, privilege, scope=scope)
+            )
+        return matched_digests
+
+    def refresh_stale_snapshots(self, batch_size: int = 500) -> int:
+        """
+        重新编码字典已变化的权限快照位图
+
+        Returns:
+            int: 重新编码的快照数
+        """
+        from app.models.permission_snapshot import PermissionSnapshot
+
+        refreshed = 0
+        try:
+            for db_type in PRIVILEGE_FIELD_CATEGORIES:
+                self.invalidate(db_type)
+                token = self.get_vocabulary(db_type).token
+                while True:
+                    rows = (
+                        db.session.query(PermissionSnapshot.digest, PermissionSnapshot.permissions)
+                        .filter(
+                            PermissionSnapshot.db_type == db_type,
+                            or_(
+                                PermissionSnapshot.privilege_vocabulary.is_(None),
+                                PermissionSnapshot.privilege_vocabulary != token,
+                            ),
+                        )
+                        .limit(batch_size)
+                        .all()
+                    )
+                    if not rows:
+                        break
+                    db.session.bulk_update_mappings(
+                        PermissionSnapshot,
+                        [
+                            {
+                                "digest": digest,
+                                "privilege_vocabulary": token,
+                                "privilege_bits": self.encode(db_type, permissions).to_json(),
+                            }
+                            for digest, permissions in rows
+                        ],
+                    )
+                    db.session.commit()
+                    refreshed += len(rows)
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.error("重新编码权限快照位图失败", module="privilege_bitset", error=str(e))
+        return refreshed
+
+
+# 全局权限位图服务实例
+privilege_bitset_service = PrivilegeBitsetService()
@@ -3,12 +3,70 @@
 定义数据库同步的通用接口和流程
 """
 
+import hashlib
+import json
+import os
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+from functools import lru_cache
+from itertools import chain
 from typing import Any
 
+import yaml
+
 from app.models import Instance
 from app.utils.database_batch_manager import DatabaseBatchManager
 from app.utils.structlog_config import get_sync_logger
+from app.utils.sync_cancellation import SyncCancelled, check_cancelled
+from app.utils.sync_profiler import profile_iter, profile_stage
+
+ACCOUNT_SYNC_CONFIG_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "account_sync.yaml"
+)
+
+
+@lru_cache(maxsize=1)
+def get_stream_chunk_size() -> int:
+    """流式同步的分块大小（account_sync.streaming.chunk_size），决定同步过程的内存上限"""
+    chunk_size = 500
+    if os.path.exists(ACCOUNT_SYNC_CONFIG_FILE):
+        with open(ACCOUNT_SYNC_CONFIG_FILE, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        chunk_size = int(((config.get("account_sync") or {}).get("streaming") or {}).get("chunk_size", chunk_size))
+    return max(1, chunk_size)
+
+
+@lru_cache(maxsize=1)
+def get_stream_fetch_size() -> int:
+    """流式远程查询每批从服务端获取的行数（account_sync.streaming.fetch_size），决定单次网络往返的行数"""
+    fetch_size = 1000
+    if os.path.exists(ACCOUNT_SYNC_CONFIG_FILE):
+        with open(ACCOUNT_SYNC_CONFIG_FILE, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        fetch_size = int(((config.get("account_sync") or {}).get("streaming") or {}).get("fetch_size", fetch_size))
+    return max(1, fetch_size)
+
+
+class _AccountUpdate:
+    """
+    账户字段修改记录器
+
+    代理现有账户对象供适配器的 _update_account_permissions 修改，
+    修改写入 values 映射（含主键id）而不弄脏ORM对象，用于 bulk_update_mappings。
+    """
+
+    def __init__(self, account: Any) -> None:  # noqa: ANN401
+        object.__setattr__(self, "_account", account)
+        object.__setattr__(self, "values", {"id": account.id})
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        values = object.__getattribute__(self, "values")
+        if name in values:
+            return values[name]
+        return getattr(object.__getattribute__(self, "_account"), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:  # noqa: ANN401
+        self.values[name] = value
 
 
 class BaseSyncAdapter(ABC):
@@ -32,6 +90,31 @@ class BaseSyncAdapter(ABC):
         msg = "子类必须实现get_database_accounts方法"
         raise NotImplementedError(msg)
 
+    def iter_database_accounts(self, instance: Instance, connection: Any) -> Iterator[dict[str, Any]]:  # noqa: ANN401
+        """
+        按用户名升序（Python字符串顺序）逐个产出账户信息，供流式同步管道归并比较
+
+        默认实现一次性获取后排序；子类应按 get_stream_chunk_size() 分块获取权限，
+        使内存占用与分块大小而非账户总数相关。获取失败时应抛出异常而不是提前结束，
+        避免尚未产出的本地账户被误判为已删除。
+
+        Args:
+            instance: 数据库实例
+            connection: 数据库连接
+
+        Yields:
+            Dict: 账户信息（结构同 get_database_accounts）
+        """
+        yield from sorted(self.get_database_accounts(instance, connection), key=lambda account: account["username"])
+
+    @staticmethod
+    def _iter_chunks(items: list[Any], chunk_size: int | None = None) -> Iterator[list[Any]]:
+        """按流式分块大小切分列表，每个分块前检查同步是否已取消或超时"""
+        chunk_size = chunk_size or get_stream_chunk_size()
+        for start in range(0, len(items), chunk_size):
+            check_cancelled()
+            yield items[start : start + chunk_size]
+
     @abstractmethod
     def extract_permissions(self, account_data: dict[str, Any]) -> dict[str, Any]:
         """
@@ -60,6 +143,61 @@ class BaseSyncAdapter(ABC):
         msg = "子类必须实现format_account_data方法"
         raise NotImplementedError(msg)
 
+    # 目录变更令牌格式版本，令牌组成或账户解析逻辑变化时递增，使旧令牌失效
+    CATALOG_TOKEN_VERSION = 1
+
+    def get_catalog_change_token(self, instance: Instance, connection: Any) -> str | None:  # noqa: ANN401
+        """
+        获取账户目录变更令牌
+
+        令牌由少量聚合查询（账户/授权相关系统表的校验和、计数、修改时间）
+        以及当前账户过滤规则计算而来，令牌不变说明账户与权限没有变化。
+
+        Args:
+            instance: 数据库实例
+            connection: 数据库连接
+
+        Returns:
+            str: 令牌（SHA-256），不支持或查询失败时返回None（需执行全量同步）
+        """
+        try:
+            parts = self._collect_catalog_token_parts(instance, connection)
+        except Exception as e:
+            self.sync_logger.warning(
+                "获取账户目录变更令牌失败，执行全量同步",
+                module="sync_adapter",
+                instance_name=instance.name,
+                db_type=instance.db_type,
+                error=str(e),
+            )
+            # 失败的查询可能使连接处于中止事务状态（如PostgreSQL）
+            if hasattr(connection, "reset"):
+                connection.reset()
+            return None
+
+        if parts is None:
+            return None
+
+        from app.services.database_filter_manager import DatabaseFilterManager
+
+        payload = {
+            "version": self.CATALOG_TOKEN_VERSION,
+            "db_type": instance.db_type,
+            "filters": DatabaseFilterManager().get_filter_rules(instance.db_type),
+            "parts": parts,
+        }
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _collect_catalog_token_parts(self, instance: Instance, connection: Any) -> Any:  # noqa: ANN401
+        """
+        查询用于计算目录变更令牌的原始数据，子类按数据库类型实现
+
+        Returns:
+            可JSON序列化的查询结果，返回None表示不支持变更检测
+        """
+        return None
+
     def sync_accounts(self, instance: Instance, connection: Any, session_id: str) -> dict[str, Any]:  # noqa: ANN401
         """
         同步账户的统一流程
@@ -82,10 +220,14 @@ class BaseSyncAdapter(ABC):
                 session_id=session_id,
             )
 
-            # 1. 获取数据库账户信息
-            raw_accounts = self.get_database_accounts(instance, connection)
+            # 1. 流式获取数据库账户信息（按用户名升序）
+            raw_accounts = profile_iter("fetch", self.iter_database_accounts(instance, connection))
+
+            # 2. 逐个格式化账户数据
+            formatted_accounts = profile_iter("format", self._iter_formatted_accounts(instance, raw_accounts))
 
-            if not raw_accounts:
+            first_account = next(formatted_accounts, None)
+            if first_account is None:
                 self.sync_logger.warning(
                     "未获取到账户信息", module="sync_adapter", instance_name=instance.name, db_type=instance.db_type
                 )
@@ -97,23 +239,8 @@ class BaseSyncAdapter(ABC):
                     "removed_count": 0,
                 }
 
-            # 2. 格式化账户数据
-            formatted_accounts = []
-            for raw_account in raw_accounts:
-                try:
-                    formatted_account = self.format_account_data(raw_account)
-                    formatted_accounts.append(formatted_account)
-                except Exception as e:
-                    self.sync_logger.error(
-                        "格式化账户数据失败: %s",
-                        raw_account.get("username", "unknown"),
-                        module="sync_adapter",
-                        instance_name=instance.name,
-                        error=str(e),
-                    )
-
-            # 3. 同步账户到本地数据库
-            result = self._sync_accounts_to_local(instance, formatted_accounts, session_id)
+            # 3. 与本地账户归并比较并写入本地数据库
+            result = self._sync_accounts_to_local(instance, chain([first_account], formatted_accounts), session_id)
 
             self.sync_logger.info(
                 "%s账户同步完成",
@@ -141,30 +268,50 @@ class BaseSyncAdapter(ABC):
                 "removed_count": 0,
             }
 
+    def _iter_formatted_accounts(
+        self, instance: Instance, raw_accounts: Iterable[dict[str, Any]]
+    ) -> Iterator[dict[str, Any]]:
+        """逐个格式化账户数据，格式化失败的账户记录日志后跳过"""
+        for raw_account in raw_accounts:
+            # 远程账户按需拉取，逐个账户检查可在两次目录查询之间及时中止
+            check_cancelled()
+            try:
+                yield self.format_account_data(raw_account)
+            except Exception as e:
+                self.sync_logger.error(
+                    "格式化账户数据失败: %s",
+                    raw_account.get("username", "unknown"),
+                    module="sync_adapter",
+                    instance_name=instance.name,
+                    error=str(e),
+                )
+
     def _sync_accounts_to_local(
-        self, instance: Instance, accounts: list[dict[str, Any]], session_id: str
+        self, instance: Instance, accounts: Iterable[dict[str, Any]], session_id: str
     ) -> dict[str, Any]:
         """
-        将账户同步到本地数据库 - 批量提交优化版
+        将账户同步到本地数据库 - 流式归并版
 
-        1. 先确保账户一致性（新增/删除）
-        2. 再检查权限变更
-        3. 使用批量提交机制，提高性能和可靠性
+        1. 远程账户（按用户名升序）与本地账户（按相同顺序分块读取）归并比较，
+           产生新增/删除/权限检查事件
+        2. 事件写入批量管理器：新增账户多行INSERT（upsert），变更账户 bulk_update_mappings，
+           未变更账户合并为一条刷新 last_sync_time 的 UPDATE；每批次独立SAVEPOINT
+        3. 内存占用与分块大小相关，与账户总数无关
 
         Args:
             instance: 数据库实例
-            accounts: 格式化的账户列表
+            accounts: 格式化的账户（按用户名升序）
             session_id: 会话ID
 
         Returns:
             Dict: 同步结果
         """
+        from app.utils.time_utils import time_utils
 
         self.sync_logger.info(
             "开始账户一致性检查与权限同步",
             module="sync_adapter",
             instance_name=instance.name,
-            remote_account_count=len(accounts),
         )
 
         # 使用批量提交管理器
@@ -174,12 +321,25 @@ class BaseSyncAdapter(ABC):
             instance_name=instance.name,  # 每批次处理100个账户
         )
 
-        try:
-            # 第一步：账户一致性检查（批量处理）
-            sync_result = self._ensure_account_consistency_batch(instance, accounts, session_id, batch_manager)
+        added_count = 0
+        removed_count = 0
+        updated_count = 0
+        sync_time = time_utils.now()
 
-            # 第二步：权限变更检查（批量处理）
-            permission_result = self._check_permission_changes_batch(instance, accounts, session_id, batch_manager)
+        try:
+            # 归并比较计入 diff 阶段；拉取远程账户和批次写入分别计入各自阶段
+            with profile_stage("diff"):
+                for account_data, local_account in self._merge_join_accounts(instance, accounts):
+                    if local_account is None:
+                        added_count += self._queue_new_account(instance, account_data, session_id, batch_manager)
+                    elif account_data is None:
+                        self._queue_removed_account(local_account, sync_time, batch_manager)
+                        removed_count += 1
+                    else:
+                        self._queue_permission_check(
+                            instance, account_data, local_account, session_id, batch_manager, sync_time
+                        )
+                        updated_count += 1  # 即使无变更也要计数
 
             # 最终提交剩余的操作
             batch_manager.flush_remaining()
@@ -187,16 +347,20 @@ class BaseSyncAdapter(ABC):
             # 合并结果
             final_result = {
                 "success": True,
-                "synced_count": sync_result["synced_count"] + permission_result["updated_count"],
-                "added_count": sync_result["added_count"],
-                "modified_count": permission_result["updated_count"],
-                "removed_count": sync_result["removed_count"],
+                "synced_count": added_count + updated_count,
+                "added_count": added_count,
+                "modified_count": updated_count,
+                "removed_count": removed_count,
             }
 
             self.sync_logger.info("账户同步完成", module="sync_adapter", instance_name=instance.name, **final_result)
 
             return final_result
 
+        except SyncCancelled:
+            # 取消或超时：回滚未提交的批次后继续向上传递；已提交的批次保留，下次同步会与远程目录重新比对
+            batch_manager.rollback()
+            raise
         except Exception as e:
             # 发生错误时回滚所有未提交的操作
             batch_manager.rollback()
@@ -212,158 +376,248 @@ class BaseSyncAdapter(ABC):
                 "removed_count": 0,
             }
 
-    def _ensure_account_consistency_batch(
-        self, instance: Instance, accounts: list[dict[str, Any]], session_id: str, batch_manager: DatabaseBatchManager
-    ) -> dict[str, Any]:
+    def _merge_join_accounts(
+        self, instance: Instance, accounts: Iterable[dict[str, Any]]
+    ) -> Iterator[tuple[dict[str, Any] | None, Any]]:
         """
-        确保账户一致性 - 批量处理版本
+        远程账户与本地未删除账户按用户名归并
 
-        Args:
-            instance: 数据库实例
-            accounts: 远程账户列表
-            session_id: 会话ID
-            batch_manager: 批量管理器
-
-        Returns:
-            Dict: 一致性检查结果
+        Yields:
+            tuple: (远程账户, 本地账户)，仅远程存在为新增，仅本地存在为删除，两者都有需检查权限
         """
-        from app.models.current_account_sync_data import CurrentAccountSyncData
-        from app.utils.time_utils import time_utils
-
-        # 获取远程账户用户名集合
-        remote_usernames = {account["username"] for account in accounts}
-
-        # 获取本地所有未删除的账户
-        local_accounts = CurrentAccountSyncData.query.filter_by(
-            instance_id=instance.id, db_type=instance.db_type, is_deleted=False
-        ).all()
+        local_iter = self._iter_local_accounts(instance)
+        local_account = next(local_iter, None)
+        previous_username = None
 
-        local_usernames = {account.username for account in local_accounts}
+        for account_data in accounts:
+            username = account_data["username"]
+            if previous_username is not None and username <= previous_username:
+                msg = f"远程账户未按用户名升序排列: {previous_username} -> {username}"
+                raise ValueError(msg)
+            previous_username = username
+
+            while local_account is not None and local_account.username < username:
+                yield None, local_account
+                local_account = next(local_iter, None)
+
+            if local_account is not None and local_account.username == username:
+                yield account_data, local_account
+                local_account = next(local_iter, None)
+            else:
+                yield account_data, None
+
+        while local_account is not None:
+            yield None, local_account
+            local_account = next(local_iter, None)
+
+    def _iter_local_accounts(self, instance: Instance) -> Iterator[Any]:
+        """
+        按用户名升序分块读取本地未删除账户
 
-        # 找出需要新增的账户
-        accounts_to_add = remote_usernames - local_usernames
+        先只读取 (username, id) 并在Python中排序（与远程账户的排序规则一致，不受数据库排序规则影响），
+        再按分块读取完整记录。
+        """
+        from sqlalchemy.orm import lazyload
 
-        # 找出需要删除的账户
-        accounts_to_remove = local_usernames - remote_usernames
+        from app import db
+        from app.models.current_account_sync_data import CurrentAccountSyncData
 
-        self.sync_logger.info(
-            "账户一致性分析",
-            module="sync_adapter",
-            instance_name=instance.name,
-            remote_count=len(remote_usernames),
-            local_count=len(local_usernames),
-            to_add=len(accounts_to_add),
-            to_remove=len(accounts_to_remove),
+        local_keys = sorted(
+            (username, account_id)
+            for username, account_id in db.session.query(
+                CurrentAccountSyncData.username, CurrentAccountSyncData.id
+            ).filter_by(instance_id=instance.id, db_type=instance.db_type, is_deleted=False)
         )
 
-        added_count = 0
-        removed_count = 0
-
-        # 批量新增账户
-        for account_data in accounts:
-            if account_data["username"] in accounts_to_add:
-                try:
-                    new_account = self._create_new_account(
-                        instance.id,
-                        instance.db_type,
-                        account_data["username"],
-                        account_data["permissions"],
-                        account_data.get("is_superuser", False),
-                        session_id,
-                    )
-
-                    # 使用批量管理器添加操作
-                    batch_manager.add_operation("add", new_account, f"新增账户: {account_data['username']}")
-                    added_count += 1
-
-                except Exception as e:
-                    self.sync_logger.error(
-                        "创建账户对象失败: %s",
-                        account_data["username"],
-                        module="sync_adapter",
-                        instance_name=instance.name,
-                        error=str(e),
-                    )
-
-        # 批量标记删除账户
-        for local_account in local_accounts:
-            if local_account.username in accounts_to_remove:
-                local_account.is_deleted = True
-                local_account.deleted_time = time_utils.now()
-                local_account.last_change_type = "delete"
-                local_account.last_change_time = time_utils.now()
-
-                # 使用批量管理器添加更新操作
-                batch_manager.add_operation("update", local_account, f"标记删除账户: {local_account.username}")
-                removed_count += 1
-
-
-        return {"synced_count": added_count, "added_count": added_count, "removed_count": removed_count}
-
-    def _check_permission_changes_batch(
-        self, instance: Instance, accounts: list[dict[str, Any]], session_id: str, batch_manager: DatabaseBatchManager
-    ) -> dict[str, Any]:
+        for chunk in self._iter_chunks(local_keys):
+            # 权限快照只在指纹不一致需要逐字段比较时按需加载（同一快照在会话内只查询一次）
+            rows = (
+                CurrentAccountSyncData.query.options(lazyload(CurrentAccountSyncData.permission_snapshot))
+                .filter(CurrentAccountSyncData.id.in_([account_id for _, account_id in chunk]))
+                .all()
+            )
+            accounts_by_id = {account.id: account for account in rows}
+            for _, account_id in chunk:
+                account = accounts_by_id.get(account_id)
+                if account is not None:
+                    yield account
+
+    def _queue_new_account(
+        self, instance: Instance, account_data: dict[str, Any], session_id: str, batch_manager: DatabaseBatchManager
+    ) -> int:
         """
-        检查权限变更 - 批量处理版本
-
-        Args:
-            instance: 数据库实例
-            accounts: 远程账户列表
-            session_id: 会话ID
-            batch_manager: 批量管理器
+        新增账户（多行INSERT；曾被标记删除的同名账户通过upsert恢复）
 
         Returns:
-            Dict: 权限变更结果
+            int: 成功加入批次的账户数（0或1）
         """
-        from app.models.current_account_sync_data import CurrentAccountSyncData
-
-        # 获取本地现有账户（排除刚刚标记删除的）
-        existing_accounts = CurrentAccountSyncData.query.filter_by(
-            instance_id=instance.id, db_type=instance.db_type, is_deleted=False
-        ).all()
-
-        # 建立本地账户映射
-        local_account_map = {account.username: account for account in existing_accounts}
-
-        updated_count = 0
-
-        # 检查每个远程账户的权限变更
-        for account_data in accounts:
-            username = account_data["username"]
-            local_account = local_account_map.get(username)
+        from app.utils.time_utils import time_utils
 
-            if local_account:
-                # 检测权限变更
-                changes = self._detect_changes(
-                    local_account, account_data["permissions"], is_superuser=account_data.get("is_superuser", False)
-                )
+        try:
+            new_account = self._create_new_account(
+                instance.id,
+                instance.db_type,
+                account_data["username"],
+                account_data["permissions"],
+                is_superuser=account_data.get("is_superuser", False),
+                session_id=session_id,
+            )
+            new_account.permission_hash = self._compute_permission_hash(
+                account_data["permissions"], is_superuser=account_data.get("is_superuser", False)
+            )
+            self._attach_permission_snapshot(instance.db_type, new_account, batch_manager)
+            new_account.is_deleted = False
+            new_account.deleted_time = None
+            # 显式赋值：恢复已删除账户时 upsert 同样更新变更时间，增量分类才会处理该账户
+            new_account.last_change_type = "add"
+            new_account.last_change_time = time_utils.now()
+
+            batch_manager.add_insert(
+                new_account,
+                f"新增账户: {account_data['username']}",
+                conflict_keys=("instance_id", "db_type", "username"),
+            )
+            return 1
 
-                if changes:
-                    # 有变更才更新
-                    self._update_account_permissions(
-                        local_account, account_data["permissions"], is_superuser=account_data.get("is_superuser", False)
-                    )
+        except Exception as e:
+            self.sync_logger.error(
+                "创建账户对象失败: %s",
+                account_data["username"],
+                module="sync_adapter",
+                instance_name=instance.name,
+                error=str(e),
+            )
+            return 0
 
-                    # 使用批量管理器添加更新操作
-                    batch_manager.add_operation("update", local_account, f"更新账户权限: {username}")
+    def _queue_removed_account(
+        self, local_account: Any, deleted_time: Any, batch_manager: DatabaseBatchManager  # noqa: ANN401
+    ) -> None:
+        """标记删除远程已不存在的账户"""
+        from app.models.current_account_sync_data import CurrentAccountSyncData
 
-                    # 记录变更日志
-                    self._log_changes_batch(instance.id, instance.db_type, username, changes, session_id, batch_manager)
+        batch_manager.add_bulk_update(
+            CurrentAccountSyncData,
+            {
+                "id": local_account.id,
+                "is_deleted": True,
+                "deleted_time": deleted_time,
+                "last_change_type": "delete",
+                "last_change_time": deleted_time,
+            },
+            f"标记删除账户: {local_account.username}",
+        )
 
-                    updated_count += 1
+    def _queue_permission_check(
+        self,
+        instance: Instance,
+        account_data: dict[str, Any],
+        local_account: Any,  # noqa: ANN401
+        session_id: str,
+        batch_manager: DatabaseBatchManager,
+        sync_time: Any,  # noqa: ANN401
+    ) -> None:
+        """检查现有账户的权限变更，按结果加入刷新/更新操作"""
+        from app.models.current_account_sync_data import CurrentAccountSyncData
 
-                else:
-                    # 无变更，只更新同步时间
-                    from app.utils.time_utils import time_utils
+        username = account_data["username"]
+        is_superuser = account_data.get("is_superuser", False)
+        permission_hash = self._compute_permission_hash(account_data["permissions"], is_superuser=is_superuser)
+
+        # 权限指纹一致时跳过逐字段比较
+        if local_account.permission_hash == permission_hash and local_account.permission_digest:
+            # 无变更，只更新同步时间（同批次合并为一条UPDATE）
+            batch_manager.add_touch(
+                CurrentAccountSyncData,
+                local_account.id,
+                {"last_sync_time": sync_time},
+                f"更新同步时间: {username}",
+                scope={"instance_id": instance.id},
+            )
+            return
+
+        changes = {}
+        if local_account.permission_hash != permission_hash:
+            changes = self._detect_changes(local_account, account_data["permissions"], is_superuser=is_superuser)
+
+        account_update = _AccountUpdate(local_account)
+        if changes:
+            # 有变更才更新：适配器的字段修改记录为映射，通过 bulk_update_mappings 写入，权限字段改为引用权限快照
+            self._update_account_permissions(account_update, account_data["permissions"], is_superuser=is_superuser)
+            account_update.permission_hash = permission_hash
+            self._attach_permission_snapshot(instance.db_type, account_update, batch_manager)
+            batch_manager.add_bulk_update(CurrentAccountSyncData, account_update.values, f"更新账户权限: {username}")
+
+            # 记录变更日志
+            self._log_changes_batch(instance.id, instance.db_type, username, changes, session_id, batch_manager)
+            return
+
+        # 无变更但指纹缺失或过期、或权限仍保存在行内（历史数据）：回填指纹、迁移到权限快照并更新同步时间
+        account_update.permission_hash = permission_hash
+        account_update.last_sync_time = sync_time
+        if not local_account.permission_digest:
+            self._attach_permission_snapshot(instance.db_type, account_update, batch_manager)
+        batch_manager.add_bulk_update(CurrentAccountSyncData, account_update.values, f"更新同步时间: {username}")
+
+    def _attach_permission_snapshot(
+        self,
+        db_type: str,
+        account: Any,  # noqa: ANN401
+        batch_manager: DatabaseBatchManager,
+    ) -> str:
+        """
+        将账户的权限字段存入内容寻址的权限快照，账户改为引用快照
 
-                    local_account.last_sync_time = time_utils.now()
+        权限字段规范化后取SHA-256作为快照键：内容相同的账户（包括不同实例）共享同一快照，
+        快照以忽略冲突的多行INSERT写入（同批次内去重），账户行只写入 permission_digest 并清空行内权限列。
 
-                    # 使用批量管理器添加更新操作
-                    batch_manager.add_operation("update", local_account, f"更新同步时间: {username}")
+        Args:
+            db_type: 数据库类型
+            account: 新账户对象，或现有账户的 _AccountUpdate（未修改的字段取自现有账户）
+            batch_manager: 批量管理器
 
-                    updated_count += 1  # 即使无变更也要计数
+        Returns:
+            str: 权限快照键
+        """
+        from app.models.current_account_sync_data import PERMISSION_FIELDS, CurrentAccountSyncData
+        from app.models.permission_snapshot import PermissionSnapshot
+        from app.services.privilege_bitset import privilege_bitset_service
+
+        permissions = {
+            field: self._normalize_permission_value(value)
+            for field in PERMISSION_FIELDS
+            if (value := getattr(account, field)) is not None
+        }
+        canonical = json.dumps(
+            {"db_type": db_type, "permissions": permissions},
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+        # 权限位图随快照只编码一次
+        privilege_bits = privilege_bitset_service.encode(db_type, permissions)
+        batch_manager.add_insert(
+            PermissionSnapshot(
+                digest=digest,
+                db_type=db_type,
+                permissions=permissions,
+                privilege_vocabulary=privilege_bits.vocabulary.token,
+                privilege_bits=privilege_bits.to_json(),
+            ),
+            f"写入权限快照: {digest[:12]}",
+            conflict_keys=("digest",),
+            ignore_conflicts=True,
+        )
 
-        return {"updated_count": updated_count}
+        if isinstance(account, _AccountUpdate):
+            # 适配器按字段名记录的权限修改已存入快照，映射中只保留列属性
+            for field in PERMISSION_FIELDS:
+                account.values.pop(field, None)
+        for key, value in CurrentAccountSyncData.snapshot_reference_values(digest).items():
+            setattr(account, key, value)
+        return digest
 
     def _log_changes_batch(
         self,
@@ -397,162 +651,37 @@ class BaseSyncAdapter(ABC):
             status="success",
         )
 
-        # 使用批量管理器添加日志记录
-        batch_manager.add_operation("add", change_log, f"记录变更日志: {username}")
+        # 使用批量管理器添加日志记录（多行INSERT）
+        batch_manager.add_insert(change_log, f"记录变更日志: {username}", stage="changelog")
 
-    def _ensure_account_consistency(
-        self, instance: Instance, accounts: list[dict[str, Any]], session_id: str
-    ) -> dict[str, Any]:
+    @classmethod
+    def _compute_permission_hash(cls, permissions: dict[str, Any], *, is_superuser: bool) -> str:
         """
-        确保账户一致性 - 处理账户的新增和删除
+        计算账户权限指纹
 
-        Args:
-            instance: 数据库实例
-            accounts: 远程账户列表
-            session_id: 会话ID
-
-        Returns:
-            Dict: 一致性检查结果
-        """
-        from app.models.current_account_sync_data import CurrentAccountSyncData
-        from app.utils.time_utils import time_utils
-
-        # 获取远程账户用户名集合
-        remote_usernames = {account["username"] for account in accounts}
-
-        # 获取本地所有未删除的账户
-        local_accounts = CurrentAccountSyncData.query.filter_by(
-            instance_id=instance.id, db_type=instance.db_type, is_deleted=False
-        ).all()
-
-        local_usernames = {account.username for account in local_accounts}
-
-        # 找出需要新增的账户
-        accounts_to_add = remote_usernames - local_usernames
-
-        # 找出需要删除的账户
-        accounts_to_remove = local_usernames - remote_usernames
-
-        self.sync_logger.info(
-            "账户一致性分析",
-            module="sync_adapter",
-            instance_name=instance.name,
-            remote_count=len(remote_usernames),
-            local_count=len(local_usernames),
-            to_add=len(accounts_to_add),
-            to_remove=len(accounts_to_remove),
-        )
-
-        added_count = 0
-        removed_count = 0
-
-        # 新增账户
-        for account_data in accounts:
-            if account_data["username"] in accounts_to_add:
-                try:
-                    new_account = self._create_new_account(
-                        instance.id,
-                        instance.db_type,
-                        account_data["username"],
-                        account_data["permissions"],
-                        account_data.get("is_superuser", False),
-                        session_id,
-                    )
-                    from app import db
-
-                    db.session.add(new_account)
-                    added_count += 1
-
-                    self.sync_logger.info(
-                        "新增账户: %s", account_data["username"], module="sync_adapter", instance_name=instance.name
-                    )
-                except Exception as e:
-                    self.sync_logger.error(
-                        "新增账户失败: %s",
-                        account_data["username"],
-                        module="sync_adapter",
-                        instance_name=instance.name,
-                        error=str(e),
-                    )
-
-        # 标记删除账户
-        for local_account in local_accounts:
-            if local_account.username in accounts_to_remove:
-                local_account.is_deleted = True
-                local_account.deleted_time = time_utils.now()
-                local_account.last_change_type = "delete"
-                local_account.last_change_time = time_utils.now()
-                removed_count += 1
-
-                self.sync_logger.info(
-                    "标记删除账户: %s", local_account.username, module="sync_adapter", instance_name=instance.name
-                )
-
-        return {"synced_count": added_count, "added_count": added_count, "removed_count": removed_count}
-
-    def _check_permission_changes(
-        self, instance: Instance, accounts: list[dict[str, Any]], session_id: str
-    ) -> dict[str, Any]:
-        """
-        检查权限变更 - 只对现有账户进行权限比较
+        对权限数据做规范化（字典按键排序、列表按内容排序）后取SHA-256，
+        与 _detect_changes 的集合比较语义一致：列表顺序不同不视为变更。
 
         Args:
-            instance: 数据库实例
-            accounts: 远程账户列表
-            session_id: 会话ID
+            permissions: 格式化后的权限数据
+            is_superuser: 是否超级用户
 
         Returns:
-            Dict: 权限变更结果
+            str: 64位十六进制哈希
         """
-        from app.models.current_account_sync_data import CurrentAccountSyncData
-
-        # 获取本地现有账户（排除刚刚标记删除的）
-        existing_accounts = CurrentAccountSyncData.query.filter_by(
-            instance_id=instance.id, db_type=instance.db_type, is_deleted=False
-        ).all()
-
-        # 建立本地账户映射
-        local_account_map = {account.username: account for account in existing_accounts}
-
-        updated_count = 0
-
-        # 检查每个远程账户的权限变更
-        for account_data in accounts:
-            username = account_data["username"]
-            local_account = local_account_map.get(username)
-
-            if local_account:
-                # 检测权限变更
-                changes = self._detect_changes(
-                    local_account, account_data["permissions"], is_superuser=account_data.get("is_superuser", False)
-                )
-
-                if changes:
-                    # 有变更才更新
-                    self._update_account_permissions(
-                        local_account, account_data["permissions"], is_superuser=account_data.get("is_superuser", False)
-                    )
-
-                    # 记录变更日志
-                    self._log_changes(instance.id, instance.db_type, username, changes, session_id)
-
-                    updated_count += 1
-
-                    self.sync_logger.info(
-                        "更新账户权限: %s",
-                        username,
-                        module="sync_adapter",
-                        instance_name=instance.name,
-                        changes=list(changes.keys()),
-                    )
-                else:
-                    # 无变更，只更新同步时间
-                    from app.utils.time_utils import time_utils
-
-                    local_account.last_sync_time = time_utils.now()
-
-
-        return {"updated_count": updated_count}
+        payload = {"is_superuser": bool(is_superuser), "permissions": cls._normalize_permission_value(permissions)}
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _normalize_permission_value(cls, value: Any) -> Any:  # noqa: ANN401
+        """递归规范化权限数据，使内容相同的权限得到相同的序列化结果"""
+        if isinstance(value, dict):
+            return {str(key): cls._normalize_permission_value(item) for key, item in value.items()}
+        if isinstance(value, list | tuple | set | frozenset):
+            items = [cls._normalize_permission_value(item) for item in value]
+            return sorted(items, key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False, default=str))
+        return value
 
     @abstractmethod
     def _detect_changes(
@@ -615,41 +744,6 @@ class BaseSyncAdapter(ABC):
         msg = "子类必须实现_create_new_account方法"
         raise NotImplementedError(msg)
 
-    def _log_changes(
-        self, instance_id: int, db_type: str, username: str, changes: dict[str, Any], session_id: str
-    ) -> None:
-        """
-        记录变更日志
-
-        Args:
-            instance_id: 实例ID
-            db_type: 数据库类型
-            username: 用户名
-            changes: 变更详情
-            session_id: 会话ID
-        """
-        from app import db
-        from app.models.account_change_log import AccountChangeLog
-
-        # 生成变更描述
-        change_descriptions = self._generate_change_description(db_type, changes)
-        change_description = "; ".join(change_descriptions) if change_descriptions else "权限已更新"
-
-        # 判断变更类型
-        change_type = self._determine_change_type(changes)
-
-        change_log = AccountChangeLog(
-            instance_id=instance_id,
-            db_type=db_type,
-            username=username,
-            change_type=change_type,
-            session_id=session_id,
-            privilege_diff=changes,
-            message=change_description,
-            status="success",
-        )
-        db.session.add(change_log)
-
     @abstractmethod
     def _generate_change_description(self, db_type: str, changes: dict[str, Any]) -> list[str]:
         """
@@ -3,6 +3,10 @@
 处理MySQL特定的账户同步逻辑
 """
 
+import json
+import re
+from collections import defaultdict
+from collections.abc import Iterator
 from typing import Any
 
 from app.models import Instance
@@ -11,12 +15,71 @@ from app.services.database_filter_manager import DatabaseFilterManager
 from app.utils.safe_query_builder import SafeQueryBuilder
 from app.utils.time_utils import time_utils
 
-from .base_sync_adapter import BaseSyncAdapter
+from .base_sync_adapter import BaseSyncAdapter, get_stream_fetch_size
 
 
 class MySQLSyncAdapter(BaseSyncAdapter):
     """MySQL数据库同步适配器"""
 
+    # mysql.user 权限列 -> 权限名，顺序与 SHOW GRANTS 输出一致（Grant_priv 以 WITH GRANT OPTION 体现）
+    GLOBAL_PRIVILEGE_COLUMNS = (
+        ("Select_priv", "SELECT"),
+        ("Insert_priv", "INSERT"),
+        ("Update_priv", "UPDATE"),
+        ("Delete_priv", "DELETE"),
+        ("Create_priv", "CREATE"),
+        ("Drop_priv", "DROP"),
+        ("Reload_priv", "RELOAD"),
+        ("Shutdown_priv", "SHUTDOWN"),
+        ("Process_priv", "PROCESS"),
+        ("File_priv", "FILE"),
+        ("References_priv", "REFERENCES"),
+        ("Index_priv", "INDEX"),
+        ("Alter_priv", "ALTER"),
+        ("Show_db_priv", "SHOW DATABASES"),
+        ("Super_priv", "SUPER"),
+        ("Create_tmp_table_priv", "CREATE TEMPORARY TABLES"),
+        ("Lock_tables_priv", "LOCK TABLES"),
+        ("Execute_priv", "EXECUTE"),
+        ("Repl_slave_priv", "REPLICATION SLAVE"),
+        ("Repl_client_priv", "REPLICATION CLIENT"),
+        ("Create_view_priv", "CREATE VIEW"),
+        ("Show_view_priv", "SHOW VIEW"),
+        ("Create_routine_priv", "CREATE ROUTINE"),
+        ("Alter_routine_priv", "ALTER ROUTINE"),
+        ("Create_user_priv", "CREATE USER"),
+        ("Event_priv", "EVENT"),
+        ("Trigger_priv", "TRIGGER"),
+        ("Create_tablespace_priv", "CREATE TABLESPACE"),
+        ("Create_role_priv", "CREATE ROLE"),
+        ("Drop_role_priv", "DROP ROLE"),
+    )
+
+    # mysql.db 权限列 -> 权限名
+    DATABASE_PRIVILEGE_COLUMNS = (
+        ("Select_priv", "SELECT"),
+        ("Insert_priv", "INSERT"),
+        ("Update_priv", "UPDATE"),
+        ("Delete_priv", "DELETE"),
+        ("Create_priv", "CREATE"),
+        ("Drop_priv", "DROP"),
+        ("References_priv", "REFERENCES"),
+        ("Index_priv", "INDEX"),
+        ("Alter_priv", "ALTER"),
+        ("Create_tmp_table_priv", "CREATE TEMPORARY TABLES"),
+        ("Lock_tables_priv", "LOCK TABLES"),
+        ("Execute_priv", "EXECUTE"),
+        ("Create_view_priv", "CREATE VIEW"),
+        ("Show_view_priv", "SHOW VIEW"),
+        ("Create_routine_priv", "CREATE ROUTINE"),
+        ("Alter_routine_priv", "ALTER ROUTINE"),
+        ("Event_priv", "EVENT"),
+        ("Trigger_priv", "TRIGGER"),
+    )
+
+    # 批量模式读取的用户属性列（不同版本可能缺失）
+    USER_ATTRIBUTE_COLUMNS = ("Grant_priv", "account_locked", "plugin", "password_last_changed", "User_attributes")
+
     def __init__(self) -> None:
         super().__init__()
         self.filter_manager = DatabaseFilterManager()
@@ -26,66 +89,93 @@ class MySQLSyncAdapter(BaseSyncAdapter):
         获取MySQL数据库中的所有账户信息
         """
         try:
-            # 构建安全的查询条件
-            filter_conditions = self._build_filter_conditions()
-            where_clause, params = filter_conditions
-
-            # 查询用户基本信息
-            user_sql = f"""
-                SELECT
-                    User as username,
-                    Host as host,
-                    Super_priv as is_superuser
-                FROM mysql.user
-                WHERE User != '' AND {where_clause}
-                ORDER BY User, Host
-            """
+            return list(self.iter_database_accounts(instance, connection))
+        except Exception as e:
+            self.sync_logger.error(
+                "获取MySQL账户失败", module="mysql_sync_adapter", instance_name=instance.name, error=str(e)
+            )
+            return []
 
-            users = connection.execute_query(user_sql, params)
+    def iter_database_accounts(self, instance: Instance, connection: Any) -> Iterator[dict[str, Any]]:  # noqa: ANN401
+        """
+        按 user@host 升序逐个产出MySQL账户信息
 
-            accounts = []
-            for user_row in users:
-                username, host, is_superuser = user_row
+        账户按分块使用集合查询批量读取 mysql.user/db/tables_priv/columns_priv/role_edges
+        在内存中重建权限；无法重建的账户（或分块批量读取失败时）回退到逐个 SHOW GRANTS。
+        """
+        # 构建安全的查询条件
+        filter_conditions = self._build_filter_conditions()
+        where_clause, params = filter_conditions
+
+        # 查询用户基本信息
+        user_sql = f"""
+            SELECT
+                User as username,
+                Host as host,
+                Super_priv as is_superuser
+            FROM mysql.user
+            WHERE User != '' AND {where_clause}
+        """
 
-                # 为MySQL创建包含主机名的唯一用户名
-                unique_username = f"{username}@{host}"
+        # 按 user@host 的Python字符串顺序排序，与本地账户的归并顺序一致
+        users = sorted(connection.execute_query(user_sql, params), key=lambda row: f"{row[0]}@{row[1]}")
+
+        account_count = 0
+        fallback_count = 0
+        privilege_schema = None
+        for chunk in self._iter_chunks(users):
+            try:
+                # 服务器版本和权限表结构对整个实例不变，只读取一次
+                if privilege_schema is None:
+                    privilege_schema = self._read_privilege_schema(connection)
+                is_mysql8, table_columns = privilege_schema
+                bulk_permissions = self._collect_permissions_bulk(
+                    connection,
+                    where_clause,
+                    params,
+                    is_mysql8=is_mysql8,
+                    table_columns=table_columns,
+                    usernames=sorted({row[0] for row in chunk}),
+                )
+            except Exception as e:
+                self.sync_logger.warning(
+                    "批量读取MySQL权限失败，回退到SHOW GRANTS",
+                    module="mysql_sync_adapter",
+                    instance_name=instance.name,
+                    error=str(e),
+                )
+                bulk_permissions = {}
 
-                # 获取用户权限（包含所有type_specific信息）
-                permissions = self._get_user_permissions(connection, username, host)
+            for user_row in chunk:
+                username, host, is_superuser = user_row
 
-                # 直接从数据库查询is_locked状态
-                is_locked_sql = "SELECT account_locked FROM mysql.user WHERE User = %s AND Host = %s"
-                is_locked_result = connection.execute_query(is_locked_sql, (username, host))
-                is_locked = is_locked_result[0][0] == "Y" if is_locked_result else False
+                # 获取用户权限（包含所有type_specific信息），批量结果缺失时回退到SHOW GRANTS
+                permissions = bulk_permissions.get((username, host))
+                if permissions is None:
+                    fallback_count += 1
+                    permissions = self._get_user_permissions(connection, username, host)
 
                 # 将is_active信息添加到type_specific中
-                permissions["type_specific"]["is_active"] = not is_locked
+                permissions["type_specific"]["is_active"] = not permissions["type_specific"].get("is_locked", False)
 
-                account_data = {
-                    "username": unique_username,
+                account_count += 1
+                yield {
+                    # 为MySQL创建包含主机名的唯一用户名
+                    "username": f"{username}@{host}",
                     "original_username": username,
                     "host": host,
                     "is_superuser": is_superuser == "Y",
                     "permissions": permissions,
                 }
 
-                accounts.append(account_data)
-
-            self.sync_logger.info(
-                "获取到%d个MySQL账户",
-                len(accounts),
-                module="mysql_sync_adapter",
-                instance_name=instance.name,
-                account_count=len(accounts),
-            )
-
-            return accounts
-
-        except Exception as e:
-            self.sync_logger.error(
-                "获取MySQL账户失败", module="mysql_sync_adapter", instance_name=instance.name, error=str(e)
-            )
-            return []
+        self.sync_logger.info(
+            "获取到%d个MySQL账户",
+            account_count,
+            module="mysql_sync_adapter",
+            instance_name=instance.name,
+            account_count=account_count,
+            show_grants_fallback_count=fallback_count,
+        )
 
     def _build_filter_conditions(self) -> tuple[str, list]:
         """构建过滤条件"""
@@ -102,6 +192,343 @@ class MySQLSyncAdapter(BaseSyncAdapter):
 
         return builder.build_where_clause()
 
+    def _read_privilege_schema(self, connection: Any) -> tuple[bool, dict[str, list[str]]]:  # noqa: ANN401
+        """
+        读取服务器版本和权限相关系统表的列
+
+        Returns:
+            tuple: (是否 MySQL 8.0 及以上, {系统表名: 列名列表})
+        """
+        version_result = connection.execute_query("SELECT VERSION()")
+        version = str(version_result[0][0]) if version_result else ""
+        # MySQL 8.0 起全局静态权限总是逐项列出，5.7/MariaDB 全部授予时显示 ALL PRIVILEGES
+        is_mysql8 = "mariadb" not in version.lower() and self._parse_major_version(version) >= 8
+
+        # 一次性读取相关系统表的列，兼容不同版本的表结构
+        column_rows = connection.execute_query(
+            """
+            SELECT TABLE_NAME, COLUMN_NAME
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = 'mysql'
+              AND TABLE_NAME IN ('user', 'db', 'tables_priv', 'columns_priv', 'role_edges', 'global_grants')
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+            """
+        )
+        table_columns: dict[str, list[str]] = defaultdict(list)
+        for table_name, column_name in column_rows:
+            if re.fullmatch(r"\w+", str(column_name)):
+                table_columns[str(table_name).lower()].append(str(column_name))
+        return is_mysql8, table_columns
+
+    def _collect_permissions_bulk(
+        self,
+        connection: Any,  # noqa: ANN401
+        where_clause: str,
+        params: list,
+        *,
+        is_mysql8: bool,
+        table_columns: dict[str, list[str]],
+        usernames: list[str] | None = None,
+    ) -> dict[tuple[str, str], dict[str, Any]]:
+        """
+        以集合查询批量构建账户的权限数据
+
+        Args:
+            connection: 数据库连接
+            where_clause: mysql.user 过滤条件
+            params: 过滤条件参数
+            is_mysql8: 是否 MySQL 8.0 及以上（见 _read_privilege_schema）
+            table_columns: 权限相关系统表的列（见 _read_privilege_schema）
+            usernames: 仅读取这些用户（流式分块），为None时读取全部
+
+        Returns:
+            Dict: {(user, host): permissions}，无法可靠重建的账户不在结果中（由调用方回退到SHOW GRANTS）
+        """
+        user_columns = table_columns.get("user", [])
+        user_priv_columns = [c for c in user_columns if c.endswith("_priv") and c != "Grant_priv"]
+        user_attr_columns = [c for c in self.USER_ATTRIBUTE_COLUMNS if c in user_columns]
+        select_columns = ["User", "Host", *user_priv_columns, *user_attr_columns]
+        user_filter, user_params = self._build_user_in_clause("User", usernames)
+        user_rows = connection.execute_query(
+            f"""
+            SELECT {", ".join(f"`{c}`" for c in select_columns)}
+            FROM mysql.user
+            WHERE User != '' AND {where_clause}{user_filter}
+            """,
+            [*params, *user_params],
+        )
+
+        db_grants = self._fetch_database_grants(connection, table_columns.get("db", []), usernames)
+        table_grants = self._fetch_table_grants(connection, table_columns, usernames)
+        role_grants = self._fetch_role_grants(connection, table_columns, usernames)
+        dynamic_grants = self._fetch_dynamic_grants(connection, table_columns, usernames)
+
+        known_global = {column for column, _ in self.GLOBAL_PRIVILEGE_COLUMNS}
+        global_names = dict(self.GLOBAL_PRIVILEGE_COLUMNS)
+        result: dict[tuple[str, str], dict[str, Any]] = {}
+
+        for row in user_rows:
+            values = dict(zip(select_columns, row, strict=False))
+            key = (values["User"], values["Host"])
+            granted_columns = [c for c in user_priv_columns if values.get(c) == "Y"]
+
+            # 未识别的权限列有授权、或存在部分撤销（partial revokes）时无法可靠重建
+            if any(c not in known_global for c in granted_columns) or self._has_partial_revokes(
+                values.get("User_attributes")
+            ):
+                continue
+            if key in db_grants and db_grants[key] is None:
+                continue
+
+            if not is_mysql8 and user_priv_columns and len(granted_columns) == len(user_priv_columns):
+                global_privileges = ["ALL PRIVILEGES"]
+            else:
+                global_privileges = [
+                    name for column, name in self.GLOBAL_PRIVILEGE_COLUMNS if column in granted_columns
+                ] or ["USAGE"]
+            dynamic = dynamic_grants.get(key, [])
+            global_privileges.extend(sorted(priv for priv, _ in dynamic))
+
+            can_grant = values.get("Grant_priv") == "Y"
+            password_last_changed = values.get("password_last_changed")
+            type_specific = {
+                "host": key[1],
+                "original_username": key[0],
+                "grant_statements": self._build_grant_statements(
+                    key,
+                    global_privileges=[p for p in global_privileges if p not in {priv for priv, _ in dynamic}],
+                    can_grant=can_grant,
+                    dynamic=dynamic,
+                    databases=db_grants.get(key, {}),
+                    tables=table_grants.get(key, {}),
+                    roles=role_grants.get(key, []),
+                    backtick=is_mysql8,
+                ),
+            }
+            if "Grant_priv" in user_columns:
+                type_specific["can_grant"] = can_grant
+            if "account_locked" in user_columns:
+                type_specific["is_locked"] = values.get("account_locked") == "Y"
+            if "plugin" in user_columns:
+                type_specific["plugin"] = values.get("plugin")
+            if "password_last_changed" in user_columns:
+                type_specific["password_last_changed"] = (
+                    password_last_changed.isoformat() if password_last_changed else None
+                )
+
+            result[key] = {
+                "global_privileges": global_privileges,
+                "database_privileges": {
+                    db_name: grant["privileges"] for db_name, grant in db_grants.get(key, {}).items()
+                },
+                "type_specific": type_specific,
+            }
+
+        return result
+
+    @staticmethod
+    def _build_user_in_clause(column: str, usernames: list[str] | None) -> tuple[str, list[str]]:
+        """构建按用户名分块过滤的 AND column IN (...) 条件，usernames为None时不过滤"""
+        if usernames is None:
+            return "", []
+        if not usernames:
+            return " AND 1 = 0", []
+        return f" AND {column} IN ({', '.join(['%s'] * len(usernames))})", list(usernames)
+
+    def _fetch_database_grants(
+        self, connection: Any, db_columns: list[str], usernames: list[str] | None = None  # noqa: ANN401
+    ) -> dict[tuple[str, str], dict[str, dict[str, Any]] | None]:
+        """
+        批量读取 mysql.db 库级权限
+
+        Returns:
+            Dict: {(user, host): {db: {"privileges": [...], "grantable": bool}}}，
+                  存在无法识别的库级权限列授权时值为None
+        """
+        db_priv_columns = [c for c in db_columns if c.endswith("_priv") and c != "Grant_priv"]
+        if not db_priv_columns:
+            return {}
+
+        known = {column for column, _ in self.DATABASE_PRIVILEGE_COLUMNS}
+        has_grant = "Grant_priv" in db_columns
+        select_columns = ["User", "Host", "Db", *db_priv_columns, *(["Grant_priv"] if has_grant else [])]
+        user_filter, user_params = self._build_user_in_clause("User", usernames)
+        rows = connection.iter_query(
+            f"SELECT {', '.join(f'`{c}`' for c in select_columns)} FROM mysql.db "
+            f"WHERE User != ''{user_filter} ORDER BY Db",
+            user_params,
+            fetch_size=get_stream_fetch_size(),
+        )
+
+        grants: dict[tuple[str, str], dict[str, dict[str, Any]] | None] = {}
+        for row in rows:
+            values = dict(zip(select_columns, row, strict=False))
+            key = (values["User"], values["Host"])
+            if key in grants and grants[key] is None:
+                continue
+            granted = [c for c in db_priv_columns if values.get(c) == "Y"]
+            if any(c not in known for c in granted):
+                grants[key] = None
+                continue
+
+            if len(granted) == len(db_priv_columns):
+                privileges = ["ALL PRIVILEGES"]
+            else:
+                privileges = [name for column, name in self.DATABASE_PRIVILEGE_COLUMNS if column in granted] or [
+                    "USAGE"
+                ]
+            grants.setdefault(key, {})[values["Db"]] = {
+                "privileges": privileges,
+                "grantable": has_grant and values.get("Grant_priv") == "Y",
+            }
+        return grants
+
+    def _fetch_table_grants(
+        self, connection: Any, table_columns: dict[str, list[str]], usernames: list[str] | None = None  # noqa: ANN401
+    ) -> dict[tuple[str, str], dict[tuple[str, str], dict[str, Any]]]:
+        """批量读取 mysql.tables_priv / mysql.columns_priv 表级和列级权限"""
+        grants: dict[tuple[str, str], dict[tuple[str, str], dict[str, Any]]] = defaultdict(dict)
+        if "tables_priv" not in table_columns:
+            return grants
+
+        user_filter, user_params = self._build_user_in_clause("User", usernames)
+        rows = connection.iter_query(
+            "SELECT User, Host, Db, Table_name, Table_priv FROM mysql.tables_priv "
+            f"WHERE User != ''{user_filter} ORDER BY Db, Table_name",
+            user_params,
+            fetch_size=get_stream_fetch_size(),
+        )
+        for user, host, db_name, table_name, table_priv in rows:
+            privileges = self._split_set_value(table_priv)
+            grants[(user, host)][(db_name, table_name)] = {
+                "privileges": [p for p in privileges if p != "GRANT"],
+                "grantable": "GRANT" in privileges,
+                "columns": defaultdict(list),
+            }
+
+        if "columns_priv" in table_columns:
+            rows = connection.iter_query(
+                "SELECT User, Host, Db, Table_name, Column_name, Column_priv FROM mysql.columns_priv "
+                f"WHERE User != ''{user_filter} ORDER BY Db, Table_name, Column_name",
+                user_params,
+                fetch_size=get_stream_fetch_size(),
+            )
+            for user, host, db_name, table_name, column_name, column_priv in rows:
+                table_grant = grants[(user, host)].setdefault(
+                    (db_name, table_name), {"privileges": [], "grantable": False, "columns": defaultdict(list)}
+                )
+                for privilege in self._split_set_value(column_priv):
+                    table_grant["columns"][privilege].append(column_name)
+        return grants
+
+    def _fetch_role_grants(
+        self, connection: Any, table_columns: dict[str, list[str]], usernames: list[str] | None = None  # noqa: ANN401
+    ) -> dict[tuple[str, str], list[tuple[str, str]]]:
+        """批量读取 mysql.role_edges 角色授予关系（MySQL 8.0+）"""
+        roles: dict[tuple[str, str], list[tuple[str, str]]] = defaultdict(list)
+        if "role_edges" not in table_columns:
+            return roles
+
+        user_filter, user_params = self._build_user_in_clause("TO_USER", usernames)
+        rows = connection.iter_query(
+            "SELECT FROM_USER, FROM_HOST, TO_USER, TO_HOST FROM mysql.role_edges "
+            f"WHERE 1 = 1{user_filter} ORDER BY FROM_USER, FROM_HOST",
+            user_params,
+            fetch_size=get_stream_fetch_size(),
+        )
+        for from_user, from_host, to_user, to_host in rows:
+            roles[(to_user, to_host)].append((from_user, from_host))
+        return roles
+
+    def _fetch_dynamic_grants(
+        self, connection: Any, table_columns: dict[str, list[str]], usernames: list[str] | None = None  # noqa: ANN401
+    ) -> dict[tuple[str, str], list[tuple[str, bool]]]:
+        """批量读取 mysql.global_grants 动态权限（MySQL 8.0+）"""
+        dynamic: dict[tuple[str, str], list[tuple[str, bool]]] = defaultdict(list)
+        if "global_grants" not in table_columns:
+            return dynamic
+
+        user_filter, user_params = self._build_user_in_clause("USER", usernames)
+        rows = connection.iter_query(
+            f"SELECT USER, HOST, PRIV, WITH_GRANT_OPTION FROM mysql.global_grants WHERE 1 = 1{user_filter}",
+            user_params,
+            fetch_size=get_stream_fetch_size(),
+        )
+        for user, host, privilege, with_grant_option in rows:
+            dynamic[(user, host)].append((str(privilege).upper(), with_grant_option == "Y"))
+        return dynamic
+
+    def _build_grant_statements(
+        self,
+        key: tuple[str, str],
+        *,
+        global_privileges: list[str],
+        can_grant: bool,
+        dynamic: list[tuple[str, bool]],
+        databases: dict[str, dict[str, Any]],
+        tables: dict[tuple[str, str], dict[str, Any]],
+        roles: list[tuple[str, str]],
+        backtick: bool,
+    ) -> list[str]:
+        """按 SHOW GRANTS 的格式重建授权语句（仅用于展示）"""
+        quote = "`" if backtick else "'"
+
+        def account(user: str, host: str) -> str:
+            return f"{quote}{user}{quote}@{quote}{host}{quote}"
+
+        grantee = account(*key)
+        grant_option = " WITH GRANT OPTION"
+        statements = [
+            f"GRANT {', '.join(global_privileges)} ON *.* TO {grantee}{grant_option if can_grant else ''}"
+        ]
+        for grantable in (False, True):
+            names = sorted(priv for priv, with_grant in dynamic if with_grant == grantable)
+            if names:
+                statements.append(f"GRANT {','.join(names)} ON *.* TO {grantee}{grant_option if grantable else ''}")
+        for db_name, grant in databases.items():
+            statements.append(
+                f"GRANT {', '.join(grant['privileges'])} ON `{db_name}`.* TO {grantee}"
+                f"{grant_option if grant['grantable'] else ''}"
+            )
+        for (db_name, table_name), grant in tables.items():
+            parts = list(grant["privileges"])
+            parts.extend(
+                f"{privilege} ({', '.join(f'`{column}`' for column in columns)})"
+                for privilege, columns in grant["columns"].items()
+            )
+            statements.append(
+                f"GRANT {', '.join(parts) or 'USAGE'} ON `{db_name}`.`{table_name}` TO {grantee}"
+                f"{grant_option if grant['grantable'] else ''}"
+            )
+        if roles:
+            statements.append(f"GRANT {', '.join(account(*role) for role in roles)} TO {grantee}")
+        return statements
+
+    @staticmethod
+    def _split_set_value(value: Any) -> list[str]:  # noqa: ANN401
+        """拆分 MySQL SET 类型的权限值（如 'Select,Insert,Grant'）"""
+        if not value:
+            return []
+        items = value if isinstance(value, (set, frozenset, list, tuple)) else str(value).split(",")
+        return [str(item).strip().upper() for item in items if str(item).strip()]
+
+    @staticmethod
+    def _has_partial_revokes(user_attributes: Any) -> bool:  # noqa: ANN401
+        """检查 User_attributes 中是否存在部分撤销限制"""
+        if not user_attributes:
+            return False
+        try:
+            attributes = json.loads(user_attributes) if isinstance(user_attributes, (str, bytes)) else user_attributes
+        except (TypeError, ValueError):
+            return True
+        return bool(isinstance(attributes, dict) and attributes.get("Restrictions"))
+
+    @staticmethod
+    def _parse_major_version(version: str) -> int:
+        """解析主版本号，如 '8.0.35' -> 8"""
+        match = re.match(r"(\d+)", version)
+        return int(match.group(1)) if match else 0
+
     def _get_user_permissions(self, connection: Any, username: str, host: str) -> dict[str, Any]:  # noqa: ANN401
         """
         获取MySQL用户的详细权限信息
@@ -217,8 +644,9 @@ class MySQLSyncAdapter(BaseSyncAdapter):
     def _extract_privileges_from_grant(self, grant_statement: str) -> list[str]:
         """从GRANT语句中提取权限列表"""
         try:
-            # 提取GRANT和ON之间的权限部分
-            grant_part = grant_statement.split("ON")[0].replace("GRANT ", "").strip()
+            # 提取GRANT和ON之间的权限部分（按独立的ON关键字切分，避免截断 REPLICATION 等权限名）
+            grant_part = re.split(r"\s+ON\s+", grant_statement, maxsplit=1)[0]
+            grant_part = re.sub(r"^\s*GRANT\s+", "", grant_part).strip()
 
             # 分割权限并清理
             privileges = []
@@ -243,6 +671,16 @@ class MySQLSyncAdapter(BaseSyncAdapter):
             "permissions": raw_account["permissions"],
         }
 
+    def _collect_catalog_token_parts(self, instance: Instance, connection: Any) -> Any:  # noqa: ANN401
+        """MySQL目录变更令牌：授权相关系统表的校验和（不存在的表校验和为NULL）"""
+        rows = connection.execute_query(
+            """
+            CHECKSUM TABLE mysql.user, mysql.db, mysql.tables_priv, mysql.columns_priv,
+                mysql.procs_priv, mysql.role_edges, mysql.global_grants
+            """
+        )
+        return [list(row[:2]) for row in rows or []]
+
     def _detect_changes(
         self, existing_account: CurrentAccountSyncData, new_permissions: dict[str, Any], *, is_superuser: bool
     ) -> dict[str, Any]:
@@ -4,6 +4,7 @@
 """
 
 import contextlib
+from collections.abc import Iterator
 from typing import Any
 
 from app.models import Instance
@@ -12,12 +13,18 @@ from app.services.database_filter_manager import DatabaseFilterManager
 from app.utils.safe_query_builder import SafeQueryBuilder
 from app.utils.time_utils import time_utils
 
-from .base_sync_adapter import BaseSyncAdapter
+from .base_sync_adapter import BaseSyncAdapter, get_stream_fetch_size
 
 
 class OracleSyncAdapter(BaseSyncAdapter):
     """Oracle数据库同步适配器"""
 
+    # 批量查询 IN 列表的固定长度档位（最大档不超过 Oracle IN 列表的1000项上限）
+    IN_LIST_BIND_SIZES = (16, 128, 512, 1000)
+
+    # 令牌纳入表/索引属主（对象权限），旧令牌失效
+    CATALOG_TOKEN_VERSION = 2
+
     def __init__(self) -> None:
         super().__init__()
         self.filter_manager = DatabaseFilterManager()
@@ -25,16 +32,73 @@ class OracleSyncAdapter(BaseSyncAdapter):
     def get_database_accounts(self, instance: Instance, connection: Any) -> list[dict[str, Any]]:  # noqa: ANN401
         """
         获取Oracle数据库中的所有账户信息（优化版本）
-        使用批量查询减少N+1查询问题，从O(N)降到O(1)
         """
         try:
-            # 构建安全的查询条件
-            filter_conditions = self._build_filter_conditions()
-            where_clause, params = filter_conditions
+            return list(self.iter_database_accounts(instance, connection))
+        except Exception as e:
+            self.sync_logger.error(
+                "获取Oracle用户失败", module="oracle_sync_adapter", instance_name=instance.name, error=str(e)
+            )
+            return []
 
-            # 1. 一次性查询所有用户基本信息（包含user_id用于后续查询）
-            users_sql = f"""
-                SELECT
+    def iter_database_accounts(self, instance: Instance, connection: Any) -> Iterator[dict[str, Any]]:  # noqa: ANN401
+        """
+        按用户名升序逐个产出Oracle账户信息
+        用户按分块批量查询权限，避免N+1查询，同时使内存占用与分块大小相关
+        """
+        # 构建安全的查询条件
+        filter_conditions = self._build_filter_conditions()
+        where_clause, params = filter_conditions
+
+        # 1. 一次性查询所有用户基本信息（包含user_id用于后续查询）
+        users_sql = f"""
+            SELECT
+                username,
+                user_id,
+                account_status,
+                created,
+                expiry_date,
+                default_tablespace,
+                temporary_tablespace,
+                profile
+            FROM dba_users
+            WHERE {where_clause}
+        """
+
+        # 按Python字符串顺序排序，与本地账户的归并顺序一致
+        users = sorted(
+            connection.iter_query(users_sql, params, fetch_size=get_stream_fetch_size()), key=lambda row: row[0]
+        )
+
+        # 空用户检查，早返回
+        if not users:
+            self.sync_logger.info(
+                "未找到符合条件的Oracle用户",
+                module="oracle_sync_adapter",
+                instance_name=instance.name,
+            )
+            return
+
+        account_count = 0
+        for chunk in self._iter_chunks(users):
+            # 提取分块内的用户名列表用于批量查询（按固定长度的绑定变量分批，见 _iter_username_binds）
+            usernames = [user_row[0] for user_row in chunk]
+
+            # 2. 批量查询用户的角色权限
+            roles_data = self._batch_get_user_roles(connection, usernames)
+
+            # 3. 批量查询用户的系统权限
+            system_privs_data = self._batch_get_system_privileges(connection, usernames)
+
+            # 4. 批量查询用户的表空间权限
+            tablespace_data = self._batch_get_tablespace_privileges(connection, usernames, system_privs_data)
+
+            # 5. 批量查询用户的对象权限（可选）
+            object_perms_data = self._batch_get_object_privileges(connection, usernames)
+
+            # 6. 在Python侧聚合权限数据
+            for user_row in chunk:
+                (
                     username,
                     user_id,
                     account_status,
@@ -42,45 +106,9 @@ class OracleSyncAdapter(BaseSyncAdapter):
                     expiry_date,
                     default_tablespace,
                     temporary_tablespace,
-                    profile
-                FROM dba_users
-                WHERE {where_clause}
-                ORDER BY username
-            """
+                    profile,
+                ) = user_row
 
-            users = connection.execute_query(users_sql, params)
-            
-            # 空用户检查，早返回
-            if not users:
-                self.sync_logger.info(
-                    "未找到符合条件的Oracle用户",
-                    module="oracle_sync_adapter",
-                    instance_name=instance.name,
-                )
-                return []
-
-            # 提取所有用户名列表用于批量查询
-            usernames = [user_row[0] for user_row in users]
-            username_placeholders = ",".join([f":username_{i}" for i in range(len(usernames))])
-            username_params = {f"username_{i}": username for i, username in enumerate(usernames)}
-
-            # 2. 批量查询所有用户的角色权限
-            roles_data = self._batch_get_user_roles(connection, username_placeholders, username_params)
-            
-            # 3. 批量查询所有用户的系统权限
-            system_privs_data = self._batch_get_system_privileges(connection, username_placeholders, username_params)
-            
-            # 4. 批量查询所有用户的表空间权限
-            tablespace_data = self._batch_get_tablespace_privileges(connection, username_placeholders, username_params, system_privs_data)
-            
-            # 5. 批量查询所有用户的对象权限（可选）
-            object_perms_data = self._batch_get_object_privileges(connection, username_placeholders, username_params)
-
-            # 6. 在Python侧聚合所有权限数据
-            accounts = []
-            for user_row in users:
-                (username, user_id, account_status, created, expiry_date, default_tablespace, temporary_tablespace, profile) = user_row
-                
                 # 从批量查询结果中获取该用户的权限
                 permissions = {
                     "roles": roles_data.get(username, []),
@@ -95,9 +123,9 @@ class OracleSyncAdapter(BaseSyncAdapter):
                         "created": created.isoformat() if created else None,
                         "expiry_date": expiry_date.isoformat() if expiry_date else None,
                         "is_active": account_status == "OPEN",  # 直接从account_status推导
-                    }
+                    },
                 }
-                
+
                 # 添加对象权限（如果可用）
                 if username in object_perms_data:
                     permissions["object_privileges"] = object_perms_data[username]
@@ -105,7 +133,8 @@ class OracleSyncAdapter(BaseSyncAdapter):
                 # 判断是否为超级用户
                 is_superuser = username.upper() in ["SYS", "SYSTEM"] or "DBA" in permissions["roles"]
 
-                account_data = {
+                account_count += 1
+                yield {
                     "username": username,
                     "is_superuser": is_superuser,
                     "account_status": account_status,
@@ -117,23 +146,13 @@ class OracleSyncAdapter(BaseSyncAdapter):
                     "permissions": permissions,
                 }
 
-                accounts.append(account_data)
-
-            self.sync_logger.info(
-                "获取到%d个Oracle用户（批量查询优化）",
-                len(accounts),
-                module="oracle_sync_adapter",
-                instance_name=instance.name,
-                account_count=len(accounts),
-            )
-
-            return accounts
-
-        except Exception as e:
-            self.sync_logger.error(
-                "获取Oracle用户失败", module="oracle_sync_adapter", instance_name=instance.name, error=str(e)
-            )
-            return []
+        self.sync_logger.info(
+            "获取到%d个Oracle用户（批量查询优化）",
+            account_count,
+            module="oracle_sync_adapter",
+            instance_name=instance.name,
+            account_count=account_count,
+        )
 
     def _build_filter_conditions(self) -> tuple[str, dict]:
         """构建Oracle专用的过滤条件"""
@@ -150,77 +169,105 @@ class OracleSyncAdapter(BaseSyncAdapter):
 
         return builder.build_where_clause()
 
-    def _batch_get_user_roles(self, connection: Any, username_placeholders: str, username_params: dict) -> dict[str, list[str]]:  # noqa: ANN401
+    @classmethod
+    def _iter_username_binds(cls, usernames: list[str]) -> Iterator[tuple[str, dict[str, str | None]]]:
+        """
+        将用户名按固定长度的 IN 列表分批，产出 (占位符, 绑定参数)
+
+        - 每批不超过 Oracle IN 列表的1000项上限
+        - 批长度取 IN_LIST_BIND_SIZES 中不小于剩余用户数的最小值，不足部分以 NULL 填充（IN 中的 NULL 不匹配任何行），
+          SQL文本只有少数几种，可被语句缓存和共享池复用，不随用户数变化而硬解析
+        """
+        max_size = cls.IN_LIST_BIND_SIZES[-1]
+        for start in range(0, len(usernames), max_size):
+            batch = usernames[start : start + max_size]
+            size = next(size for size in cls.IN_LIST_BIND_SIZES if size >= len(batch))
+            placeholders = ",".join(f":u{i}" for i in range(size))
+            binds: dict[str, str | None] = {f"u{i}": None for i in range(size)}
+            binds.update({f"u{i}": username for i, username in enumerate(batch)})
+            yield placeholders, binds
+
+    def _iter_batch_rows(
+        self, connection: Any, sql_template: str, usernames: list[str]  # noqa: ANN401
+    ) -> Iterator[Any]:
+        """按用户名分批执行 sql_template（以 {placeholders} 表示 IN 列表）并流式产出所有批次的结果行"""
+        fetch_size = get_stream_fetch_size()
+        for placeholders, binds in self._iter_username_binds(usernames):
+            sql = sql_template.format(placeholders=placeholders)
+            yield from connection.iter_query(sql, binds, fetch_size=fetch_size)
+
+    def _batch_get_user_roles(self, connection: Any, usernames: list[str]) -> dict[str, list[str]]:  # noqa: ANN401
         """批量获取所有用户的角色权限"""
         try:
-            sql = f"""
+            sql = """
                 SELECT grantee, granted_role
                 FROM dba_role_privs
-                WHERE grantee IN ({username_placeholders})
+                WHERE grantee IN ({placeholders})
                 ORDER BY grantee, granted_role
             """
-            result = connection.execute_query(sql, username_params)
-            
+
             # 聚合结果
             roles_data = {}
-            for grantee, role in result:
+            for grantee, role in self._iter_batch_rows(connection, sql, usernames):
                 if grantee not in roles_data:
                     roles_data[grantee] = []
                 roles_data[grantee].append(role)
-            
+
             return roles_data
         except Exception as e:
             self.sync_logger.warning("批量获取用户角色失败", error=str(e))
             return {}
 
-    def _batch_get_system_privileges(self, connection: Any, username_placeholders: str, username_params: dict) -> dict[str, list[str]]:  # noqa: ANN401
+    def _batch_get_system_privileges(
+        self, connection: Any, usernames: list[str]  # noqa: ANN401
+    ) -> dict[str, list[str]]:
         """批量获取所有用户的系统权限"""
         try:
-            sql = f"""
+            sql = """
                 SELECT grantee, privilege
                 FROM dba_sys_privs
-                WHERE grantee IN ({username_placeholders})
+                WHERE grantee IN ({placeholders})
                 ORDER BY grantee, privilege
             """
-            result = connection.execute_query(sql, username_params)
-            
+
             # 聚合结果
             system_privs_data = {}
-            for grantee, privilege in result:
+            for grantee, privilege in self._iter_batch_rows(connection, sql, usernames):
                 if grantee not in system_privs_data:
                     system_privs_data[grantee] = []
                 system_privs_data[grantee].append(privilege)
-            
+
             return system_privs_data
         except Exception as e:
             self.sync_logger.warning("批量获取系统权限失败", error=str(e))
             return {}
 
-    def _batch_get_tablespace_privileges(self, connection: Any, username_placeholders: str, username_params: dict, system_privs_data: dict) -> dict[str, dict[str, list[str]]]:  # noqa: ANN401
+    def _batch_get_tablespace_privileges(
+        self, connection: Any, usernames: list[str], system_privs_data: dict  # noqa: ANN401
+    ) -> dict[str, dict[str, list[str]]]:
         """批量获取所有用户的表空间权限"""
         try:
             tablespace_data = {}
-            
+
             # 1. 检查UNLIMITED TABLESPACE权限（从系统权限中获取）
             for username, privileges in system_privs_data.items():
                 if "UNLIMITED TABLESPACE" in privileges:
                     tablespace_data[username] = {"ALL_TABLESPACES": ["UNLIMITED"]}
-            
+
             # 2. 批量查询表空间配额
             try:
-                ts_quota_sql = f"""
+                ts_quota_sql = """
                     SELECT username, tablespace_name,
                            CASE
                                WHEN max_bytes = -1 THEN 'UNLIMITED'
                                ELSE 'QUOTA'
                            END as privilege
                     FROM dba_ts_quotas
-                    WHERE username IN ({username_placeholders})
+                    WHERE username IN ({placeholders})
                     ORDER BY username, tablespace_name
                 """
-                ts_quota_result = connection.execute_query(ts_quota_sql, username_params)
-                
-                for username, ts_name, privilege in ts_quota_result:
+
+                for username, ts_name, privilege in self._iter_batch_rows(connection, ts_quota_sql, usernames):
                     if username not in tablespace_data:
                         tablespace_data[username] = {}
                     if ts_name not in tablespace_data[username]:
@@ -229,48 +276,48 @@ class OracleSyncAdapter(BaseSyncAdapter):
                         tablespace_data[username][ts_name].append(privilege)
             except Exception as e:
                 self.sync_logger.warning("批量获取表空间配额失败", error=str(e))
-            
+
             return tablespace_data
         except Exception as e:
             self.sync_logger.warning("批量获取表空间权限失败", error=str(e))
             return {}
 
-    def _batch_get_object_privileges(self, connection: Any, username_placeholders: str, username_params: dict) -> dict[str, dict[str, list[str]]]:  # noqa: ANN401
+    def _batch_get_object_privileges(
+        self, connection: Any, usernames: list[str]  # noqa: ANN401
+    ) -> dict[str, dict[str, list[str]]]:
         """批量获取所有用户的对象权限（可选）"""
         try:
             # 先检查dba_tables表是否存在
             check_tables_sql = "SELECT COUNT(*) FROM dba_tables WHERE ROWNUM = 1"
             connection.execute_query(check_tables_sql)
-            
-            # 批量查询对象权限
-            object_perms_sql = f"""
+
+            # 批量查询对象权限（同名绑定变量在两个子查询中复用）
+            object_perms_sql = """
                 SELECT owner, tablespace_name, 'OWNER' as privilege
                 FROM dba_tables
-                WHERE owner IN ({username_placeholders})
+                WHERE owner IN ({placeholders})
                 AND tablespace_name IS NOT NULL
-                
+
                 UNION
-                
+
                 SELECT owner, tablespace_name, 'INDEX_OWNER' as privilege
                 FROM dba_indexes
-                WHERE owner IN ({username_placeholders})
+                WHERE owner IN ({placeholders})
                 AND tablespace_name IS NOT NULL
-                
+
                 ORDER BY owner, tablespace_name, privilege
             """
-            
-            result = connection.execute_query(object_perms_sql, username_params)
-            
+
             # 聚合结果
             object_perms_data = {}
-            for owner, ts_name, privilege in result:
+            for owner, ts_name, privilege in self._iter_batch_rows(connection, object_perms_sql, usernames):
                 if owner not in object_perms_data:
                     object_perms_data[owner] = {}
                 if ts_name not in object_perms_data[owner]:
                     object_perms_data[owner][ts_name] = []
                 if privilege not in object_perms_data[owner][ts_name]:
                     object_perms_data[owner][ts_name].append(privilege)
-            
+
             return object_perms_data
         except Exception as e:
             self.sync_logger.warning("批量获取对象权限失败", error=str(e))
@@ -481,6 +528,43 @@ class OracleSyncAdapter(BaseSyncAdapter):
             "permissions": raw_account["permissions"],
         }
 
+    def _collect_catalog_token_parts(self, instance: Instance, connection: Any) -> Any:  # noqa: ANN401
+        """
+        Oracle目录变更令牌：用户、角色授权、系统权限、表空间配额的计数与哈希和，
+        以及对象权限来源（dba_tables/dba_indexes 中属主与表空间的去重组合）的计数与哈希和
+        """
+        rows = connection.execute_query(
+            """
+            SELECT 'users', COUNT(*),
+                   SUM(ORA_HASH(username || '|' || account_status || '|' || TO_CHAR(lock_date, 'YYYYMMDDHH24MISS')
+                                || '|' || TO_CHAR(expiry_date, 'YYYYMMDDHH24MISS') || '|' || default_tablespace
+                                || '|' || temporary_tablespace || '|' || profile)),
+                   TO_CHAR(MAX(created), 'YYYYMMDDHH24MISS')
+            FROM dba_users
+            UNION ALL
+            SELECT 'role_privs', COUNT(*), SUM(ORA_HASH(grantee || '|' || granted_role || '|' || admin_option)), NULL
+            FROM dba_role_privs
+            UNION ALL
+            SELECT 'sys_privs', COUNT(*), SUM(ORA_HASH(grantee || '|' || privilege || '|' || admin_option)), NULL
+            FROM dba_sys_privs
+            UNION ALL
+            SELECT 'ts_quotas', COUNT(*), SUM(ORA_HASH(username || '|' || tablespace_name || '|' || max_bytes)), NULL
+            FROM dba_ts_quotas
+            UNION ALL
+            SELECT 'object_privs', COUNT(*), SUM(ORA_HASH(owner || '|' || tablespace_name || '|' || privilege)), NULL
+            FROM (
+                SELECT owner, tablespace_name, 'OWNER' AS privilege
+                FROM dba_tables
+                WHERE tablespace_name IS NOT NULL
+                UNION
+                SELECT owner, tablespace_name, 'INDEX_OWNER' AS privilege
+                FROM dba_indexes
+                WHERE tablespace_name IS NOT NULL
+            )
+            """
+        )
+        return [list(row) for row in rows or []]
+
     def _detect_changes(
         self, existing_account: CurrentAccountSyncData, new_permissions: dict[str, Any], *, is_superuser: bool
     ) -> dict[str, Any]:
@@ -3,6 +3,8 @@
 处理PostgreSQL特定的账户同步逻辑
 """
 
+from collections import defaultdict
+from collections.abc import Iterator
 from typing import Any
 
 from app.models import Instance
@@ -11,7 +13,7 @@ from app.services.database_filter_manager import DatabaseFilterManager
 from app.utils.safe_query_builder import SafeQueryBuilder
 from app.utils.time_utils import time_utils
 
-from .base_sync_adapter import BaseSyncAdapter
+from .base_sync_adapter import BaseSyncAdapter, get_stream_fetch_size
 
 
 class PostgreSQLSyncAdapter(BaseSyncAdapter):
@@ -38,35 +40,68 @@ class PostgreSQLSyncAdapter(BaseSyncAdapter):
         获取PostgreSQL数据库中的所有账户信息
         """
         try:
-            # 构建安全的查询条件
-            filter_conditions = self._build_filter_conditions()
-            where_clause, params = filter_conditions
+            return list(self.iter_database_accounts(instance, connection))
+        except Exception as e:
+            self.sync_logger.error(
+                "获取PostgreSQL角色失败", module="postgresql_sync_adapter", instance_name=instance.name, error=str(e)
+            )
+            return []
 
-            # 查询角色基本信息
-            roles_sql = f"""
-                SELECT
-                    rolname as username,
-                    rolsuper as is_superuser,
-                    rolcreaterole as can_create_role,
-                    rolcreatedb as can_create_db,
-                    rolreplication as can_replicate,
-                    rolbypassrls as can_bypass_rls,
-                    rolcanlogin as can_login,
-                    rolinherit as can_inherit,
-                    CASE
-                        WHEN rolvaliduntil = 'infinity'::timestamp THEN NULL
-                        WHEN rolvaliduntil = '-infinity'::timestamp THEN NULL
-                        ELSE rolvaliduntil
-                    END as valid_until
-                FROM pg_roles
-                WHERE {where_clause}
-                ORDER BY rolname
-            """
+    def iter_database_accounts(self, instance: Instance, connection: Any) -> Iterator[dict[str, Any]]:  # noqa: ANN401
+        """
+        按角色名升序逐个产出PostgreSQL账户信息
+
+        角色按分块以固定次数的目录查询批量获取权限，在内存中组装；
+        某个分块批量获取失败时，该分块回退到逐个角色查询。
+        """
+        # 构建安全的查询条件
+        filter_conditions = self._build_filter_conditions()
+        where_clause, params = filter_conditions
+
+        # 查询角色基本信息（同时取出批量组装所需的属性）
+        roles_sql = f"""
+            SELECT
+                rolname as username,
+                rolsuper as is_superuser,
+                rolcreaterole as can_create_role,
+                rolcreatedb as can_create_db,
+                rolreplication as can_replicate,
+                rolbypassrls as can_bypass_rls,
+                rolcanlogin as can_login,
+                rolinherit as can_inherit,
+                CASE
+                    WHEN rolvaliduntil = 'infinity'::timestamp THEN NULL
+                    WHEN rolvaliduntil = '-infinity'::timestamp THEN NULL
+                    ELSE rolvaliduntil
+                END as valid_until,
+                rolconnlimit as connection_limit,
+                oid as role_oid,
+                rolpassword IS NOT NULL as has_password
+            FROM pg_roles
+            WHERE {where_clause}
+        """
 
-            roles = connection.execute_query(roles_sql, params)
+        # 按Python字符串顺序排序，与本地账户的归并顺序一致（不受数据库排序规则影响）
+        roles = sorted(connection.execute_query(roles_sql, params), key=lambda row: row[0])
 
-            accounts = []
-            for role_row in roles:
+        account_count = 0
+        fallback_chunks = 0
+        for chunk in self._iter_chunks(roles):
+            try:
+                bulk_permissions = self._get_roles_permissions_bulk(connection, chunk)
+            except Exception as e:
+                self.sync_logger.warning(
+                    "批量获取PostgreSQL角色权限失败，回退到逐个角色查询",
+                    module="postgresql_sync_adapter",
+                    instance_name=instance.name,
+                    error=str(e),
+                )
+                # 回滚失败语句所在的事务，避免后续查询报 transaction is aborted
+                connection.reset()
+                bulk_permissions = {}
+                fallback_chunks += 1
+
+            for role_row in chunk:
                 (
                     username,
                     is_superuser,
@@ -77,15 +112,18 @@ class PostgreSQLSyncAdapter(BaseSyncAdapter):
                     can_login,
                     can_inherit,
                     valid_until,
-                ) = role_row
+                ) = role_row[:9]
 
                 # 获取角色详细权限
-                permissions = self._get_role_permissions(connection, username, is_superuser=is_superuser)
+                permissions = bulk_permissions.get(username)
+                if permissions is None:
+                    permissions = self._get_role_permissions(connection, username, is_superuser=is_superuser)
 
                 # 将锁定状态信息添加到type_specific中
                 permissions["type_specific"]["can_login"] = can_login
 
-                account_data = {
+                account_count += 1
+                yield {
                     "username": username,
                     "is_superuser": is_superuser,
                     "can_create_role": can_create_role,
@@ -98,23 +136,156 @@ class PostgreSQLSyncAdapter(BaseSyncAdapter):
                     "permissions": permissions,
                 }
 
-                accounts.append(account_data)
+        self.sync_logger.info(
+            "获取到%d个PostgreSQL角色",
+            account_count,
+            module="postgresql_sync_adapter",
+            instance_name=instance.name,
+            account_count=account_count,
+            fallback_chunks=fallback_chunks,
+        )
 
-            self.sync_logger.info(
-                "获取到%d个PostgreSQL角色",
-                len(accounts),
-                module="postgresql_sync_adapter",
-                instance_name=instance.name,
-                account_count=len(accounts),
-            )
+    def _get_roles_permissions_bulk(
+        self, connection: Any, roles: list[tuple]  # noqa: ANN401
+    ) -> dict[str, dict[str, Any]]:
+        """
+        批量获取所有角色的权限信息
 
-            return accounts
+        查询次数固定，与角色数量无关：
+        pg_auth_members、aclexplode(datacl)、information_schema.table_privileges、
+        表空间CREATE权限、information_schema.role_usage_grants 各一次。
 
-        except Exception as e:
-            self.sync_logger.error(
-                "获取PostgreSQL角色失败", module="postgresql_sync_adapter", instance_name=instance.name, error=str(e)
-            )
-            return []
+        Args:
+            connection: 数据库连接
+            roles: iter_database_accounts 中 pg_roles 查询的结果行（一个分块）
+
+        Returns:
+            Dict: {rolname: permissions}，结构与 _get_role_permissions 一致
+        """
+        if not roles:
+            return {}
+
+        role_names = [row[0] for row in roles]
+        role_oids = [row[10] for row in roles]
+
+        # 角色成员关系
+        predefined_roles: dict[str, list[str]] = defaultdict(list)
+        rows = connection.iter_query(
+            """
+            SELECT m.rolname, r.rolname
+            FROM pg_auth_members am
+            JOIN pg_roles r ON am.roleid = r.oid
+            JOIN pg_roles m ON am.member = m.oid
+            WHERE am.member = ANY(%s)
+            ORDER BY m.rolname, r.rolname
+            """,
+            (role_oids,),
+            fetch_size=get_stream_fetch_size(),
+        )
+        for member, role_name in rows:
+            predefined_roles[member].append(role_name)
+
+        # 数据库级ACL（CONNECT/CREATE/TEMPORARY）与当前库的表权限
+        database_privileges: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        rows = connection.iter_query(
+            """
+            SELECT r.rolname, d.datname, acl.privilege_type
+            FROM pg_database d
+            CROSS JOIN LATERAL aclexplode(COALESCE(d.datacl, acldefault('d', d.datdba))) acl
+            JOIN pg_roles r ON r.oid = acl.grantee
+            WHERE acl.grantee = ANY(%s)
+            """,
+            (role_oids,),
+            fetch_size=get_stream_fetch_size(),
+        )
+        for role_name, db_name, privilege in rows:
+            database_privileges[role_name][db_name].add(privilege)
+
+        rows = connection.iter_query(
+            """
+            SELECT DISTINCT grantee, table_catalog, privilege_type
+            FROM information_schema.table_privileges
+            WHERE grantee = ANY(%s)
+            """,
+            (role_names,),
+            fetch_size=get_stream_fetch_size(),
+        )
+        for role_name, db_name, privilege in rows:
+            database_privileges[role_name][db_name].add(privilege)
+
+        # 表空间CREATE权限（has_tablespace_privilege 同时考虑属主、超级用户和继承的成员关系）
+        tablespace_privileges: dict[str, dict[str, list[str]]] = defaultdict(dict)
+        rows = connection.iter_query(
+            """
+            SELECT r.rolname, ts.spcname
+            FROM pg_roles r
+            CROSS JOIN pg_tablespace ts
+            WHERE r.oid = ANY(%s) AND has_tablespace_privilege(r.oid, ts.oid, 'CREATE')
+            ORDER BY r.rolname, ts.spcname
+            """,
+            (role_oids,),
+            fetch_size=get_stream_fetch_size(),
+        )
+        for role_name, ts_name in rows:
+            tablespace_privileges[role_name][ts_name] = ["CREATE"]
+
+        # 系统权限
+        system_privileges: dict[str, list[str]] = defaultdict(list)
+        rows = connection.iter_query(
+            """
+            SELECT DISTINCT grantee, privilege_type
+            FROM information_schema.role_usage_grants
+            WHERE grantee = ANY(%s)
+            ORDER BY grantee, privilege_type
+            """,
+            (role_names,),
+            fetch_size=get_stream_fetch_size(),
+        )
+        for role_name, privilege in rows:
+            system_privileges[role_name].append(privilege)
+
+        permissions_by_role = {}
+        for row in roles:
+            (
+                username,
+                is_superuser,
+                can_create_role,
+                can_create_db,
+                can_replicate,
+                can_bypass_rls,
+                can_login,
+                can_inherit,
+                valid_until,
+                connection_limit,
+                role_oid,
+                has_password,
+            ) = row
+            permissions_by_role[username] = {
+                "predefined_roles": predefined_roles.get(username, []),
+                "role_attributes": {
+                    "can_super": is_superuser,
+                    "can_create_role": can_create_role,
+                    "can_create_db": can_create_db,
+                    "can_login": can_login,
+                    "can_inherit": can_inherit,
+                    "can_replicate": can_replicate,
+                    "can_bypass_rls": can_bypass_rls,
+                    "connection_limit": connection_limit,
+                },
+                "database_privileges": {
+                    db_name: sorted(privileges)
+                    for db_name, privileges in sorted(database_privileges.get(username, {}).items())
+                },
+                "tablespace_privileges": tablespace_privileges.get(username, {}),
+                "system_privileges": system_privileges.get(username, []),
+                "type_specific": {
+                    "role_oid": role_oid,
+                    "has_password": has_password,
+                    "valid_until": self._safe_format_timestamp(valid_until),
+                },
+            }
+
+        return permissions_by_role
 
     def _build_filter_conditions(self) -> tuple[str, list]:
         """构建过滤条件"""
@@ -273,28 +444,27 @@ class PostgreSQLSyncAdapter(BaseSyncAdapter):
             return []
 
     def _get_database_privileges(self, connection: Any, username: str) -> dict[str, list[str]]:  # noqa: ANN401
-        """获取数据库权限"""
+        """获取数据库权限（数据库级ACL + 当前库的表权限）"""
         try:
             sql = """
+                SELECT d.datname, acl.privilege_type
+                FROM pg_database d
+                CROSS JOIN LATERAL aclexplode(COALESCE(d.datacl, acldefault('d', d.datdba))) acl
+                WHERE acl.grantee = (SELECT oid FROM pg_roles WHERE rolname = %s)
+                UNION
                 SELECT
                     table_catalog,
                     privilege_type
                 FROM information_schema.table_privileges
                 WHERE grantee = %s
-                ORDER BY table_catalog, privilege_type
             """
-            result = connection.execute_query(sql, (username,))
+            result = connection.execute_query(sql, (username, username))
 
-            db_privileges = {}
-            if result:
-                for row in result:
-                    db_name, privilege = row
-                    if db_name not in db_privileges:
-                        db_privileges[db_name] = []
-                    if privilege not in db_privileges[db_name]:
-                        db_privileges[db_name].append(privilege)
+            db_privileges: dict[str, set[str]] = defaultdict(set)
+            for db_name, privilege in result or []:
+                db_privileges[db_name].add(privilege)
 
-            return db_privileges
+            return {db_name: sorted(privileges) for db_name, privileges in sorted(db_privileges.items())}
         except Exception as e:
             self.sync_logger.warning("获取数据库权限失败: %s", username, error=str(e))
             return {}
@@ -383,6 +553,28 @@ class PostgreSQLSyncAdapter(BaseSyncAdapter):
             "permissions": raw_account["permissions"],
         }
 
+    def _collect_catalog_token_parts(self, instance: Instance, connection: Any) -> Any:  # noqa: ANN401
+        """PostgreSQL目录变更令牌：角色属性、成员关系及各类ACL的聚合摘要"""
+        rows = connection.execute_query(
+            """
+            SELECT
+                (SELECT md5(string_agg(concat_ws('|', oid, rolname, rolsuper, rolinherit, rolcreaterole,
+                                                 rolcreatedb, rolcanlogin, rolreplication, rolbypassrls,
+                                                 rolconnlimit, rolvaliduntil, rolpassword IS NOT NULL),
+                                       ',' ORDER BY oid))
+                 FROM pg_roles),
+                (SELECT md5(string_agg(concat_ws('|', roleid, member, admin_option), ',' ORDER BY roleid, member))
+                 FROM pg_auth_members),
+                (SELECT md5(string_agg(concat_ws('|', datname, datdba, datacl::text), ',' ORDER BY datname))
+                 FROM pg_database),
+                (SELECT md5(string_agg(concat_ws('|', spcname, spcacl::text), ',' ORDER BY spcname))
+                 FROM pg_tablespace),
+                (SELECT md5(string_agg(concat_ws('|', oid, relacl::text), ',' ORDER BY oid))
+                 FROM pg_class WHERE relacl IS NOT NULL)
+            """
+        )
+        return [list(row) for row in rows or []]
+
     def _detect_changes(
         self, existing_account: CurrentAccountSyncData, new_permissions: dict[str, Any], *, is_superuser: bool
     ) -> dict[str, Any]:
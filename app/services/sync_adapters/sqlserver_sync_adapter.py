@@ -9,20 +9,55 @@
 - 跨数据库权限查询和汇总
 """
 
+import os
 import time
+from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import lru_cache
 from typing import Any
 
+import yaml
+from flask import current_app
+
+from app.constants import SystemConstants
 from app.models import Instance
 from app.models.current_account_sync_data import CurrentAccountSyncData
 from app.services.cache_manager import cache_manager
 from app.services.connection_factory import ConnectionFactory
 from app.services.database_filter_manager import DatabaseFilterManager
 from app.utils.safe_query_builder import SafeQueryBuilder
+from app.utils.sync_cancellation import check_cancelled
 from app.utils.time_utils import time_utils
 
-from .base_sync_adapter import BaseSyncAdapter
+from .base_sync_adapter import BaseSyncAdapter, get_stream_fetch_size
+
+SQLSERVER_SYNC_CONFIG_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config", "sqlserver_sync_performance.yaml"
+)
+
+DEFAULT_SQLSERVER_SYNC_CONFIG = {
+    "max_databases_per_sync": 50,
+    "parallel_chunk_workers": 1,
+    "max_failures_per_instance": 10,
+    "continue_on_database_error": True,
+    "exclude_system_databases": True,
+    "system_databases": ["master", "tempdb", "model", "msdb"],
+    "check_database_access": True,
+}
+
+
+@lru_cache(maxsize=1)
+def load_sqlserver_sync_config() -> dict[str, Any]:
+    """加载 sqlserver_sync_performance.yaml，缺失的配置项使用默认值"""
+    config = dict(DEFAULT_SQLSERVER_SYNC_CONFIG)
+    if os.path.exists(SQLSERVER_SYNC_CONFIG_FILE):
+        with open(SQLSERVER_SYNC_CONFIG_FILE, encoding="utf-8") as f:
+            loaded = yaml.safe_load(f) or {}
+        config.update(loaded.get("sqlserver_sync") or {})
+    return config
 
-# 移除并行处理，改为顺序处理
 
 
 class SQLServerSyncAdapter(BaseSyncAdapter):
@@ -74,11 +109,7 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
         获取SQL Server数据库中的所有账户信息 - 批量优化版本
         """
         try:
-            # 设置当前实例
-            self._current_instance = instance
-
-            # 使用批量优化方法
-            return self._get_database_accounts_batch(instance, connection)
+            return list(self.iter_database_accounts(instance, connection))
 
         except Exception as e:
             self.sync_logger.error(
@@ -86,9 +117,22 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
             )
             return []
 
-    def _get_database_accounts_batch(self, instance: Instance, connection: Any) -> list[dict[str, Any]]:
+    def iter_database_accounts(self, instance: Instance, connection: Any) -> Iterator[dict[str, Any]]:  # noqa: ANN401
+        """
+        按登录名升序逐个产出SQL Server账户信息
+        """
+        # 设置当前实例
+        self._current_instance = instance
+
+        # 使用批量优化方法
+        yield from self._iter_database_accounts_batch(instance, connection)
+
+    def _iter_database_accounts_batch(self, instance: Instance, connection: Any) -> Iterator[dict[str, Any]]:
         """
         批量获取SQL Server数据库中的所有账户信息 - 性能优化版本
+
+        服务器级角色/权限一次性读取；数据库级授权每次同步只遍历一次数据库并按登录名归并，
+        账户数据按分块生成，已生成账户的授权随即释放。
         """
         try:
             start_time = time.time()
@@ -122,13 +166,13 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
                 FROM sys.server_principals sp
                 LEFT JOIN sys.sql_logins sl ON sp.principal_id = sl.principal_id AND sp.type = 'S'
                 WHERE sp.type IN ('S', 'U', 'G') AND {where_clause}
-                ORDER BY sp.name
             """
 
-            logins = connection.execute_query(login_sql, params)
+            # 按Python字符串顺序排序，与本地账户的归并顺序一致（不受数据库排序规则影响）
+            logins = sorted(connection.execute_query(login_sql, params) or [], key=lambda row: row[0])
 
             if not logins:
-                return []
+                return
 
             # 2. 批量获取所有用户的服务器角色
             all_server_roles_sql = """
@@ -188,73 +232,69 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
                     "is_policy_checked": bool(row[7]) if row[7] is not None else None,
                 }
 
-            # 5. 批量获取所有用户的数据库权限
-            all_database_permissions = self._get_all_users_database_permissions_batch(
-                connection, [row[0] for row in logins]
-            )
-
-            # 6. 构建账户数据
-            accounts = []
-            for login_row in logins:
-                (
-                    username,
-                    is_disabled,
-                    login_type,
-                    type_code,
-                    create_date,
-                    modify_date,
-                    sid,
-                    password_last_set_time,
-                    is_expiration_checked,
-                    is_policy_checked,
-                ) = login_row
-
-                # 从批量数据中获取权限信息
-                permissions = {
-                    "server_roles": server_roles_dict.get(username, []),
-                    "server_permissions": server_perms_dict.get(username, []),
-                    "database_roles": all_database_permissions.get(username, {}).get("roles", {}),
-                    "database_permissions": all_database_permissions.get(username, {}).get("permissions", {}),
-                    "type_specific": type_specific_dict.get(username, {}),
-                }
-
-                # 判断是否为超级用户
-                is_superuser = username.lower() == "sa" or "sysadmin" in permissions.get("server_roles", [])
-
-                # 将锁定状态信息添加到type_specific中
-                permissions["type_specific"]["is_disabled"] = is_disabled
-
-                account_data = {
-                    "username": username,
-                    "is_superuser": is_superuser,
-                    "is_disabled": is_disabled,
-                    "login_type": login_type,
-                    "type_code": type_code,
-                    "create_date": create_date.isoformat() if create_date else None,
-                    "modify_date": modify_date.isoformat() if modify_date else None,
-                    "password_last_set_time": (
-                        password_last_set_time.isoformat()
-                        if password_last_set_time and hasattr(password_last_set_time, "isoformat")
-                        else None
-                    ),
-                    "is_expiration_checked": bool(is_expiration_checked) if is_expiration_checked is not None else None,
-                    "is_policy_checked": bool(is_policy_checked) if is_policy_checked is not None else None,
-                    "permissions": permissions,
-                }
-
-                accounts.append(account_data)
+            # 5. 一次获取所有登录的数据库授权，按分块构建账户数据
+            roles_by_login, perms_by_login = self._get_database_grants_by_login(connection, [row[0] for row in logins])
+            account_count = 0
+            for chunk in self._iter_chunks(logins):
+                for login_row in chunk:
+                    (
+                        username,
+                        is_disabled,
+                        login_type,
+                        type_code,
+                        create_date,
+                        modify_date,
+                        sid,
+                        password_last_set_time,
+                        is_expiration_checked,
+                        is_policy_checked,
+                    ) = login_row
+
+                    # 从批量数据中获取权限信息
+                    permissions = {
+                        "server_roles": server_roles_dict.get(username, []),
+                        "server_permissions": server_perms_dict.get(username, []),
+                        "database_roles": self._sorted_grants(roles_by_login.pop(username, {})),
+                        "database_permissions": self._sorted_grants(perms_by_login.pop(username, {})),
+                        "type_specific": type_specific_dict.get(username, {}),
+                    }
+
+                    # 判断是否为超级用户
+                    is_superuser = username.lower() == "sa" or "sysadmin" in permissions.get("server_roles", [])
+
+                    # 将锁定状态信息添加到type_specific中
+                    permissions["type_specific"]["is_disabled"] = is_disabled
+
+                    account_count += 1
+                    yield {
+                        "username": username,
+                        "is_superuser": is_superuser,
+                        "is_disabled": is_disabled,
+                        "login_type": login_type,
+                        "type_code": type_code,
+                        "create_date": create_date.isoformat() if create_date else None,
+                        "modify_date": modify_date.isoformat() if modify_date else None,
+                        "password_last_set_time": (
+                            password_last_set_time.isoformat()
+                            if password_last_set_time and hasattr(password_last_set_time, "isoformat")
+                            else None
+                        ),
+                        "is_expiration_checked": (
+                            bool(is_expiration_checked) if is_expiration_checked is not None else None
+                        ),
+                        "is_policy_checked": bool(is_policy_checked) if is_policy_checked is not None else None,
+                        "permissions": permissions,
+                    }
 
             elapsed_time = time.time() - start_time
             self.sync_logger.info(
                 "批量获取SQL Server登录完成",
                 module="sqlserver_sync_adapter",
                 instance_name=instance.name,
-                account_count=len(accounts),
+                account_count=account_count,
                 elapsed_time=f"{elapsed_time:.2f}s",
             )
 
-            return accounts
-
         except Exception as e:
             self.sync_logger.error(
                 "批量获取SQL Server登录失败",
@@ -263,7 +303,7 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
                 error=str(e),
                 error_type=type(e).__name__,
             )
-            return []
+            raise
 
     def _build_filter_conditions(self) -> tuple[str, list]:
         """构建过滤条件"""
@@ -665,6 +705,59 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
 
         return formatted_data
 
+    def _collect_catalog_token_parts(self, instance: Instance, connection: Any) -> Any:  # noqa: ANN401
+        """
+        SQL Server目录变更令牌
+
+        服务器级主体/角色成员/权限以及每个数据库的主体/角色成员/权限的
+        计数、CHECKSUM_AGG 和最大 modify_date，数据库按分组合并为 UNION ALL 查询。
+        """
+        parts = [
+            list(row)
+            for row in connection.execute_query(
+                """
+                SELECT 'server_principals', COUNT(*),
+                       CHECKSUM_AGG(CHECKSUM(name, sid, type, is_disabled, modify_date)), MAX(modify_date)
+                FROM sys.server_principals
+                UNION ALL
+                SELECT 'server_role_members', COUNT(*),
+                       CHECKSUM_AGG(CHECKSUM(role_principal_id, member_principal_id)), NULL
+                FROM sys.server_role_members
+                UNION ALL
+                SELECT 'server_permissions', COUNT(*),
+                       CHECKSUM_AGG(CHECKSUM(grantee_principal_id, permission_name, state)), NULL
+                FROM sys.server_permissions
+                """
+            )
+            or []
+        ]
+
+        config = load_sqlserver_sync_config()
+        database_list = self._get_accessible_databases(connection, config)
+        chunk_size = max(1, int(config["max_databases_per_sync"]))
+        for start in range(0, len(database_list), chunk_size):
+            queries = []
+            for db in database_list[start : start + chunk_size]:
+                quoted_db = self._quote_identifier(db)
+                db_literal = db.replace("'", "''")
+                queries.append(
+                    f"""
+                    SELECT N'{db_literal}', 'principals', COUNT(*),
+                           CHECKSUM_AGG(CHECKSUM(name, sid, principal_id, modify_date)), MAX(modify_date)
+                    FROM {quoted_db}.sys.database_principals
+                    UNION ALL
+                    SELECT N'{db_literal}', 'role_members', COUNT(*),
+                           CHECKSUM_AGG(CHECKSUM(role_principal_id, member_principal_id)), NULL
+                    FROM {quoted_db}.sys.database_role_members
+                    UNION ALL
+                    SELECT N'{db_literal}', 'permissions', COUNT(*),
+                           CHECKSUM_AGG(CHECKSUM(grantee_principal_id, permission_name, state)), NULL
+                    FROM {quoted_db}.sys.database_permissions
+                """
+                )
+            parts.extend(list(row) for row in connection.execute_query(" UNION ALL ".join(queries)) or [])
+        return parts
+
     def _detect_changes(
         self, existing_account: CurrentAccountSyncData, new_permissions: dict[str, Any], *, is_superuser: bool
     ) -> dict[str, Any]:
@@ -867,373 +960,303 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
     def _get_all_database_permissions_batch(
         self, connection: Any, username: str
     ) -> tuple[dict[str, list[str]], dict[str, list[str]]]:
-        """批量获取用户数据库权限 - 性能优化版本"""
-        try:
-            start_time = time.time()
-
-            # 获取数据库列表
-            databases_sql = """
-                SELECT TOP 50 name
-                FROM sys.databases
-                WHERE state = 0
-                AND name NOT IN ('master', 'tempdb', 'model', 'msdb')
-                AND HAS_DBACCESS(name) = 1
-                ORDER BY name
-            """
-            databases = connection.execute_query(databases_sql)
-
-            if not databases:
-                return {}, {}
-
-            database_list = [db[0] for db in databases]
-
-            # 检查用户是否为sysadmin
-            sysadmin_check_sql = """
-                SELECT IS_SRVROLEMEMBER('sysadmin', %s) as is_sysadmin
+        """批量获取单个用户的数据库权限（复用多用户批量实现）"""
+        result = self._get_all_users_database_permissions_batch(connection, [username]).get(username, {})
+        return result.get("roles", {}), result.get("permissions", {})
+
+    def _get_accessible_databases(self, connection: Any, config: dict[str, Any]) -> list[str]:
+        """获取需要同步权限的在线数据库（不截断）"""
+        access_clause = "AND HAS_DBACCESS(name) = 1" if config["check_database_access"] else ""
+        databases = connection.execute_query(
+            f"""
+            SELECT name
+            FROM sys.databases
+            WHERE state = 0 {access_clause}
+            ORDER BY name
             """
-            sysadmin_result = connection.execute_query(sysadmin_check_sql, (username,))
-            is_sysadmin = sysadmin_result and sysadmin_result[0][0] == 1
-
-            # 构建动态SQL获取所有数据库的principals
-            principals_parts = []
-            for db in database_list:
-                quoted_db = self._quote_identifier(db)
-                principals_parts.append(
-                    f"""
-                    SELECT '{db}' AS db_name,
-                           name COLLATE SQL_Latin1_General_CP1_CI_AS AS user_name,
-                           principal_id,
-                           sid
-                    FROM {quoted_db}.sys.database_principals
-                    WHERE type IN ('S', 'U', 'G') AND name != 'dbo'
-                """
-                )
-
-            principals_sql = " UNION ALL ".join(principals_parts)
-
-            all_principals = connection.execute_query(principals_sql)
-
-            # 构建用户映射 {db: {user_name: (principal_id, sid)}}
-            db_principals = {}
-            for row in all_principals:
-                db, user_name, pid, sid = row
-                db_principals.setdefault(db, {})[user_name] = (pid, sid)
-
-            # 构建动态SQL获取所有数据库的角色
-            roles_parts = []
-            for db in database_list:
-                quoted_db = self._quote_identifier(db)
-                roles_parts.append(
-                    f"""
-                    SELECT '{db}' AS db_name,
-                           r.name COLLATE SQL_Latin1_General_CP1_CI_AS AS role_name,
-                           m.member_principal_id
-                    FROM {quoted_db}.sys.database_role_members m
-                    JOIN {quoted_db}.sys.database_principals r ON m.role_principal_id = r.principal_id
-                """
-                )
-
-            roles_sql = " UNION ALL ".join(roles_parts)
-
-            all_roles = connection.execute_query(roles_sql)
+        )
+        excluded = (
+            {name.lower() for name in config["system_databases"]} if config["exclude_system_databases"] else set()
+        )
+        return [row[0] for row in databases or [] if row[0].lower() not in excluded]
 
-            # 构建动态SQL获取所有数据库的权限
-            perms_parts = []
-            for db in database_list:
-                quoted_db = self._quote_identifier(db)
-                perms_parts.append(
-                    f"""
-                    SELECT '{db}' AS db_name,
-                           permission_name COLLATE SQL_Latin1_General_CP1_CI_AS AS permission_name,
-                           grantee_principal_id
-                    FROM {quoted_db}.sys.database_permissions WHERE state = 'G'
-                """
-                )
+    def _fetch_database_chunk(
+        self,
+        connection: Any,  # noqa: ANN401
+        databases: list[str],
+        login_index: tuple[dict[bytes, list[str]], set[str]],
+    ) -> tuple[dict[str, dict[str, set[str]]], dict[str, dict[str, set[str]]]]:
+        """
+        以 UNION ALL 查询一组数据库的用户、角色成员和权限，流式消费结果行并直接归并到登录名
 
-            perms_sql = " UNION ALL ".join(perms_parts)
+        先读取数据库用户建立 (db, principal_id) -> 登录名 的哈希索引（只保留匹配同步登录名的用户），
+        再流式读取角色成员和权限行，原始行不在内存中整体物化。
 
-            all_perms = connection.execute_query(perms_sql)
+        Args:
+            connection: 数据库连接
+            databases: 数据库分组
+            login_index: (SID -> 登录名列表, 需要同步的登录名集合)
 
-            # 获取服务器登录的SID用于映射
-            login_sid_sql = """
-                SELECT name, sid
-                FROM sys.server_principals
-                WHERE name = %s AND type IN ('S', 'U', 'G')
+        Returns:
+            tuple: (roles_by_login, perms_by_login)，结构均为 {登录名: {数据库: 集合}}
+        """
+        logins_by_sid, username_set = login_index
+        fetch_size = get_stream_fetch_size()
+        principals_parts = []
+        roles_parts = []
+        perms_parts = []
+        for db in databases:
+            quoted_db = self._quote_identifier(db)
+            db_literal = db.replace("'", "''")
+            principals_parts.append(
+                f"""
+                SELECT N'{db_literal}' AS db_name,
+                       name COLLATE SQL_Latin1_General_CP1_CI_AS AS user_name,
+                       principal_id,
+                       sid
+                FROM {quoted_db}.sys.database_principals
+                WHERE type IN ('S', 'U', 'G') AND name != 'dbo'
+            """
+            )
+            roles_parts.append(
+                f"""
+                SELECT N'{db_literal}' AS db_name,
+                       r.name COLLATE SQL_Latin1_General_CP1_CI_AS AS role_name,
+                       m.member_principal_id
+                FROM {quoted_db}.sys.database_role_members m
+                JOIN {quoted_db}.sys.database_principals r ON m.role_principal_id = r.principal_id
+            """
+            )
+            perms_parts.append(
+                f"""
+                SELECT N'{db_literal}' AS db_name,
+                       permission_name COLLATE SQL_Latin1_General_CP1_CI_AS AS permission_name,
+                       grantee_principal_id
+                FROM {quoted_db}.sys.database_permissions WHERE state = 'G'
             """
-            login_info = connection.execute_query(login_sid_sql, (username,))
-            login_sid = login_info[0][1] if login_info else None
-
-            # 在Python中聚合数据
-            database_roles = {}
-            database_permissions = {}
-
-            # 处理角色
-            for row in all_roles:
-                db_name, role_name, member_principal_id = row
-
-                # 查找对应的用户名
-                user_name = None
-                for u_name, (pid, _) in db_principals.get(db_name, {}).items():
-                    if pid == member_principal_id:
-                        user_name = u_name
-                        break
-
-                # 如果找到用户名且匹配当前用户，或者通过SID匹配
-                if user_name == username or (
-                    login_sid
-                    and any(
-                        sid == login_sid
-                        for _, (_, sid) in db_principals.get(db_name, {}).items()
-                        if pid == member_principal_id
-                    )
-                ):
-                    if db_name not in database_roles:
-                        database_roles[db_name] = []
-                    database_roles[db_name].append(role_name)
-
-            # 处理权限
-            for row in all_perms:
-                db_name, permission_name, grantee_principal_id = row
-
-                # 查找对应的用户名
-                user_name = None
-                for u_name, (pid, _) in db_principals.get(db_name, {}).items():
-                    if pid == grantee_principal_id:
-                        user_name = u_name
-                        break
-
-                # 如果找到用户名且匹配当前用户，或者通过SID匹配
-                if user_name == username or (
-                    login_sid
-                    and any(
-                        sid == login_sid
-                        for _, (_, sid) in db_principals.get(db_name, {}).items()
-                        if pid == grantee_principal_id
-                    )
-                ):
-                    if db_name not in database_permissions:
-                        database_permissions[db_name] = []
-                    database_permissions[db_name].append(permission_name)
-
-            # 对于sysadmin用户，添加db_owner角色到所有数据库
-            if is_sysadmin:
-                for db_name in database_list:
-                    if db_name not in database_roles:
-                        database_roles[db_name] = []
-                    if "db_owner" not in database_roles[db_name]:
-                        database_roles[db_name].append("db_owner")
-
-            # 排序结果
-            for db_name in database_roles:
-                database_roles[db_name].sort()
-            for db_name in database_permissions:
-                database_permissions[db_name].sort()
-
-            elapsed_time = time.time() - start_time
-            self.sync_logger.info(
-                "批量获取数据库权限完成: %s",
-                username,
-                module="sqlserver_sync_adapter",
-                username=username,
-                database_count=len(database_list),
-                roles_count=sum(len(roles) for roles in database_roles.values()),
-                permissions_count=sum(len(perms) for perms in database_permissions.values()),
-                elapsed_time=f"{elapsed_time:.2f}s",
             )
 
-            return database_roles, database_permissions
+        # 哈希索引 {(db, principal_id): 对应的登录名集合}，按名称和SID两种方式映射
+        principal_logins: dict[tuple[str, int], set[str]] = {}
+        for db_name, user_name, principal_id, sid in connection.iter_query(
+            " UNION ALL ".join(principals_parts), fetch_size=fetch_size
+        ):
+            logins = set(logins_by_sid.get(bytes(sid), [])) if sid else set()
+            if user_name in username_set:
+                logins.add(user_name)
+            if logins:
+                principal_logins[(db_name, principal_id)] = logins
+
+        roles_by_login: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        for db_name, role_name, member_principal_id in connection.iter_query(
+            " UNION ALL ".join(roles_parts), fetch_size=fetch_size
+        ):
+            for login_name in principal_logins.get((db_name, member_principal_id), ()):
+                roles_by_login[login_name][db_name].add(role_name)
+
+        perms_by_login: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        for db_name, permission_name, grantee_principal_id in connection.iter_query(
+            " UNION ALL ".join(perms_parts), fetch_size=fetch_size
+        ):
+            for login_name in principal_logins.get((db_name, grantee_principal_id), ()):
+                perms_by_login[login_name][db_name].add(permission_name)
+
+        return roles_by_login, perms_by_login
+
+    @staticmethod
+    def _sorted_grants(grants: dict[str, set[str]]) -> dict[str, list[str]]:
+        """将 {数据库: 集合} 转换为 {数据库: 有序列表}"""
+        return {db: sorted(values) for db, values in grants.items()}
+
+    @staticmethod
+    def _merge_login_grants(target: dict[str, dict[str, set[str]]], source: dict[str, dict[str, set[str]]]) -> None:
+        """将 {登录名: {数据库: 集合}} 归并到 target"""
+        for login_name, databases in source.items():
+            for db_name, values in databases.items():
+                target[login_name][db_name].update(values)
+
+    def _fetch_database_chunk_safely(
+        self,
+        connection: Any,  # noqa: ANN401
+        databases: list[str],
+        login_index: tuple[dict[bytes, list[str]], set[str]],
+    ) -> tuple[dict[str, dict[str, set[str]]], dict[str, dict[str, set[str]]], list[str]]:
+        """
+        获取一组数据库的权限数据，整组失败时逐库重试以隔离问题数据库
 
+        分组的结果只在整组成功后返回，失败分组中途已读取的行被丢弃，逐库重试不会重复或残留数据。
+
+        Returns:
+            tuple: (roles_by_login, perms_by_login, failed_databases)
+        """
+        check_cancelled()
+        try:
+            roles, perms = self._fetch_database_chunk(connection, databases, login_index)
+            return roles, perms, []
         except Exception as e:
-            self.sync_logger.error(
-                "批量获取数据库权限失败: %s",
-                username,
+            if len(databases) == 1:
+                self.sync_logger.warning(
+                    "查询数据库权限失败",
+                    module="sqlserver_sync_adapter",
+                    database=databases[0],
+                    error=str(e),
+                )
+                return {}, {}, list(databases)
+            self.sync_logger.warning(
+                "批量查询数据库权限失败，逐库重试",
                 module="sqlserver_sync_adapter",
-                username=username,
+                database_count=len(databases),
                 error=str(e),
-                error_type=type(e).__name__,
             )
-            return {}, {}
+
+        roles: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        perms: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        failed = []
+        for db in databases:
+            db_roles, db_perms, db_failed = self._fetch_database_chunk_safely(connection, [db], login_index)
+            self._merge_login_grants(roles, db_roles)
+            self._merge_login_grants(perms, db_perms)
+            failed.extend(db_failed)
+        return roles, perms, failed
+
+    def _fetch_database_chunks(
+        self,
+        connection: Any,  # noqa: ANN401
+        chunks: list[list[str]],
+        workers: int,
+        login_index: tuple[dict[bytes, list[str]], set[str]],
+    ) -> tuple[dict[str, dict[str, set[str]]], dict[str, dict[str, set[str]]], list[str]]:
+        """
+        获取所有数据库分组的权限数据
+
+        workers > 1 时额外从连接池借用连接并发获取分组；借不到连接的分组回退到主连接顺序执行。
+        各分组的归并结果在主线程合并。
+        """
+        roles: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        perms: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        failed = []
+
+        def collect(chunk_result: tuple[dict, dict, list[str]]) -> None:
+            self._merge_login_grants(roles, chunk_result[0])
+            self._merge_login_grants(perms, chunk_result[1])
+            failed.extend(chunk_result[2])
+
+        instance = self._current_instance
+        if workers <= 1 or len(chunks) <= 1 or instance is None:
+            for chunk in chunks:
+                collect(self._fetch_database_chunk_safely(connection, chunk, login_index))
+            return roles, perms, failed
+
+        app = current_app._get_current_object()
+
+        def fetch_with_pooled_connection(chunk: list[str]) -> tuple | None:
+            with app.app_context():
+                pooled = ConnectionFactory.acquire_connection(instance)
+                if pooled is None:
+                    return None
+                try:
+                    result = self._fetch_database_chunk_safely(pooled, chunk, login_index)
+                except BaseException:
+                    # 包括 SyncCancelled：中断的连接状态不确定，丢弃而不放回池中
+                    ConnectionFactory.release_connection(pooled, discard=True)
+                    raise
+                ConnectionFactory.release_connection(pooled)
+                return result
+
+        # 主连接处理第一个分组，其余分组并发处理
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sqlserver_perm") as executor:
+            # 复制上下文，使工作线程的远程查询计入当前同步剖析
+            futures = [
+                (chunk, executor.submit(copy_context().run, fetch_with_pooled_connection, chunk))
+                for chunk in chunks[1:]
+            ]
+            collect(self._fetch_database_chunk_safely(connection, chunks[0], login_index))
+            for chunk, future in futures:
+                result = future.result()
+                if result is None:
+                    result = self._fetch_database_chunk_safely(connection, chunk, login_index)
+                collect(result)
+        return roles, perms, failed
 
     def _get_all_users_database_permissions_batch(
         self, connection: Any, usernames: list[str]
     ) -> dict[str, dict[str, dict[str, list[str]]]]:
-        """批量获取所有用户的数据库权限 - 性能优化版本"""
-        try:
-            start_time = time.time()
-
-            # 获取数据库列表
-            databases_sql = """
-                SELECT TOP 50 name
-                FROM sys.databases
-                WHERE state = 0
-                AND name NOT IN ('master', 'tempdb', 'model', 'msdb')
-                AND HAS_DBACCESS(name) = 1
-                ORDER BY name
-            """
-            databases = connection.execute_query(databases_sql)
-
-            if not databases:
-                return {}
+        """批量获取指定用户的数据库权限，返回 {登录名: {"roles": {...}, "permissions": {...}}}"""
+        roles_by_login, perms_by_login = self._get_database_grants_by_login(connection, usernames)
+        return {
+            username: {
+                "roles": self._sorted_grants(roles_by_login.get(username, {})),
+                "permissions": self._sorted_grants(perms_by_login.get(username, {})),
+            }
+            for username in usernames
+        }
 
-            database_list = [db[0] for db in databases]
+    def _get_database_grants_by_login(
+        self,
+        connection: Any,  # noqa: ANN401
+        usernames: list[str],
+    ) -> tuple[dict[str, dict[str, set[str]]], dict[str, dict[str, set[str]]]]:
+        """
+        批量获取用户的数据库角色和权限 - 性能优化版本
 
-            # 获取所有用户的SID映射
-            usernames_str = "', '".join(usernames)
-            login_sids_sql = f"""
-                SELECT name, sid
-                FROM sys.server_principals
-                WHERE name IN ('{usernames_str}') AND type IN ('S', 'U', 'G')
-            """
-            login_sids = connection.execute_query(login_sids_sql)
-            username_to_sid = {row[0]: row[1] for row in login_sids}
+        - 每次调用只列出一次数据库和服务器登录，账户同步时对全部登录调用一次
+        - 数据库按 max_databases_per_sync 分组查询，所有数据库都会被处理
+        - 角色/权限行通过 (db, principal_id) 与 sid 哈希索引映射到登录名
+        - 可配置 parallel_chunk_workers 使用连接池中的多个连接并发获取分组
 
-            # 批量检查所有用户的sysadmin状态
-            usernames_placeholders = ", ".join(["%s"] * len(usernames))
-            sysadmin_check_sql = f"""
-                SELECT sp.name, IS_SRVROLEMEMBER('sysadmin', sp.name) as is_sysadmin
-                FROM sys.server_principals sp
-                WHERE sp.name IN ({usernames_placeholders})
-            """
-            sysadmin_results = connection.execute_query(sysadmin_check_sql, usernames)
-            sysadmin_dict = {row[0]: bool(row[1]) for row in sysadmin_results}
+        查询失败不会返回空授权（空授权会把所有登录的数据库授权判定为已撤销）：列出数据库或登录失败、
+        失败的数据库超出 max_failures_per_instance 或未开启 continue_on_database_error 时抛出异常，
+        由实例同步整体失败并保留已存储的授权；容忍范围内失败的数据库沿用已存储的授权。
+        """
+        try:
+            start_time = time.time()
+            config = load_sqlserver_sync_config()
 
-            # 构建动态SQL获取所有数据库的principals
-            principals_parts = []
-            for db in database_list:
-                quoted_db = self._quote_identifier(db)
-                principals_parts.append(
-                    f"""
-                    SELECT '{db}' AS db_name,
-                           name COLLATE SQL_Latin1_General_CP1_CI_AS AS user_name,
-                           principal_id,
-                           sid
-                    FROM {quoted_db}.sys.database_principals
-                    WHERE type IN ('S', 'U', 'G') AND name != 'dbo'
-                """
-                )
+            database_list = self._get_accessible_databases(connection, config)
+            if not database_list:
+                return {}, {}
 
-            principals_sql = " UNION ALL ".join(principals_parts)
-            all_principals = connection.execute_query(principals_sql)
+            chunk_size = max(1, int(config["max_databases_per_sync"]))
+            chunks = [database_list[i : i + chunk_size] for i in range(0, len(database_list), chunk_size)]
+            # 主连接已占用一个池连接
+            workers = min(
+                max(1, int(config["parallel_chunk_workers"])),
+                len(chunks),
+                SystemConstants.CONNECTION_POOL_MAX_SIZE - 1,
+            )
 
-            # 构建用户映射 {db: {user_name: (principal_id, sid)}}
-            db_principals = {}
-            for row in all_principals:
-                db, user_name, pid, sid = row
-                db_principals.setdefault(db, {})[user_name] = (pid, sid)
+            username_set = set(usernames)
 
-            # 构建动态SQL获取所有数据库的角色
-            roles_parts = []
-            for db in database_list:
-                quoted_db = self._quote_identifier(db)
-                roles_parts.append(
-                    f"""
-                    SELECT '{db}' AS db_name,
-                           r.name COLLATE SQL_Latin1_General_CP1_CI_AS AS role_name,
-                           m.member_principal_id
-                    FROM {quoted_db}.sys.database_role_members m
-                    JOIN {quoted_db}.sys.database_principals r ON m.role_principal_id = r.principal_id
+            # 登录名 -> SID、sysadmin 状态（一次读取全部登录，避免超长IN列表）
+            login_rows = connection.iter_query(
                 """
-                )
-
-            roles_sql = " UNION ALL ".join(roles_parts)
-
-            all_roles = connection.execute_query(roles_sql)
+                SELECT sp.name, sp.sid, IS_SRVROLEMEMBER('sysadmin', sp.name) AS is_sysadmin
+                FROM sys.server_principals sp
+                WHERE sp.type IN ('S', 'U', 'G')
+                """,
+                fetch_size=get_stream_fetch_size(),
+            )
+            logins_by_sid: dict[bytes, list[str]] = defaultdict(list)
+            sysadmins = []
+            for login_name, sid, is_sysadmin in login_rows:
+                if login_name not in username_set:
+                    continue
+                if sid:
+                    logins_by_sid[bytes(sid)].append(login_name)
+                if is_sysadmin:
+                    sysadmins.append(login_name)
 
-            # 构建动态SQL获取所有数据库的权限
-            perms_parts = []
-            for db in database_list:
-                quoted_db = self._quote_identifier(db)
-                perms_parts.append(
-                    f"""
-                    SELECT '{db}' AS db_name,
-                           permission_name COLLATE SQL_Latin1_General_CP1_CI_AS AS permission_name,
-                           grantee_principal_id
-                    FROM {quoted_db}.sys.database_permissions WHERE state = 'G'
-                """
-                )
+            roles_by_login, perms_by_login, failed_databases = self._fetch_database_chunks(
+                connection, chunks, workers, (logins_by_sid, username_set)
+            )
 
-            perms_sql = " UNION ALL ".join(perms_parts)
-
-            all_perms = connection.execute_query(perms_sql)
-
-            # 在Python中聚合数据
-            result = {}
-            for username in usernames:
-                result[username] = {"roles": {}, "permissions": {}}
-
-            # 处理角色
-            for row in all_roles:
-                db_name, role_name, member_principal_id = row
-
-                # 查找对应的用户名
-                user_name = None
-                for u_name, (pid, _) in db_principals.get(db_name, {}).items():
-                    if pid == member_principal_id:
-                        user_name = u_name
-                        break
-
-                # 如果找到用户名，添加到结果中
-                if user_name in usernames:
-                    if db_name not in result[user_name]["roles"]:
-                        result[user_name]["roles"][db_name] = []
-                    result[user_name]["roles"][db_name].append(role_name)
-
-                # 通过SID匹配
-                for username, sid in username_to_sid.items():
-                    if sid and any(
-                        sid == db_sid
-                        for _, (_, db_sid) in db_principals.get(db_name, {}).items()
-                        if pid == member_principal_id
-                    ):
-                        if db_name not in result[username]["roles"]:
-                            result[username]["roles"][db_name] = []
-                        if role_name not in result[username]["roles"][db_name]:
-                            result[username]["roles"][db_name].append(role_name)
-
-            # 处理权限
-            for row in all_perms:
-                db_name, permission_name, grantee_principal_id = row
-
-                # 查找对应的用户名
-                user_name = None
-                for u_name, (pid, _) in db_principals.get(db_name, {}).items():
-                    if pid == grantee_principal_id:
-                        user_name = u_name
-                        break
-
-                # 如果找到用户名，添加到结果中
-                if user_name in usernames:
-                    if db_name not in result[user_name]["permissions"]:
-                        result[user_name]["permissions"][db_name] = []
-                    result[user_name]["permissions"][db_name].append(permission_name)
-
-                # 通过SID匹配
-                for username, sid in username_to_sid.items():
-                    if sid and any(
-                        sid == db_sid
-                        for _, (_, db_sid) in db_principals.get(db_name, {}).items()
-                        if pid == grantee_principal_id
-                    ):
-                        if db_name not in result[username]["permissions"]:
-                            result[username]["permissions"][db_name] = []
-                        if permission_name not in result[username]["permissions"][db_name]:
-                            result[username]["permissions"][db_name].append(permission_name)
+            if failed_databases:
+                self._handle_failed_databases(config, failed_databases, roles_by_login, perms_by_login, username_set)
 
             # 对于sysadmin用户，添加db_owner角色到所有数据库
-            for username, is_sysadmin in sysadmin_dict.items():
-                if is_sysadmin:
-                    for db_name in database_list:
-                        if db_name not in result[username]["roles"]:
-                            result[username]["roles"][db_name] = []
-                        if "db_owner" not in result[username]["roles"][db_name]:
-                            result[username]["roles"][db_name].append("db_owner")
-
-            # 排序结果
-            for username in result:
-                for db_name in result[username]["roles"]:
-                    result[username]["roles"][db_name].sort()
-                for db_name in result[username]["permissions"]:
-                    result[username]["permissions"][db_name].sort()
+            for login_name in sysadmins:
+                for db_name in database_list:
+                    roles_by_login[login_name][db_name].add("db_owner")
 
             elapsed_time = time.time() - start_time
             self.sync_logger.info(
@@ -1241,10 +1264,13 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
                 module="sqlserver_sync_adapter",
                 user_count=len(usernames),
                 database_count=len(database_list),
+                chunk_count=len(chunks),
+                workers=workers,
+                failed_databases=failed_databases,
                 elapsed_time=f"{elapsed_time:.2f}s",
             )
 
-            return result
+            return roles_by_login, perms_by_login
 
         except Exception as e:
             self.sync_logger.error(
@@ -1253,4 +1279,41 @@ class SQLServerSyncAdapter(BaseSyncAdapter):
                 error=str(e),
                 error_type=type(e).__name__,
             )
-            return {}
+            raise
+
+    def _handle_failed_databases(
+        self,
+        config: dict[str, Any],
+        failed_databases: list[str],
+        roles_by_login: dict[str, dict[str, set[str]]],
+        perms_by_login: dict[str, dict[str, set[str]]],
+        username_set: set[str],
+    ) -> None:
+        """
+        处理权限查询失败的数据库
+
+        超出 max_failures_per_instance 或未开启 continue_on_database_error 时抛出异常；
+        否则这些数据库沿用本地已存储的授权，避免被判定为授权已撤销
+        """
+        max_failures = int(config["max_failures_per_instance"])
+        if not config["continue_on_database_error"] or len(failed_databases) > max_failures:
+            error_msg = f"SQL Server数据库权限查询失败的数据库过多: {len(failed_databases)}"
+            raise RuntimeError(error_msg)
+
+        instance = self._current_instance
+        if instance is None:
+            return
+        failed = set(failed_databases)
+        accounts = CurrentAccountSyncData.query.filter_by(
+            instance_id=instance.id, db_type=instance.db_type, is_deleted=False
+        )
+        for account in accounts:
+            if account.username not in username_set:
+                continue
+            for target, stored in (
+                (roles_by_login, account.database_roles),
+                (perms_by_login, account.database_permissions),
+            ):
+                for db_name, values in (stored or {}).items():
+                    if db_name in failed:
+                        target[account.username][db_name] = set(values or ())
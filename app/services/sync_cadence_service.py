@@ -0,0 +1,205 @@
+"""
+鲸落 - 自适应账户同步节奏
+按实例的账户变更频率、同步耗时和连续失败次数计算下次到期时间，定时任务每次只同步已到期的实例
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Any
+
+import yaml
+
+from app import db
+from app.models.account_change_log import AccountChangeLog
+from app.models.instance import Instance
+from app.models.instance_sync_state import InstanceSyncState
+from app.utils.structlog_config import get_sync_logger
+from app.utils.timezone import UTC_TZ, now
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    """SQLite 读回的时间不带时区，按UTC处理"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=UTC_TZ)
+    return value
+
+
+class SyncCadenceService:
+    """
+    同步节奏策略
+
+    同步间隔 = 目标变更数 / 变更频率（次/小时），并且：
+    - 尚无统计的实例使用基础间隔，未观测到变更的实例每次将间隔翻倍，直到最大间隔
+    - 间隔不小于平均同步耗时 × duration_factor，避免慢实例占满同步资源
+    - 连续失败时从最小间隔开始按 2 的幂退避
+    - 最终限制在 [min_interval_minutes, max_interval_minutes] 之间
+    """
+
+    DEFAULT_CADENCE = {
+        "enabled": True,
+        "base_interval_minutes": 30,
+        "min_interval_minutes": 10,
+        "max_interval_minutes": 720,
+        "target_changes_per_sync": 1.0,
+        "smoothing": 0.3,
+        "duration_factor": 10,
+    }
+
+    def __init__(self) -> None:
+        self.sync_logger = get_sync_logger()
+        self.cadence = self._load_cadence_config()
+
+    def _load_cadence_config(self) -> dict[str, Any]:
+        """加载同步节奏配置，配置文件缺失或格式错误时使用默认值"""
+        cadence = dict(self.DEFAULT_CADENCE)
+        if not os.path.exists(CONFIG_FILE):
+            return cadence
+
+        try:
+            with open(CONFIG_FILE, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            loaded = (config.get("account_sync") or {}).get("cadence") or {}
+            cadence["enabled"] = bool(loaded.get("enabled", cadence["enabled"]))
+            for key in ("base_interval_minutes", "min_interval_minutes", "max_interval_minutes", "duration_factor"):
+                cadence[key] = max(0, int(loaded.get(key, cadence[key])))
+            for key in ("target_changes_per_sync", "smoothing"):
+                cadence[key] = float(loaded.get(key, cadence[key]))
+            cadence["smoothing"] = min(1.0, max(0.01, cadence["smoothing"]))
+            cadence["max_interval_minutes"] = max(cadence["max_interval_minutes"], cadence["min_interval_minutes"])
+        except Exception as e:
+            self.sync_logger.warning("加载同步节奏配置失败，使用默认值", module="sync_cadence", error=str(e))
+        return cadence
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用自适应同步节奏"""
+        return self.cadence["enabled"]
+
+    def compute_interval(self, state: InstanceSyncState) -> int:
+        """根据实例统计计算同步间隔（秒）"""
+        min_seconds = self.cadence["min_interval_minutes"] * 60
+        max_seconds = self.cadence["max_interval_minutes"] * 60
+
+        if state.failure_streak:
+            interval = min_seconds * 2 ** (state.failure_streak - 1)
+        elif state.change_rate_per_hour is None:
+            interval = self.cadence["base_interval_minutes"] * 60
+        elif state.change_rate_per_hour <= 0:
+            # 未观测到变更：在当前间隔基础上逐步放宽
+            interval = (state.sync_interval_seconds or self.cadence["base_interval_minutes"] * 60) * 2
+        else:
+            interval = self.cadence["target_changes_per_sync"] / state.change_rate_per_hour * 3600
+
+        if state.avg_sync_seconds:
+            interval = max(interval, state.avg_sync_seconds * self.cadence["duration_factor"])
+        return int(min(max_seconds, max(min_seconds, interval)))
+
+    def select_due_instances(self, instances: list[Instance]) -> list[Instance]:
+        """
+        筛选已到期的实例，并预先把它们的下次到期时间推迟一个同步间隔，
+        避免同步完成前被下一次定时任务重复选中（同步完成后按实际结果重新计算）
+
+        Args:
+            instances: 候选实例列表
+
+        Returns:
+            List[Instance]: 到期需要同步的实例
+        """
+        current_time = now()
+        states = {
+            state.instance_id: state
+            for state in InstanceSyncState.query.filter(
+                InstanceSyncState.instance_id.in_([instance.id for instance in instances])
+            ).all()
+        }
+
+        due = []
+        for instance in instances:
+            state = states.get(instance.id)
+            if state is not None and state.next_due_at is not None and _as_utc(state.next_due_at) > current_time:
+                continue
+            if state is None:
+                state = InstanceSyncState(instance_id=instance.id, failure_streak=0)
+                db.session.add(state)
+            interval = state.sync_interval_seconds or self.compute_interval(state)
+            state.next_due_at = current_time + timedelta(seconds=interval)
+            due.append(instance)
+        db.session.commit()
+
+        self.sync_logger.info(
+            "筛选到期同步实例",
+            module="sync_cadence",
+            candidate_count=len(instances),
+            due_count=len(due),
+        )
+        return due
+
+    def record_outcome(
+        self,
+        instance_id: int,
+        session_id: str,
+        *,
+        success: bool,
+        duration_seconds: float | None = None,
+        added_count: int = 0,
+        removed_count: int = 0,
+    ) -> None:
+        """
+        记录一次实例同步结果并更新节奏统计和下次到期时间
+
+        变更数为该会话写入的账户变更日志数（权限修改）加上同步结果中的新增和删除账户数，
+        按距上次成功同步的时长折算为变更频率后做指数平滑。
+
+        Args:
+            instance_id: 实例ID
+            session_id: 同步会话ID
+            success: 同步是否成功
+            duration_seconds: 本次同步耗时
+            added_count: 本次新增账户数（新增账户不写变更日志）
+            removed_count: 本次删除账户数（删除账户不写变更日志）
+        """
+        try:
+            state = InstanceSyncState.get_or_create(instance_id)
+            current_time = now()
+            alpha = self.cadence["smoothing"]
+
+            if success:
+                # 首次同步没有可折算的观测时长，只记录同步时间
+                last_sync_at = _as_utc(state.last_sync_at)
+                if last_sync_at is not None:
+                    changes = AccountChangeLog.query.filter_by(instance_id=instance_id, session_id=session_id).count()
+                    changes += added_count + removed_count
+                    elapsed_hours = max((current_time - last_sync_at).total_seconds(), 60) / 3600
+                    observed_rate = changes / elapsed_hours
+                    if state.change_rate_per_hour is None:
+                        state.change_rate_per_hour = observed_rate
+                    else:
+                        state.change_rate_per_hour = alpha * observed_rate + (1 - alpha) * state.change_rate_per_hour
+                if duration_seconds is not None:
+                    if state.avg_sync_seconds is None:
+                        state.avg_sync_seconds = duration_seconds
+                    else:
+                        state.avg_sync_seconds = alpha * duration_seconds + (1 - alpha) * state.avg_sync_seconds
+                state.failure_streak = 0
+                state.last_sync_at = current_time
+            else:
+                state.failure_streak = (state.failure_streak or 0) + 1
+
+            state.sync_interval_seconds = self.compute_interval(state)
+            state.next_due_at = current_time + timedelta(seconds=state.sync_interval_seconds)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.warning(
+                "更新实例同步节奏失败",
+                module="sync_cadence",
+                instance_id=instance_id,
+                session_id=session_id,
+                error=str(e),
+            )
+
+
+# 全局同步节奏实例
+sync_cadence_service = SyncCadenceService()
@@ -99,6 +99,22 @@ class SyncDataManager:
                 "removed_count": 0,
             }
 
+    def get_catalog_change_token(self, instance: Instance, connection: Any) -> str | None:  # noqa: ANN401
+        """
+        获取实例的账户目录变更令牌
+
+        Args:
+            instance: 数据库实例
+            connection: 数据库连接
+
+        Returns:
+            str: 令牌，不支持的数据库类型或获取失败时返回None
+        """
+        adapter = self._get_adapter(instance.db_type)
+        if not adapter:
+            return None
+        return adapter.get_catalog_change_token(instance, connection)
+
     def _get_adapter(self, db_type: str) -> Any:  # noqa: ANN401
         """
         获取数据库类型对应的适配器
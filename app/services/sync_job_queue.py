@@ -0,0 +1,317 @@
+"""
+鲸落 - 同步任务队列
+队列模式下同步轮次为每个实例写入一条任务，由任意数量的同步工作进程以租约方式认领执行
+"""
+
+import os
+from datetime import timedelta
+from typing import Any
+
+import yaml
+from sqlalchemy import and_, or_, update
+
+from app import db
+from app.models.sync_instance_record import SyncInstanceRecord
+from app.models.sync_job import SyncJob
+from app.services.sync_session_service import sync_session_service
+from app.utils.structlog_config import get_sync_logger
+from app.utils.time_utils import time_utils
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+# 支持 SELECT ... FOR UPDATE SKIP LOCKED 的数据库方言，其余方言使用乐观租约
+SKIP_LOCKED_DIALECTS = ("postgresql", "mysql")
+
+
+class SyncJobQueue:
+    """
+    同步任务队列 - 基于应用数据库的工作队列
+
+    - 认领：PostgreSQL/MySQL 使用 FOR UPDATE SKIP LOCKED，多个工作进程互不阻塞；
+      SQLite 等使用乐观租约（按 attempts 版本号条件更新，更新行数为1才算认领成功）
+    - 租约：认领时写入 worker_id 和 lease_expires_at，执行期间由心跳续租；
+      工作进程崩溃后租约到期，任务可被其他工作进程重新认领，直到达到 max_attempts
+    - 心跳和完成都以 (worker_id, attempts) 为条件，租约被他人接管后旧持有者的写入不会生效
+    """
+
+    DEFAULT_QUEUE_CONFIG = {
+        "enabled": False,
+        "lease_seconds": 300,
+        "heartbeat_seconds": 30,
+        "poll_seconds": 5,
+        "max_attempts": 3,
+    }
+
+    # 乐观租约模式下每次认领尝试的候选任务数
+    CLAIM_CANDIDATES = 10
+
+    def __init__(self) -> None:
+        self.sync_logger = get_sync_logger()
+        self.config = self._load_queue_config()
+
+    def _load_queue_config(self) -> dict[str, Any]:
+        """加载队列配置，配置文件缺失或格式错误时使用默认值"""
+        queue = dict(self.DEFAULT_QUEUE_CONFIG)
+        if not os.path.exists(CONFIG_FILE):
+            return queue
+
+        try:
+            with open(CONFIG_FILE, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            loaded = (config.get("account_sync") or {}).get("queue") or {}
+            queue["enabled"] = bool(loaded.get("enabled", queue["enabled"]))
+            for key in ("lease_seconds", "heartbeat_seconds", "poll_seconds", "max_attempts"):
+                queue[key] = max(1, int(loaded.get(key, queue[key])))
+        except Exception as e:
+            self.sync_logger.warning("加载同步队列配置失败，使用默认值", module="sync_job_queue", error=str(e))
+        return queue
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用队列模式"""
+        return self.config["enabled"]
+
+    def enqueue_session(self, session_id: str, records: list[SyncInstanceRecord], sync_type: str) -> list[SyncJob]:
+        """
+        为会话的每条实例记录写入一条待认领任务
+
+        Args:
+            session_id: 同步会话ID
+            records: 会话对应的实例记录
+            sync_type: 同步类型
+
+        Returns:
+            List[SyncJob]: 创建的任务列表
+        """
+        try:
+            jobs = [
+                SyncJob(
+                    session_id=session_id,
+                    record_id=record.id,
+                    instance_id=record.instance_id,
+                    sync_type=sync_type,
+                    status="pending",
+                    attempts=0,
+                    max_attempts=self.config["max_attempts"],
+                )
+                for record in records
+            ]
+            db.session.add_all(jobs)
+            db.session.commit()
+
+            self.sync_logger.info(
+                "同步任务已入队",
+                module="sync_job_queue",
+                session_id=session_id,
+                job_count=len(jobs),
+            )
+            return jobs
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.error("同步任务入队失败", module="sync_job_queue", session_id=session_id, error=str(e))
+            raise
+
+    @staticmethod
+    def _claimable(current_time: Any) -> Any:  # noqa: ANN401
+        """可认领条件：待执行，或执行中但租约已过期；且未达到最大认领次数"""
+        return and_(
+            SyncJob.attempts < SyncJob.max_attempts,
+            or_(
+                SyncJob.status == "pending",
+                and_(SyncJob.status == "running", SyncJob.lease_expires_at < current_time),
+            ),
+        )
+
+    def _lease_values(self, worker_id: str, attempts: int, current_time: Any) -> dict[str, Any]:  # noqa: ANN401
+        return {
+            "status": "running",
+            "attempts": attempts + 1,
+            "worker_id": worker_id,
+            "lease_expires_at": current_time + timedelta(seconds=self.config["lease_seconds"]),
+            "heartbeat_at": current_time,
+            "started_at": current_time,
+            "error_message": None,
+        }
+
+    @staticmethod
+    def _job_info(job: SyncJob) -> dict[str, Any]:
+        """认领结果（只返回标量字段，工作线程不持有ORM对象）"""
+        return {
+            "id": job.id,
+            "session_id": job.session_id,
+            "record_id": job.record_id,
+            "instance_id": job.instance_id,
+            "sync_type": job.sync_type,
+            "worker_id": job.worker_id,
+            "attempts": job.attempts,
+        }
+
+    def claim(self, worker_id: str) -> dict[str, Any] | None:
+        """
+        认领一个任务
+
+        Args:
+            worker_id: 工作进程（线程）标识
+
+        Returns:
+            Optional[Dict]: 认领到的任务信息，队列为空或认领冲突时返回None
+        """
+        try:
+            self.fail_exhausted()
+            if db.engine.dialect.name in SKIP_LOCKED_DIALECTS:
+                return self._claim_skip_locked(worker_id)
+            return self._claim_optimistic(worker_id)
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.error("认领同步任务失败", module="sync_job_queue", worker_id=worker_id, error=str(e))
+            return None
+
+    def _claim_skip_locked(self, worker_id: str) -> dict[str, Any] | None:
+        """SELECT ... FOR UPDATE SKIP LOCKED 认领：已被其他事务锁定的行直接跳过"""
+        current_time = time_utils.now()
+        job = (
+            SyncJob.query.filter(self._claimable(current_time))
+            .order_by(SyncJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.session.rollback()
+            return None
+
+        for key, value in self._lease_values(worker_id, job.attempts, current_time).items():
+            setattr(job, key, value)
+        db.session.commit()
+        return self._job_info(job)
+
+    def _claim_optimistic(self, worker_id: str) -> dict[str, Any] | None:
+        """乐观租约认领：以 attempts 作为版本号条件更新，其他工作进程抢先认领时更新行数为0"""
+        current_time = time_utils.now()
+        candidates = (
+            db.session.query(SyncJob.id, SyncJob.attempts)
+            .filter(self._claimable(current_time))
+            .order_by(SyncJob.id)
+            .limit(self.CLAIM_CANDIDATES)
+            .all()
+        )
+        for job_id, attempts in candidates:
+            result = db.session.execute(
+                update(SyncJob)
+                .where(SyncJob.id == job_id, SyncJob.attempts == attempts, self._claimable(current_time))
+                .values(**self._lease_values(worker_id, attempts, current_time))
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return self._job_info(db.session.get(SyncJob, job_id))
+        db.session.rollback()
+        return None
+
+    @staticmethod
+    def _owned_by(job: dict[str, Any]) -> Any:  # noqa: ANN401
+        """租约持有条件：任务仍由该工作进程以同一次认领持有"""
+        return and_(
+            SyncJob.id == job["id"],
+            SyncJob.status == "running",
+            SyncJob.worker_id == job["worker_id"],
+            SyncJob.attempts == job["attempts"],
+        )
+
+    def heartbeat(self, job: dict[str, Any]) -> bool:
+        """
+        续租
+
+        Returns:
+            bool: 是否仍持有租约（False 表示租约已过期并被其他工作进程接管）
+        """
+        try:
+            current_time = time_utils.now()
+            result = db.session.execute(
+                update(SyncJob)
+                .where(self._owned_by(job))
+                .values(
+                    heartbeat_at=current_time,
+                    lease_expires_at=current_time + timedelta(seconds=self.config["lease_seconds"]),
+                )
+            )
+            db.session.commit()
+            return result.rowcount == 1
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.warning("同步任务心跳失败", module="sync_job_queue", job_id=job["id"], error=str(e))
+            return False
+
+    def finish(self, job: dict[str, Any], *, success: bool, error_message: str | None = None) -> bool:
+        """
+        标记任务完成或失败
+
+        Returns:
+            bool: 是否成功写入（False 表示租约已丢失，结果以接管者为准）
+        """
+        try:
+            result = db.session.execute(
+                update(SyncJob)
+                .where(self._owned_by(job))
+                .values(
+                    status="completed" if success else "failed",
+                    completed_at=time_utils.now(),
+                    lease_expires_at=None,
+                    error_message=None if success else error_message,
+                )
+            )
+            db.session.commit()
+            if result.rowcount != 1:
+                self.sync_logger.warning(
+                    "同步任务租约已丢失，结果未写入队列",
+                    module="sync_job_queue",
+                    job_id=job["id"],
+                    worker_id=job["worker_id"],
+                )
+                return False
+            return True
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.error("更新同步任务状态失败", module="sync_job_queue", job_id=job["id"], error=str(e))
+            return False
+
+    def fail_exhausted(self) -> int:
+        """
+        将租约已过期且达到最大认领次数的任务标记为失败，并同步标记实例记录
+
+        Returns:
+            int: 标记失败的任务数
+        """
+        current_time = time_utils.now()
+        jobs = (
+            SyncJob.query.filter(
+                SyncJob.status == "running",
+                SyncJob.lease_expires_at < current_time,
+                SyncJob.attempts >= SyncJob.max_attempts,
+            )
+            .order_by(SyncJob.id)
+            .all()
+        )
+        failed = 0
+        for job in jobs:
+            error_message = f"工作进程租约过期，已达到最大认领次数 {job.max_attempts}"
+            result = db.session.execute(
+                update(SyncJob)
+                .where(SyncJob.id == job.id, SyncJob.status == "running", SyncJob.attempts == job.attempts)
+                .values(status="failed", completed_at=current_time, lease_expires_at=None, error_message=error_message)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                failed += 1
+                sync_session_service.fail_instance_sync(job.record_id, error_message=error_message)
+        return failed
+
+    def get_queue_stats(self) -> dict[str, int]:
+        """各状态任务数"""
+        rows = db.session.query(SyncJob.status, db.func.count(SyncJob.id)).group_by(SyncJob.status).all()
+        stats = {"pending": 0, "running": 0, "completed": 0, "failed": 0}
+        stats.update(dict(rows))
+        return stats
+
+
+# 全局同步任务队列实例
+sync_job_queue = SyncJobQueue()
@@ -0,0 +1,337 @@
+"""
+鲸落 - 单实例同步租约
+手动单实例、批量和定时同步共用的实例级互斥：同一实例同一时间只有一个同步在执行，
+其余请求等待并复用进行中同步的结果
+"""
+
+import os
+import socket
+import threading
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Any
+from uuid import uuid4
+
+import yaml
+from flask import current_app
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.instance_sync_state import InstanceSyncState
+from app.utils.structlog_config import get_sync_logger
+from app.utils.sync_cancellation import CANCEL_REASON_LEASE_LOST, SyncCancelled, check_cancelled
+from app.utils.time_utils import time_utils
+from app.utils.timezone import UTC_TZ
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+# 当前上下文持有的租约，批量写入提交前以其防护令牌校验
+_current_lease: ContextVar["dict[str, Any] | None"] = ContextVar("sync_lease", default=None)
+
+# 写入 last_result 的结果字段（不含剖析等大字段）
+RESULT_SUMMARY_KEYS = (
+    "success",
+    "skipped",
+    "message",
+    "error",
+    "synced_count",
+    "added_count",
+    "modified_count",
+    "removed_count",
+)
+
+
+class SyncLeaseService:
+    """
+    单实例同步租约 - 基于 instance_sync_states 行的分布式互斥
+
+    - 获取：租约为空或已过期时条件更新，lease_token 递增作为防护令牌（fencing token）
+    - 续租：持有期间由心跳线程按 heartbeat_seconds 续租；进程崩溃后租约在 lease_seconds 后过期可被接管
+    - 防护：批量写入和最终提交前在同一事务内以 (instance_id, lease_token) 条件续租，
+      租约已被接管时更新行数为0，抛出 SyncCancelled 回滚本次写入，旧持有者的写入不会生效
+    - 复用：未获取到租约的请求轮询等待，持有者释放租约时写入 last_result，等待者直接返回该结果
+    """
+
+    DEFAULT_LEASE_CONFIG = {
+        "enabled": True,
+        "lease_seconds": 120,
+        "heartbeat_seconds": 30,
+        "attach_timeout_seconds": 1800,
+        "attach_poll_seconds": 1,
+    }
+
+    def __init__(self) -> None:
+        self.sync_logger = get_sync_logger()
+        self.config = self._load_lease_config()
+
+    def _load_lease_config(self) -> dict[str, Any]:
+        """加载租约配置，配置文件缺失或格式错误时使用默认值"""
+        lease = dict(self.DEFAULT_LEASE_CONFIG)
+        if not os.path.exists(CONFIG_FILE):
+            return lease
+
+        try:
+            with open(CONFIG_FILE, encoding="utf-8") as f:
+                config = yaml.safe_load(f) or {}
+            loaded = (config.get("account_sync") or {}).get("single_flight") or {}
+            lease["enabled"] = bool(loaded.get("enabled", lease["enabled"]))
+            for key in ("lease_seconds", "heartbeat_seconds", "attach_timeout_seconds", "attach_poll_seconds"):
+                lease[key] = max(1, int(loaded.get(key, lease[key])))
+        except Exception as e:
+            self.sync_logger.warning("加载同步租约配置失败，使用默认值", module="sync_lease", error=str(e))
+        return lease
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用单实例同步互斥"""
+        return self.config["enabled"]
+
+    def run_single_flight(self, instance_id: int, run: Callable[[], dict[str, Any]]) -> dict[str, Any]:
+        """
+        在实例租约下执行同步；实例已有同步在执行时等待并复用其结果
+
+        Args:
+            instance_id: 实例ID
+            run: 实际执行同步的函数
+
+        Returns:
+            Dict: 同步结果（复用时 details.outcome 为 attached）
+        """
+        if not self.enabled:
+            return run()
+
+        deadline = time.monotonic() + self.config["attach_timeout_seconds"]
+        while True:
+            lease = self.acquire(instance_id)
+            if lease is not None:
+                return self._run_with_lease(lease, run)
+
+            # 持有者异常退出、租约过期而未写入结果时返回None，重新尝试获取租约
+            result = self.wait_for_result(instance_id, deadline)
+            if result is not None:
+                return result
+            if time.monotonic() >= deadline:
+                return {
+                    "success": False,
+                    "error": "实例正在由其他任务同步，等待其结果超时",
+                    "synced_count": 0,
+                    "added_count": 0,
+                    "modified_count": 0,
+                    "removed_count": 0,
+                    "details": {"outcome": "attach-timeout"},
+                }
+
+    def acquire(self, instance_id: int) -> dict[str, Any] | None:
+        """
+        获取实例同步租约
+
+        Returns:
+            Optional[Dict]: 租约信息 (instance_id, token, owner)，实例已被其他同步持有时返回None
+        """
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        try:
+            if not db.session.query(InstanceSyncState.id).filter_by(instance_id=instance_id).first():
+                db.session.add(InstanceSyncState(instance_id=instance_id, failure_streak=0, lease_token=0))
+                db.session.commit()
+        except IntegrityError:
+            # 并发创建同一实例的状态行，由对方创建即可
+            db.session.rollback()
+
+        try:
+            current_time = time_utils.now()
+            result = db.session.execute(
+                update(InstanceSyncState)
+                .where(
+                    InstanceSyncState.instance_id == instance_id,
+                    or_(
+                        InstanceSyncState.lease_expires_at.is_(None), InstanceSyncState.lease_expires_at < current_time
+                    ),
+                )
+                .values(
+                    lease_token=InstanceSyncState.lease_token + 1,
+                    lease_owner=owner,
+                    lease_expires_at=current_time + timedelta(seconds=self.config["lease_seconds"]),
+                )
+            )
+            db.session.commit()
+            if result.rowcount != 1:
+                return None
+            token = db.session.execute(
+                select(InstanceSyncState.lease_token).where(
+                    InstanceSyncState.instance_id == instance_id, InstanceSyncState.lease_owner == owner
+                )
+            ).scalar_one()
+            return {"instance_id": instance_id, "token": token, "owner": owner}
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.error("获取实例同步租约失败", module="sync_lease", instance_id=instance_id, error=str(e))
+            raise
+
+    @staticmethod
+    def _owned_by(lease: dict[str, Any]) -> Any:  # noqa: ANN401
+        """租约持有条件：防护令牌未变化"""
+        return (InstanceSyncState.instance_id == lease["instance_id"]) & (
+            InstanceSyncState.lease_token == lease["token"]
+        )
+
+    def renew(self, lease: dict[str, Any]) -> bool:
+        """
+        续租（不提交，随调用方事务提交）
+
+        Returns:
+            bool: 是否仍持有租约
+        """
+        result = db.session.execute(
+            update(InstanceSyncState)
+            .where(self._owned_by(lease))
+            .values(lease_expires_at=time_utils.now() + timedelta(seconds=self.config["lease_seconds"]))
+        )
+        return result.rowcount == 1
+
+    def release(self, lease: dict[str, Any], result: dict[str, Any] | None) -> None:
+        """释放租约，并写入结果摘要供等待中的请求复用"""
+        summary = {key: result[key] for key in RESULT_SUMMARY_KEYS if result and key in result}
+        if result is None:
+            summary = {"success": False, "error": "同步已中止"}
+        summary["outcome"] = ((result or {}).get("details") or {}).get("outcome")
+        summary["lease_token"] = lease["token"]
+        try:
+            db.session.execute(
+                update(InstanceSyncState)
+                .where(self._owned_by(lease))
+                .values(lease_owner=None, lease_expires_at=None, last_result=summary)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.sync_logger.warning(
+                "释放实例同步租约失败，等待租约过期",
+                module="sync_lease",
+                instance_id=lease["instance_id"],
+                lease_token=lease["token"],
+                error=str(e),
+            )
+
+    def wait_for_result(self, instance_id: int, deadline: float) -> dict[str, Any] | None:
+        """
+        等待进行中的同步结束并返回其结果
+
+        Args:
+            instance_id: 实例ID
+            deadline: 等待截止时间（time.monotonic）
+
+        Returns:
+            Optional[Dict]: 复用的同步结果；持有者租约过期而未写入结果或等待超时时返回None
+        """
+        observed_token = None
+        self.sync_logger.info("实例正在同步，等待进行中的同步结果", module="sync_lease", instance_id=instance_id)
+        while time.monotonic() < deadline:
+            # 批量/定时同步等待期间同样响应会话取消和实例超时
+            check_cancelled()
+            row = db.session.execute(
+                select(
+                    InstanceSyncState.lease_token, InstanceSyncState.lease_expires_at, InstanceSyncState.last_result
+                ).where(InstanceSyncState.instance_id == instance_id)
+            ).one_or_none()
+            if row is None:
+                return None
+
+            token, expires_at, last_result = row
+            observed_token = token if observed_token is None else observed_token
+            if expires_at is None:
+                if last_result and last_result.get("lease_token", 0) >= observed_token:
+                    return self._attached_result(last_result)
+                return None
+            if expires_at.tzinfo is None:
+                # SQLite 读回的时间不带时区，按UTC处理
+                expires_at = expires_at.replace(tzinfo=UTC_TZ)
+            if expires_at < time_utils.now():
+                return None
+            time.sleep(self.config["attach_poll_seconds"])
+        return None
+
+    @staticmethod
+    def _attached_result(last_result: dict[str, Any]) -> dict[str, Any]:
+        """由进行中同步的结果摘要构造复用结果"""
+        result = {key: last_result[key] for key in RESULT_SUMMARY_KEYS if key in last_result}
+        result.setdefault("success", False)
+        result["details"] = {
+            "outcome": "attached",
+            "attached_outcome": last_result.get("outcome"),
+            "lease_token": last_result.get("lease_token"),
+        }
+        return result
+
+    def _run_with_lease(self, lease: dict[str, Any], run: Callable[[], dict[str, Any]]) -> dict[str, Any]:
+        """持有租约执行同步：心跳续租、设置防护上下文，结束后释放租约"""
+        app = current_app._get_current_object()
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop,
+            args=(app, lease, done),
+            name=f"sync_lease_{lease['instance_id']}",
+            daemon=True,
+        )
+        heartbeat.start()
+        reset_token = _current_lease.set(lease)
+        result = None
+        try:
+            result = run()
+            if not result.get("success"):
+                # 失败的同步不应留下未提交的写入
+                db.session.rollback()
+            return result
+        except BaseException:
+            db.session.rollback()
+            raise
+        finally:
+            _current_lease.reset(reset_token)
+            done.set()
+            heartbeat.join()
+            self.release(lease, result)
+
+    def _heartbeat_loop(self, app: Any, lease: dict[str, Any], done: threading.Event) -> None:  # noqa: ANN401
+        """心跳线程：同步结束前每隔 heartbeat_seconds 续租一次（独立数据库会话）"""
+        with app.app_context():
+            try:
+                while not done.wait(self.config["heartbeat_seconds"]):
+                    try:
+                        owned = self.renew(lease)
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        self.sync_logger.warning(
+                            "实例同步租约续租失败", module="sync_lease", instance_id=lease["instance_id"], error=str(e)
+                        )
+                        continue
+                    if not owned:
+                        self.sync_logger.warning(
+                            "实例同步租约已被接管，停止续租",
+                            module="sync_lease",
+                            instance_id=lease["instance_id"],
+                            lease_token=lease["token"],
+                        )
+                        return
+            finally:
+                db.session.remove()
+
+
+def fence_current_lease() -> None:
+    """
+    写入提交前的防护检查：在当前事务内以防护令牌续租，租约已被接管时抛出 SyncCancelled
+
+    当前上下文未持有租约时不做任何事。
+    """
+    lease = _current_lease.get()
+    if lease is None:
+        return
+    if not sync_lease_service.renew(lease):
+        msg = f"实例同步租约已被其他同步接管（防护令牌 {lease['token']}），放弃本次写入"
+        raise SyncCancelled(CANCEL_REASON_LEASE_LOST, msg)
+
+
+# 全局单实例同步租约实例
+sync_lease_service = SyncLeaseService()
@@ -10,6 +10,7 @@ from app.models.instance import Instance
 from app.models.sync_instance_record import SyncInstanceRecord
 from app.models.sync_session import SyncSession
 from app.utils.structlog_config import get_sync_logger, get_system_logger
+from app.utils.sync_cancellation import cancel_session_tokens
 from app.utils.time_utils import time_utils
 
 
@@ -181,7 +182,7 @@ class SyncSessionService:
             db.session.commit()
 
             # 更新会话统计
-            self._update_session_statistics(record.session_id)
+            self.update_session_statistics(record.session_id)
 
             self.sync_logger.info(
                 "完成实例同步",
@@ -227,7 +228,7 @@ class SyncSessionService:
             db.session.commit()
 
             # 更新会话统计
-            self._update_session_statistics(record.session_id)
+            self.update_session_statistics(record.session_id)
 
             self.sync_logger.error(
                 "实例同步失败",
@@ -249,20 +250,37 @@ class SyncSessionService:
             )
             return False
 
-    def _update_session_statistics(self, session_id: str):
-        """更新会话统计信息"""
+    def update_session_statistics(self, session_id: str) -> None:
+        """
+        更新会话统计信息
+
+        并发工作线程/进程各自提交实例记录后都会调用：先锁定会话行再重新统计实例记录，
+        后提交的统计总是基于已提交的全部实例记录，不会覆盖彼此的结果；
+        只有统计出全部实例结束的那一次调用对账户同步会话执行增量分类
+        """
         try:
-            session = SyncSession.query.filter_by(session_id=session_id).first()
-            if session:
-                session.update_statistics()
-                db.session.commit()
+            session = (
+                SyncSession.query.filter_by(session_id=session_id).with_for_update().populate_existing().first()
+            )
+            if not session:
+                return
+            was_finished = session.all_instances_finished()
+            session.update_statistics()
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             self.sync_logger.error(
                 "更新会话统计失败",
                 module="sync_session",
                 session_id=session_id,
                 error=str(e),
             )
+            return
+
+        if session.sync_category == "account" and not was_finished and session.all_instances_finished():
+            from app.services.account_sync_service import account_sync_service
+
+            account_sync_service.classify_session_accounts(session)
 
     def get_session_records(self, session_id: str) -> list[SyncInstanceRecord]:
         """
@@ -392,7 +410,12 @@ class SyncSessionService:
                 session.updated_at = time_utils.now()
                 db.session.commit()
 
-                self.sync_logger.info("取消同步会话", module="sync_session", session_id=session_id)
+                # 本进程内正在执行的实例同步立即在下一个检查点中止；
+                # 其他进程（队列工作进程）的同步通过轮询会话状态感知取消
+                notified = cancel_session_tokens(session_id)
+                self.sync_logger.info(
+                    "取消同步会话", module="sync_session", session_id=session_id, running_instances=notified
+                )
 
             return True
         except Exception as e:
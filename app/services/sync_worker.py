@@ -0,0 +1,160 @@
+"""
+鲸落 - 同步工作进程
+从应用数据库的同步任务队列认领实例任务并执行，可在任意数量的节点上横向扩展
+"""
+
+import os
+import socket
+import threading
+from typing import Any
+
+from flask import Flask
+
+from app import db
+from app.models.instance import Instance
+from app.services.account_sync_orchestrator import account_sync_orchestrator
+from app.services.sync_job_queue import sync_job_queue
+from app.services.sync_session_service import sync_session_service
+from app.utils.structlog_config import get_sync_logger
+
+
+class SyncWorker:
+    """
+    同步工作进程
+
+    每个工作线程循环认领任务，执行期间由独立的心跳线程续租；
+    同步结果通过 sync_session_service 写回实例记录，任务状态写回队列。
+    """
+
+    def __init__(self, app: Flask, *, worker_id: str | None = None, concurrency: int = 1) -> None:
+        self.app = app
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = max(1, concurrency)
+        self.sync_logger = get_sync_logger()
+        self._stop_event = threading.Event()
+        self._processed = 0
+        self._processed_lock = threading.Lock()
+
+    def stop(self) -> None:
+        """请求停止：各工作线程执行完当前任务后退出"""
+        self._stop_event.set()
+
+    def run(self, *, burst: bool = False) -> int:
+        """
+        运行工作进程直到收到停止请求
+
+        Args:
+            burst: 为True时队列为空即退出（用于一次性排空队列）
+
+        Returns:
+            int: 本次运行处理的任务数
+        """
+        self.sync_logger.info(
+            "同步工作进程启动",
+            module="sync_worker",
+            worker_id=self.worker_id,
+            concurrency=self.concurrency,
+            burst=burst,
+        )
+        threads = [
+            threading.Thread(
+                target=self._work_loop,
+                args=(f"{self.worker_id}/{index}", burst),
+                name=f"sync_worker_{index}",
+                daemon=True,
+            )
+            for index in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # 分段等待，保证主线程能及时响应信号
+            while thread.is_alive():
+                thread.join(timeout=1)
+
+        self.sync_logger.info(
+            "同步工作进程退出", module="sync_worker", worker_id=self.worker_id, processed=self._processed
+        )
+        return self._processed
+
+    def _work_loop(self, worker_id: str, burst: bool) -> None:  # noqa: FBT001
+        """工作线程：认领 -> 执行 -> 写回，队列为空时按轮询间隔等待"""
+        with self.app.app_context():
+            while not self._stop_event.is_set():
+                job = sync_job_queue.claim(worker_id)
+                if job is None:
+                    db.session.remove()
+                    if burst:
+                        return
+                    self._stop_event.wait(sync_job_queue.config["poll_seconds"])
+                    continue
+
+                try:
+                    self._execute(job)
+                except Exception as e:
+                    db.session.rollback()
+                    self.sync_logger.error(
+                        "执行同步任务异常", module="sync_worker", worker_id=worker_id, job_id=job["id"], error=str(e)
+                    )
+                    sync_job_queue.finish(job, success=False, error_message=str(e))
+                finally:
+                    db.session.remove()
+                    with self._processed_lock:
+                        self._processed += 1
+
+    def _execute(self, job: dict[str, Any]) -> None:
+        """执行单个任务，执行期间按心跳间隔续租"""
+        instance = Instance.query.get(job["instance_id"])
+        if instance is None:
+            error_message = f"实例不存在: {job['instance_id']}"
+            sync_session_service.fail_instance_sync(job["record_id"], error_message=error_message)
+            sync_job_queue.finish(job, success=False, error_message=error_message)
+            return
+
+        self.sync_logger.info(
+            "认领同步任务",
+            module="sync_worker",
+            worker_id=job["worker_id"],
+            job_id=job["id"],
+            session_id=job["session_id"],
+            instance_name=instance.name,
+            attempt=job["attempts"],
+        )
+        instance_job = {
+            "instance_id": instance.id,
+            "instance_name": instance.name,
+            "db_type": instance.db_type,
+            "host": instance.host or "",
+            "record_id": job["record_id"],
+        }
+
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, args=(job, done), name=f"sync_heartbeat_{job['id']}", daemon=True
+        )
+        heartbeat.start()
+        try:
+            outcome = account_sync_orchestrator.run_instance_job(
+                self.app, job["session_id"], job["sync_type"], instance_job
+            )
+        finally:
+            done.set()
+            heartbeat.join()
+
+        sync_job_queue.finish(job, success=outcome["success"], error_message=outcome["message"])
+
+    def _heartbeat_loop(self, job: dict[str, Any], done: threading.Event) -> None:
+        """心跳线程：任务结束前每隔 heartbeat_seconds 续租一次"""
+        with self.app.app_context():
+            try:
+                while not done.wait(sync_job_queue.config["heartbeat_seconds"]):
+                    if not sync_job_queue.heartbeat(job):
+                        self.sync_logger.warning(
+                            "同步任务租约已丢失，停止续租",
+                            module="sync_worker",
+                            worker_id=job["worker_id"],
+                            job_id=job["id"],
+                        )
+                        return
+            finally:
+                db.session.remove()
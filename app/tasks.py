@@ -10,7 +10,6 @@ from app.models.account_change_log import AccountChangeLog
 from app.models.current_account_sync_data import CurrentAccountSyncData
 from app.models.unified_log import UnifiedLog
 from app.models.user import User
-from app.services.account_sync_service import account_sync_service
 from app.utils.structlog_config import get_sync_logger, get_task_logger
 from app.utils.timezone import now
 
@@ -40,8 +39,18 @@ def cleanup_old_logs() -> None:
             deleted_account_sync_data = 0
             deleted_change_logs = 0
 
+            # 清理不再被任何账户引用的权限快照（权限变化后旧快照即成为孤立行）
+            from app.models.permission_snapshot import PermissionSnapshot
+
+            deleted_permission_snapshots = PermissionSnapshot.delete_unreferenced(cutoff_date)
+
             db.session.commit()
 
+            # 权限配置变化后重新编码权限快照的位图
+            from app.services.privilege_bitset import privilege_bitset_service
+
+            refreshed_privilege_bits = privilege_bitset_service.refresh_stale_snapshots()
+
             # 记录操作日志
             task_logger.info(
                 "定时任务清理完成",
@@ -52,7 +61,9 @@ def cleanup_old_logs() -> None:
                 deleted_sync_records=deleted_sync_records,
                 deleted_account_sync_data=deleted_account_sync_data,
                 deleted_change_logs=deleted_change_logs,
+                deleted_permission_snapshots=deleted_permission_snapshots,
                 cleaned_temp_files=cleaned_files,
+                refreshed_privilege_bits=refreshed_privilege_bits,
                 cutoff_date=cutoff_date.isoformat(),
                 note="账户变更日志已保留用于审计",
             )
@@ -65,11 +76,12 @@ def cleanup_old_logs() -> None:
                 deleted_sync_records=deleted_sync_records,
                 deleted_account_sync_data=deleted_account_sync_data,
                 deleted_change_logs=deleted_change_logs,
+                deleted_permission_snapshots=deleted_permission_snapshots,
                 cleaned_temp_files=cleaned_files,
                 note="账户变更日志已保留用于审计",
             )
 
-            return f"清理完成：{deleted_logs} 条日志，{deleted_sync_sessions} 条同步会话，{deleted_sync_records} 条同步记录，{deleted_account_sync_data} 条账户同步数据，{cleaned_files} 个临时文件（账户变更日志已保留用于审计）"
+            return f"清理完成：{deleted_logs} 条日志，{deleted_sync_sessions} 条同步会话，{deleted_sync_records} 条同步记录，{deleted_account_sync_data} 条账户同步数据，{deleted_permission_snapshots} 个权限快照，{cleaned_files} 个临时文件（账户变更日志已保留用于审计）"
 
         except Exception as e:
             task_logger.error("定时任务清理失败", module="scheduler", exception=e)
@@ -114,6 +126,9 @@ def _cleanup_temp_files():
 def sync_accounts(*, manual_run: bool = False) -> None:
     """账户同步任务 - 同步所有数据库实例的账户（使用新的会话管理架构）"""
     from app.models.instance import Instance
+    from app.services.account_sync_orchestrator import account_sync_orchestrator
+    from app.services.sync_cadence_service import sync_cadence_service
+    from app.services.sync_job_queue import sync_job_queue
     from app.services.sync_session_service import sync_session_service
 
     sync_logger = get_sync_logger()
@@ -124,12 +139,18 @@ def sync_accounts(*, manual_run: bool = False) -> None:
         try:
             # 获取所有活跃的数据库实例
             instances = Instance.query.filter_by(is_active=True).all()
-            total_instances = len(instances)
 
             if not instances:
                 sync_logger.warning("没有找到活跃的数据库实例", module="scheduler")
                 return "没有找到活跃的数据库实例"
 
+            # 自适应同步节奏：定时触发时只同步已到期的实例，手动执行时同步全部实例
+            if not manual_run and sync_cadence_service.enabled:
+                instances = sync_cadence_service.select_due_instances(instances)
+                if not instances:
+                    return "没有到期需要同步的实例"
+            total_instances = len(instances)
+
             # 根据执行方式选择同步类型
             sync_type = "manual_task" if manual_run else "scheduled_task"
 
@@ -151,134 +172,26 @@ def sync_accounts(*, manual_run: bool = False) -> None:
             instance_ids = [inst.id for inst in instances]
             records = sync_session_service.add_instance_records(session.session_id, instance_ids)
 
-            success_count = 0
-            failed_count = 0
-            total_synced_count = 0
-            total_added_count = 0
-            total_removed_count = 0
-            total_modified_count = 0
-            results = []
-
-            for instance in instances:
-                # 找到对应的记录
-                record = next((r for r in records if r.instance_id == instance.id), None)
-                if not record:
-                    continue
-
-                try:
-                    # 开始实例同步
-                    sync_session_service.start_instance_sync(record.id)
-
-                    sync_logger.info(
-                        "开始同步实例",
-                        module="scheduler",
-                        session_id=session.session_id,
-                        instance_name=instance.name,
-                        db_type=instance.db_type,
-                        instance_id=instance.id,
-                    )
-
-                    # 执行账户同步，使用scheduled_task类型
-                    result = account_sync_service.sync_accounts(
-                        instance, sync_type="scheduled_task", session_id=session.session_id
-                    )
-
-                    if result.get("success"):
-                        success_count += 1
-                        instance_sync_count = result.get("synced_count", 0)
-                        total_synced_count += instance_sync_count
-                        total_added_count += result.get("added_count", 0)
-                        total_removed_count += result.get("removed_count", 0)
-                        total_modified_count += result.get("modified_count", 0)
-
-                        # 完成实例同步
-                        sync_session_service.complete_instance_sync(
-                            record.id,
-                            accounts_synced=instance_sync_count,
-                            accounts_created=result.get("added_count", 0),
-                            accounts_updated=result.get("modified_count", 0),
-                            accounts_deleted=result.get("removed_count", 0),
-                            sync_details=result.get("details", {}),
-                        )
-
-                        sync_logger.info(
-                            "实例同步完成",
-                            module="scheduler",
-                            session_id=session.session_id,
-                            instance_name=instance.name,
-                            instance_id=instance.id,
-                            synced_count=instance_sync_count,
-                        )
-
-                        results.append(
-                            {
-                                "instance_name": instance.name,
-                                "success": True,
-                                "message": result.get("message", "同步成功"),
-                                "synced_count": instance_sync_count,
-                            }
-                        )
-                    else:
-                        failed_count += 1
-                        error_msg = result.get("message", result.get("error", "未知错误"))
-
-                        # 标记实例同步失败
-                        sync_session_service.fail_instance_sync(
-                            record.id,
-                            error_message=error_msg,
-                            sync_details=result.get("details", {}),
-                        )
-
-                        sync_logger.warning(
-                            "实例同步失败",
-                            module="scheduler",
-                            session_id=session.session_id,
-                            instance_name=instance.name,
-                            instance_id=instance.id,
-                            error_msg=error_msg,
-                        )
-
-                        results.append(
-                            {
-                                "instance_name": instance.name,
-                                "success": False,
-                                "message": error_msg,
-                                "synced_count": 0,
-                            }
-                        )
-
-                except Exception as e:
-                    failed_count += 1
-
-                    # 标记实例同步失败
-                    if record:
-                        sync_session_service.fail_instance_sync(
-                            record.id,
-                            error_message=str(e),
-                            sync_details={"exception": str(e)},
-                        )
-
-                    sync_logger.error(
-                        "实例同步异常",
-                        module="scheduler",
-                        session_id=session.session_id,
-                        instance_name=instance.name,
-                        instance_id=instance.id,
-                        exception=str(e),
-                    )
-
-                    results.append(
-                        {
-                            "instance_name": instance.name,
-                            "success": False,
-                            "message": f"同步异常: {str(e)}",
-                            "synced_count": 0,
-                        }
-                    )
-
-            # 完成同步会话
-            session.update_statistics()
-            db.session.commit()
+            # 队列模式：只为每个实例写入任务，由同步工作进程认领执行
+            if sync_job_queue.enabled:
+                jobs = sync_job_queue.enqueue_session(session.session_id, records, sync_type)
+                return f"定时任务已创建 {len(jobs)} 个同步任务，等待同步工作进程执行"
+
+            # 并发执行实例同步（线程池 + 按数据库类型/主机限流）
+            summary = account_sync_orchestrator.sync_session_instances(
+                session.session_id, instances, records, sync_type="scheduled_task"
+            )
+            success_count = summary["success_count"]
+            failed_count = summary["failed_count"]
+            total_synced_count = summary["total_synced_count"]
+            total_added_count = summary["total_added_count"]
+            total_removed_count = summary["total_removed_count"]
+            total_modified_count = summary["total_modified_count"]
+            results = summary["results"]
+
+            # 完成同步会话：实例记录由工作线程在各自的数据库会话中提交，主会话中已加载的对象已过期
+            db.session.expire_all()
+            sync_session_service.update_session_statistics(session.session_id)
 
             # 记录操作日志
             task_logger.info(
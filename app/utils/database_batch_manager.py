@@ -3,11 +3,17 @@
 提供高效的批量提交机制，优化大量数据处理性能
 """
 
+from collections import defaultdict
 from typing import Any
 
 import structlog
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy import insert
 
 from app import db
+from app.services.sync_lease_service import fence_current_lease
+from app.utils.sync_cancellation import check_cancelled
+from app.utils.sync_profiler import profile_stage, record_rows_written
 
 
 class DatabaseBatchManager:
@@ -15,6 +21,12 @@ class DatabaseBatchManager:
     数据库批量操作管理器
 
     负责管理数据库操作的批量提交，提高性能并确保事务一致性
+
+    除逐个ORM对象的 add/update/delete 外，还支持集合式操作：
+    - insert: 同一模型的新记录合并为一条多行INSERT（可选 upsert）
+    - bulk_update: 按主键映射批量更新（bulk_update_mappings）
+    - touch: 相同取值的字段更新合并为一条 UPDATE ... WHERE id IN (...)
+    每个批次在独立的SAVEPOINT中执行，单个批次失败只回滚该批次。
     """
 
     def __init__(self, batch_size: int = 100, logger: Any | None = None, instance_name: str = ""):
@@ -55,7 +67,84 @@ class DatabaseBatchManager:
             entity: 数据库实体对象
             description: 操作描述，用于日志记录
         """
-        self.pending_operations.append({"type": operation_type, "entity": entity, "description": description})
+        self._queue_operation({"type": operation_type, "entity": entity, "description": description})
+
+    def add_insert(
+        self,
+        entity: Any,  # noqa: ANN401
+        description: str = "",
+        *,
+        conflict_keys: tuple[str, ...] | None = None,
+        ignore_conflicts: bool = False,
+        stage: str = "persist",
+    ) -> None:
+        """
+        添加多行INSERT操作，提交时同一模型的记录合并为一条INSERT语句
+
+        Args:
+            entity: 未持久化的模型对象（只读取其列属性，不加入session）
+            description: 操作描述，用于日志记录
+            conflict_keys: 唯一约束列，指定时使用数据库方言的 upsert（ON CONFLICT / ON DUPLICATE KEY UPDATE），
+                同一批次内唯一键相同的记录只保留最后一条
+            ignore_conflicts: 与 conflict_keys 一起使用，唯一键冲突时保留已有记录而不更新（内容寻址的不可变记录）
+            stage: 同步剖析中该INSERT计入的阶段（如变更日志写入计入 changelog）
+        """
+        self._queue_operation(
+            {
+                "type": "insert",
+                "model": type(entity),
+                "row": self._entity_to_row(entity),
+                "conflict_keys": conflict_keys,
+                "ignore_conflicts": ignore_conflicts,
+                "stage": stage,
+                "description": description,
+            }
+        )
+
+    def add_bulk_update(self, model: Any, mapping: dict[str, Any], description: str = "") -> None:  # noqa: ANN401
+        """
+        添加按主键的批量更新操作
+
+        Args:
+            model: 模型类
+            mapping: 包含主键 id 和待更新字段的映射
+            description: 操作描述，用于日志记录
+        """
+        self._queue_operation({"type": "bulk_update", "model": model, "mapping": mapping, "description": description})
+
+    def add_touch(
+        self,
+        model: Any,  # noqa: ANN401
+        entity_id: int,
+        values: dict[str, Any],
+        description: str = "",
+        *,
+        scope: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        添加字段刷新操作，提交时相同 values/scope 的记录合并为一条 UPDATE ... WHERE id IN (...)
+
+        Args:
+            model: 模型类
+            entity_id: 记录主键
+            values: 待更新的字段和取值
+            description: 操作描述，用于日志记录
+            scope: 附加的等值过滤条件（如 instance_id）
+        """
+        self._queue_operation(
+            {
+                "type": "touch",
+                "model": model,
+                "entity_id": entity_id,
+                "values": tuple(sorted(values.items())),
+                "scope": tuple(sorted((scope or {}).items())),
+                "description": description,
+            }
+        )
+
+    def _queue_operation(self, operation: dict[str, Any]) -> None:
+        """加入批次队列，达到批次大小时自动提交"""
+        self.pending_operations.append(operation)
 
         self.total_operations += 1
 
@@ -63,6 +152,100 @@ class DatabaseBatchManager:
         if len(self.pending_operations) >= self.batch_size:
             self.commit_batch()
 
+    @staticmethod
+    def _entity_to_row(entity: Any) -> dict[str, Any]:  # noqa: ANN401
+        """
+        提取模型对象已赋值的列，未赋值（或赋值None且有默认值）的列交由INSERT默认值处理；
+        主键只在显式赋值时写入（自增主键交由数据库生成）
+        """
+        assigned = sa_inspect(entity).dict
+        row = {}
+        for attr in sa_inspect(type(entity)).column_attrs:
+            column = attr.columns[0]
+            if attr.key not in assigned:
+                continue
+            value = assigned[attr.key]
+            if value is None and (
+                column.primary_key or column.default is not None or column.server_default is not None
+            ):
+                continue
+            row[attr.key] = value
+        return row
+
+    @staticmethod
+    def _build_insert_statement(
+        model: Any,  # noqa: ANN401
+        rows: list[dict[str, Any]],
+        conflict_keys: tuple[str, ...] | None,
+        *,
+        ignore_conflicts: bool = False,
+    ) -> Any:  # noqa: ANN401
+        """构建多行INSERT语句，指定唯一约束列时按方言生成 upsert（或忽略冲突）"""
+        dialect = db.session.get_bind().dialect.name
+        if not conflict_keys or dialect not in ("postgresql", "sqlite", "mysql"):
+            return insert(model)
+
+        update_keys = sorted(set().union(*rows) - set(conflict_keys))
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+            stmt = mysql_insert(model)
+            if ignore_conflicts:
+                # 唯一键赋值为自身，冲突时不修改已有记录
+                return stmt.on_duplicate_key_update({key: stmt.inserted[key] for key in conflict_keys})
+            return stmt.on_duplicate_key_update({key: stmt.inserted[key] for key in update_keys})
+
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = dialect_insert(model)
+        if ignore_conflicts:
+            return stmt.on_conflict_do_nothing(index_elements=list(conflict_keys))
+        return stmt.on_conflict_do_update(
+            index_elements=list(conflict_keys), set_={key: stmt.excluded[key] for key in update_keys}
+        )
+
+    def _execute_set_operations(self, operations: list[dict[str, Any]]) -> None:
+        """执行集合式操作：多行INSERT、bulk_update_mappings、合并的字段刷新UPDATE"""
+        inserts = defaultdict(list)
+        updates = defaultdict(list)
+        touches = defaultdict(list)
+        for operation in operations:
+            if operation["type"] == "insert":
+                group = (
+                    operation["model"],
+                    operation["conflict_keys"],
+                    operation["ignore_conflicts"],
+                    operation["stage"],
+                )
+                inserts[group].append(operation["row"])
+            elif operation["type"] == "bulk_update":
+                updates[operation["model"]].append(operation["mapping"])
+            elif operation["type"] == "touch":
+                touches[(operation["model"], operation["scope"], operation["values"])].append(operation["entity_id"])
+
+        for (model, conflict_keys, ignore_conflicts, stage), queued_rows in inserts.items():
+            rows = queued_rows
+            if conflict_keys:
+                # 同一语句中唯一键重复时 ON CONFLICT 会报错，按唯一键去重（保留最后一条）
+                rows = list({tuple(row.get(key) for key in conflict_keys): row for row in queued_rows}.values())
+            with profile_stage(stage):
+                statement = self._build_insert_statement(model, rows, conflict_keys, ignore_conflicts=ignore_conflicts)
+                db.session.execute(statement, rows)
+                record_rows_written(len(rows))
+
+        for model, mappings in updates.items():
+            db.session.bulk_update_mappings(model, mappings)
+            record_rows_written(len(mappings))
+
+        for (model, scope, values), entity_ids in touches.items():
+            query = db.session.query(model).filter(model.id.in_(entity_ids))
+            for key, value in scope:
+                query = query.filter(getattr(model, key) == value)
+            record_rows_written(query.update(dict(values), synchronize_session=False))
+
     def commit_batch(self) -> bool:
         """
         提交当前批次的所有操作
@@ -73,6 +256,9 @@ class DatabaseBatchManager:
         if not self.pending_operations:
             return True
 
+        # 同步已取消或超时时不再写入新批次（抛出 SyncCancelled，由 __exit__ 或调用方回滚未提交操作）
+        check_cancelled()
+
         self.current_batch += 1
         batch_size = len(self.pending_operations)
 
@@ -86,32 +272,43 @@ class DatabaseBatchManager:
                 total_operations=self.total_operations,
             )
 
-            # 执行所有操作
-            for operation in self.pending_operations:
-                try:
-                    if operation["type"] == "add":
-                        db.session.add(operation["entity"])
-                    elif operation["type"] == "update":
-                        # 对于更新操作，实体已经在session中，只需要确保修改被追踪
-                        db.session.merge(operation["entity"])
-                    elif operation["type"] == "delete":
-                        db.session.delete(operation["entity"])
-
-                    self.successful_operations += 1
-
-                except Exception as op_error:
-                    self.failed_operations += 1
-                    self.logger.error(
-                        "批次操作失败: %s",
-                        operation["description"],
-                        module="database_batch_manager",
-                        instance_name=self.instance_name,
-                        error=str(op_error),
-                    )
-                    # 继续处理其他操作，不因单个失败而停止
-
-            # 提交事务
-            db.session.commit()
+            # 每个批次在SAVEPOINT中执行，失败时只回滚当前批次
+            with profile_stage("persist"), db.session.begin_nested():
+                set_operations = []
+                for operation in self.pending_operations:
+                    if operation["type"] in ("insert", "bulk_update", "touch"):
+                        set_operations.append(operation)
+                        continue
+                    try:
+                        if operation["type"] == "add":
+                            db.session.add(operation["entity"])
+                        elif operation["type"] == "update":
+                            # 对于更新操作，实体已经在session中，只需要确保修改被追踪
+                            db.session.merge(operation["entity"])
+                        elif operation["type"] == "delete":
+                            db.session.delete(operation["entity"])
+
+                        self.successful_operations += 1
+
+                    except Exception as op_error:
+                        self.failed_operations += 1
+                        self.logger.error(
+                            "批次操作失败: %s",
+                            operation["description"],
+                            module="database_batch_manager",
+                            instance_name=self.instance_name,
+                            error=str(op_error),
+                        )
+                        # 继续处理其他操作，不因单个失败而停止
+
+                db.session.flush()
+                self._execute_set_operations(set_operations)
+                self.successful_operations += len(set_operations)
+
+            # 提交事务（持有实例同步租约时先在同一事务内校验防护令牌，租约被接管则放弃本批次）
+            with profile_stage("commit"):
+                fence_current_lease()
+                db.session.commit()
 
             self.logger.info(
                 "批次 %s 提交成功",
@@ -136,8 +333,9 @@ class DatabaseBatchManager:
                 error=str(e),
             )
 
-            # 回滚当前事务
-            db.session.rollback()
+            # SAVEPOINT已自动回滚当前批次；会话仍处于失败状态时（如提交阶段出错）回滚整个事务
+            if not db.session.is_active:
+                db.session.rollback()
 
             # 清空失败的批次
             self.pending_operations.clear()
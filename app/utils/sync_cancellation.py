@@ -0,0 +1,164 @@
+"""
+鲸落 - 同步取消与超时
+协作式取消令牌：编排器为每个实例同步创建令牌，适配器、远程查询和批量写入在检查点观察取消请求和实例超时
+"""
+
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+import yaml
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+CANCEL_REASON_CANCELLED = "cancelled"
+CANCEL_REASON_DEADLINE = "deadline-exceeded"
+CANCEL_REASON_LEASE_LOST = "lease-lost"
+
+_current_token: ContextVar["CancellationToken | None"] = ContextVar("sync_cancellation_token", default=None)
+
+# 本进程内正在执行的令牌，取消会话时直接通知，无需等待下一次轮询
+_active_tokens_lock = threading.Lock()
+_active_tokens: dict[str, set["CancellationToken"]] = {}
+
+
+@lru_cache(maxsize=1)
+def load_cancellation_config() -> dict[str, float]:
+    """加载取消配置（account_sync.cancellation），配置文件缺失或格式错误时使用默认值"""
+    cancellation = {"instance_timeout_seconds": 1800.0, "poll_seconds": 2.0}
+    if not os.path.exists(CONFIG_FILE):
+        return cancellation
+    try:
+        with open(CONFIG_FILE, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        loaded = (config.get("account_sync") or {}).get("cancellation") or {}
+        for key in cancellation:
+            cancellation[key] = max(0.0, float(loaded.get(key, cancellation[key])))
+    except Exception:
+        return cancellation
+    return cancellation
+
+
+class SyncCancelled(BaseException):
+    """
+    实例同步被取消或超时
+
+    与 KeyboardInterrupt 一样继承 BaseException：同步链路中大量 ``except Exception`` 用于容错单个账户/查询，
+    取消信号必须穿过这些处理器，只由编排器捕获；with/finally 中的回滚和连接归还照常执行。
+    """
+
+    def __init__(self, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+
+
+class CancellationToken:
+    """
+    单个实例同步的取消令牌
+
+    - 会话取消：本进程内由 cancel_session 直接通知；其他进程（队列工作进程）按 poll_seconds 轮询会话状态
+    - 超时：start_deadline 之后超过 timeout_seconds 视为超时（0 表示不限制）
+    """
+
+    def __init__(self, session_id: str | None = None, *, poll_seconds: float | None = None) -> None:
+        self.session_id = session_id
+        self.poll_seconds = load_cancellation_config()["poll_seconds"] if poll_seconds is None else poll_seconds
+        self.deadline: float | None = None
+        self._timeout_seconds: float | None = None
+        self._reason: str | None = None
+        self._next_poll_at = 0.0
+
+    def start_deadline(self, timeout_seconds: float | None) -> None:
+        """从现在开始计算超时，timeout_seconds 为空或0时不限制"""
+        self._timeout_seconds = timeout_seconds or None
+        self.deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+
+    def cancel(self, reason: str = CANCEL_REASON_CANCELLED) -> None:
+        """请求取消"""
+        if self._reason is None:
+            self._reason = reason
+
+    @property
+    def reason(self) -> str | None:
+        """取消原因，未取消返回None"""
+        if self._reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self._reason = CANCEL_REASON_DEADLINE
+        if self._reason is None and self.session_id and time.monotonic() >= self._next_poll_at:
+            self._next_poll_at = time.monotonic() + self.poll_seconds
+            if _session_cancelled(self.session_id):
+                self._reason = CANCEL_REASON_CANCELLED
+        return self._reason
+
+    def check(self) -> None:
+        """检查点：已取消或超时时抛出 SyncCancelled"""
+        reason = self.reason
+        if reason == CANCEL_REASON_DEADLINE:
+            msg = f"实例同步超时（超过 {self._timeout_seconds or 0:g} 秒），已中止"
+            raise SyncCancelled(reason, msg)
+        if reason is not None:
+            raise SyncCancelled(reason, "同步会话已取消，实例同步已中止")
+
+
+def _session_cancelled(session_id: str) -> bool:
+    """
+    查询会话是否已取消
+
+    使用独立连接读取，不影响当前同步事务；查询失败时视为未取消。
+    """
+    from app import db
+    from app.models.sync_session import SyncSession
+
+    try:
+        with db.engine.connect() as conn:
+            status = conn.execute(
+                db.select(SyncSession.status).where(SyncSession.session_id == session_id)
+            ).scalar_one_or_none()
+        return status == "cancelled"
+    except Exception:
+        return False
+
+
+@contextmanager
+def sync_cancellation(token: CancellationToken) -> Iterator[CancellationToken]:
+    """在当前上下文中启用取消令牌（通过 contextvars.copy_context 传递到工作线程）"""
+    reset_token = _current_token.set(token)
+    if token.session_id:
+        with _active_tokens_lock:
+            _active_tokens.setdefault(token.session_id, set()).add(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset_token)
+        if token.session_id:
+            with _active_tokens_lock:
+                tokens = _active_tokens.get(token.session_id)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del _active_tokens[token.session_id]
+
+
+def cancel_session_tokens(session_id: str) -> int:
+    """
+    通知本进程内该会话正在执行的所有令牌
+
+    Returns:
+        int: 通知的令牌数
+    """
+    with _active_tokens_lock:
+        tokens = list(_active_tokens.get(session_id, ()))
+    for token in tokens:
+        token.cancel()
+    return len(tokens)
+
+
+def check_cancelled() -> None:
+    """检查点：当前上下文的同步已取消或超时时抛出 SyncCancelled，无令牌时不做任何事"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
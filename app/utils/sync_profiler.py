@@ -0,0 +1,286 @@
+"""
+鲸落 - 同步阶段性能剖析
+记录账户同步各阶段的耗时、远程查询次数、获取行数和内存峰值
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any
+
+import yaml
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "account_sync.yaml")
+
+# 同步阶段（按流程顺序，汇总时也按该顺序输出）
+SYNC_STAGES = ("connect", "version", "change_token", "fetch", "format", "diff", "persist", "changelog", "commit")
+
+_current_profiler: ContextVar["SyncProfiler | None"] = ContextVar("sync_profiler", default=None)
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+@lru_cache(maxsize=1)
+def load_profiling_config() -> dict[str, bool]:
+    """加载剖析配置（account_sync.profiling），配置文件缺失或格式错误时使用默认值"""
+    profiling = {"enabled": True, "trace_memory": False}
+    if not os.path.exists(CONFIG_FILE):
+        return profiling
+    try:
+        with open(CONFIG_FILE, encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+        loaded = (config.get("account_sync") or {}).get("profiling") or {}
+        profiling["enabled"] = bool(loaded.get("enabled", profiling["enabled"]))
+        profiling["trace_memory"] = bool(loaded.get("trace_memory", profiling["trace_memory"]))
+    except Exception:
+        return profiling
+    return profiling
+
+
+def _stage_order(name: str) -> tuple[int, str]:
+    """按同步流程顺序排列阶段，未知阶段排在最后"""
+    return (SYNC_STAGES.index(name) if name in SYNC_STAGES else len(SYNC_STAGES), name)
+
+
+def _max_rss_kb() -> int | None:
+    """进程常驻内存历史峰值（KB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class SyncProfiler:
+    """
+    单次实例同步的阶段剖析器
+
+    - 阶段计时为独占时间：嵌套阶段运行期间暂停外层阶段计时，各阶段耗时之和等于总耗时
+    - 远程查询/行数计入当前最内层阶段（由连接的 execute_query 上报）
+    - 内存峰值：启用 trace_memory 时为 tracemalloc 统计的 Python 分配峰值，
+      否则为阶段结束时的进程 RSS 历史峰值；多实例并发同步时两者均为进程级近似值
+    """
+
+    def __init__(self, *, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.stages: dict[str, dict[str, Any]] = {}
+        self._stack: list[list[Any]] = []
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._finished_at: float | None = None
+
+    def _stage_stats(self, name: str) -> dict[str, Any]:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = {"wall_ms": 0.0, "calls": 0, "queries": 0, "rows": 0, "rows_written": 0, "peak_memory_kb": None}
+            self.stages[name] = stats
+        return stats
+
+    def _close_segment(self, frame: list[Any], ended_at: float) -> None:
+        """结算栈帧当前计时片段的耗时和内存峰值"""
+        name, segment_started_at, memory_base = frame
+        stats = self._stage_stats(name)
+        stats["wall_ms"] += (ended_at - segment_started_at) * 1000
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak_kb = max(0, tracemalloc.get_traced_memory()[1] - memory_base) // 1024
+        else:
+            peak_kb = _max_rss_kb()
+        if peak_kb is not None:
+            stats["peak_memory_kb"] = max(stats["peak_memory_kb"] or 0, peak_kb)
+
+    def _open_segment(self, name: str) -> list[Any]:
+        memory_base = 0
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            memory_base = tracemalloc.get_traced_memory()[0]
+        return [name, time.perf_counter(), memory_base]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """记录一个阶段（可嵌套，外层阶段在内层运行期间暂停计时）"""
+        with self._lock:
+            if self._stack:
+                self._close_segment(self._stack[-1], time.perf_counter())
+            self._stage_stats(name)["calls"] += 1
+            self._stack.append(self._open_segment(name))
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._close_segment(self._stack.pop(), time.perf_counter())
+                if self._stack:
+                    self._stack[-1] = self._open_segment(self._stack[-1][0])
+
+    def wrap_iter(self, name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """每次从迭代器取值的耗时计入指定阶段（用于流式获取/格式化）"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def record_query(self, rows: int) -> None:
+        """记录一次远程查询及其返回行数"""
+        with self._lock:
+            stats = self._stage_stats(self._stack[-1][0] if self._stack else "other")
+            stats["queries"] += 1
+            stats["rows"] += rows
+
+    def record_rows_written(self, rows: int) -> None:
+        """记录写入本地数据库的行数"""
+        with self._lock:
+            self._stage_stats(self._stack[-1][0] if self._stack else "other")["rows_written"] += rows
+
+    def finish(self) -> None:
+        self._finished_at = time.perf_counter()
+
+    def to_dict(self) -> dict[str, Any]:
+        """导出剖析结果（写入 SyncInstanceRecord.sync_details）"""
+        ended_at = self._finished_at or time.perf_counter()
+        ordered = sorted(self.stages, key=_stage_order)
+        stages = {}
+        for name in ordered:
+            stats = dict(self.stages[name])
+            stats["wall_ms"] = round(stats["wall_ms"], 2)
+            stages[name] = stats
+        return {
+            "total_ms": round((ended_at - self._started_at) * 1000, 2),
+            "memory_source": "tracemalloc" if self.trace_memory else "rusage",
+            "stages": stages,
+        }
+
+
+def _start_tracemalloc() -> bool:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+    return True
+
+
+def _stop_tracemalloc() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+@contextmanager
+def sync_profile() -> Iterator[SyncProfiler | None]:
+    """
+    在当前上下文中启用阶段剖析
+
+    剖析关闭时返回None，各阶段埋点均为空操作。
+    """
+    config = load_profiling_config()
+    if not config["enabled"]:
+        yield None
+        return
+
+    trace_memory = config["trace_memory"] and _start_tracemalloc()
+    profiler = SyncProfiler(trace_memory=trace_memory)
+    token = _current_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        profiler.finish()
+        _current_profiler.reset(token)
+        if trace_memory:
+            _stop_tracemalloc()
+
+
+def current_profiler() -> SyncProfiler | None:
+    """获取当前上下文中的剖析器"""
+    return _current_profiler.get()
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[None]:
+    """在当前剖析器中记录一个阶段，未启用剖析时为空操作"""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name):
+        yield
+
+
+def profile_iter(name: str, iterable: Iterable[Any]) -> Iterable[Any]:
+    """将迭代器取值耗时计入指定阶段，未启用剖析时原样返回"""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return iterable
+    return profiler.wrap_iter(name, iterable)
+
+
+def record_remote_query(rows: int) -> None:
+    """上报一次远程查询（由 DatabaseConnection.execute_query 调用）"""
+    profiler = _current_profiler.get()
+    if profiler is not None:
+        profiler.record_query(rows)
+
+
+def record_rows_written(rows: int) -> None:
+    """上报写入本地数据库的行数"""
+    profiler = _current_profiler.get()
+    if profiler is not None:
+        profiler.record_rows_written(rows)
+
+
+def summarize_stage_profiles(profiles: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """
+    汇总多个实例的阶段剖析结果（写入 SyncSession.stage_summary）
+
+    每个阶段累加耗时、查询数、行数，并记录耗时最长的实例耗时和内存峰值最大值。
+    """
+    stages: dict[str, dict[str, Any]] = {}
+    instance_count = 0
+    total_ms = 0.0
+    for profile in profiles:
+        if not profile or not profile.get("stages"):
+            continue
+        instance_count += 1
+        total_ms += profile.get("total_ms", 0)
+        for name, stats in profile["stages"].items():
+            summary = stages.setdefault(
+                name,
+                {
+                    "wall_ms": 0.0,
+                    "max_wall_ms": 0.0,
+                    "queries": 0,
+                    "rows": 0,
+                    "rows_written": 0,
+                    "peak_memory_kb": None,
+                },
+            )
+            summary["wall_ms"] += stats.get("wall_ms", 0)
+            summary["max_wall_ms"] = max(summary["max_wall_ms"], stats.get("wall_ms", 0))
+            summary["queries"] += stats.get("queries", 0)
+            summary["rows"] += stats.get("rows", 0)
+            summary["rows_written"] += stats.get("rows_written", 0)
+            if stats.get("peak_memory_kb") is not None:
+                summary["peak_memory_kb"] = max(summary["peak_memory_kb"] or 0, stats["peak_memory_kb"])
+
+    for summary in stages.values():
+        summary["wall_ms"] = round(summary["wall_ms"], 2)
+        summary["max_wall_ms"] = round(summary["max_wall_ms"], 2)
+    ordered = sorted(stages, key=_stage_order)
+    return {
+        "instance_count": instance_count,
+        "total_ms": round(total_ms, 2),
+        "stages": {name: stages[name] for name in ordered},
+    }
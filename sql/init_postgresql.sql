@@ -186,6 +186,12 @@ CREATE TABLE IF NOT EXISTS current_account_sync_data (
     -- 通用扩展字段
     type_specific JSONB,
     
+    -- 权限指纹（规范化权限数据的SHA-256）
+    permission_hash VARCHAR(64),
+    
+    -- 权限快照键（权限字段存放在 permission_snapshots，行内权限列为空）
+    permission_digest VARCHAR(64),
+    
     -- 时间戳和状态字段
     last_sync_time TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     last_change_type VARCHAR(20) DEFAULT 'add',
@@ -197,6 +203,28 @@ CREATE TABLE IF NOT EXISTS current_account_sync_data (
     last_classification_batch_id VARCHAR(36)
 );
 
+-- 升级已有数据库：CREATE TABLE IF NOT EXISTS 不会为已存在的表补充新增列
+ALTER TABLE current_account_sync_data ADD COLUMN IF NOT EXISTS permission_hash VARCHAR(64);
+ALTER TABLE current_account_sync_data ADD COLUMN IF NOT EXISTS permission_digest VARCHAR(64);
+
+-- 权限快照表（内容寻址：键为 db_type + 规范化权限字段的SHA-256，内容相同的账户共享同一行）
+CREATE TABLE IF NOT EXISTS permission_snapshots (
+    digest VARCHAR(64) PRIMARY KEY,
+    db_type VARCHAR(20) NOT NULL,
+    permissions JSONB NOT NULL,
+    -- 以 permission_configs 为字典的权限位图及编码时的字典指纹
+    privilege_vocabulary VARCHAR(16),
+    privilege_bits JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 升级已有数据库：补充权限位图列
+ALTER TABLE permission_snapshots ADD COLUMN IF NOT EXISTS privilege_vocabulary VARCHAR(16);
+ALTER TABLE permission_snapshots ADD COLUMN IF NOT EXISTS privilege_bits JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_permission_snapshots_db_type ON permission_snapshots(db_type);
+CREATE INDEX IF NOT EXISTS idx_permission_snapshots_privilege_vocabulary ON permission_snapshots(privilege_vocabulary);
+
 -- 账户同步数据表索引
 CREATE UNIQUE INDEX IF NOT EXISTS uq_current_account_sync ON current_account_sync_data(instance_id, db_type, username);
 CREATE INDEX IF NOT EXISTS idx_instance_dbtype ON current_account_sync_data(instance_id, db_type);
@@ -206,6 +234,7 @@ CREATE INDEX IF NOT EXISTS idx_session_id ON current_account_sync_data(session_i
 CREATE INDEX IF NOT EXISTS idx_last_sync_time ON current_account_sync_data(last_sync_time);
 CREATE INDEX IF NOT EXISTS idx_last_change_time ON current_account_sync_data(last_change_time);
 CREATE INDEX IF NOT EXISTS idx_deleted_time ON current_account_sync_data(deleted_time);
+CREATE INDEX IF NOT EXISTS idx_permission_digest ON current_account_sync_data(permission_digest);
 
 -- ============================================================================
 -- 7. 账户分类管理模块
@@ -297,11 +326,15 @@ CREATE TABLE IF NOT EXISTS sync_sessions (
     total_instances INTEGER DEFAULT 0,
     successful_instances INTEGER DEFAULT 0,
     failed_instances INTEGER DEFAULT 0,
+    stage_summary JSONB,
     created_by INTEGER,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- 升级已有数据库：补充阶段耗时汇总列
+ALTER TABLE sync_sessions ADD COLUMN IF NOT EXISTS stage_summary JSONB;
+
 -- 同步实例记录表
 CREATE TABLE IF NOT EXISTS sync_instance_records (
     id SERIAL PRIMARY KEY,
@@ -321,6 +354,59 @@ CREATE TABLE IF NOT EXISTS sync_instance_records (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- 实例同步状态表（账户目录变更令牌、自适应同步节奏统计）
+CREATE TABLE IF NOT EXISTS instance_sync_states (
+    id SERIAL PRIMARY KEY,
+    instance_id INTEGER NOT NULL UNIQUE REFERENCES instances(id) ON DELETE CASCADE,
+    account_catalog_token VARCHAR(64),
+    last_full_sync_at TIMESTAMP WITH TIME ZONE,
+    last_sync_at TIMESTAMP WITH TIME ZONE,
+    change_rate_per_hour DOUBLE PRECISION,
+    avg_sync_seconds DOUBLE PRECISION,
+    failure_streak INTEGER NOT NULL DEFAULT 0,
+    sync_interval_seconds INTEGER,
+    next_due_at TIMESTAMP WITH TIME ZONE,
+    lease_token BIGINT NOT NULL DEFAULT 0,
+    lease_owner VARCHAR(128),
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    last_result JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 升级已有数据库：补充自适应同步节奏列
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS last_sync_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS change_rate_per_hour DOUBLE PRECISION;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS avg_sync_seconds DOUBLE PRECISION;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS failure_streak INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS sync_interval_seconds INTEGER;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS next_due_at TIMESTAMP WITH TIME ZONE;
+
+-- 升级已有数据库：补充单实例同步租约列
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS lease_token BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(128);
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE instance_sync_states ADD COLUMN IF NOT EXISTS last_result JSONB;
+
+-- 同步任务队列表（队列模式下由同步工作进程认领执行）
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id SERIAL PRIMARY KEY,
+    session_id VARCHAR(36) NOT NULL REFERENCES sync_sessions(session_id) ON DELETE CASCADE,
+    record_id INTEGER NOT NULL UNIQUE REFERENCES sync_instance_records(id) ON DELETE CASCADE,
+    instance_id INTEGER NOT NULL REFERENCES instances(id) ON DELETE CASCADE,
+    sync_type VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id VARCHAR(128),
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    started_at TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
+    error_message TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- 同步会话表索引
 CREATE INDEX IF NOT EXISTS idx_sync_sessions_session_id ON sync_sessions(session_id);
 CREATE INDEX IF NOT EXISTS idx_sync_sessions_sync_type ON sync_sessions(sync_type);
@@ -335,6 +421,14 @@ CREATE INDEX IF NOT EXISTS idx_sync_instance_records_sync_category ON sync_insta
 CREATE INDEX IF NOT EXISTS idx_sync_instance_records_status ON sync_instance_records(status);
 CREATE INDEX IF NOT EXISTS idx_sync_instance_records_created_at ON sync_instance_records(created_at);
 
+-- 同步任务队列表索引（认领时按状态和租约到期时间筛选）
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_session_id ON sync_jobs(session_id);
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_instance_id ON sync_jobs(instance_id);
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_status_lease ON sync_jobs(status, lease_expires_at);
+
+-- 实例同步状态表索引（定时任务按到期时间筛选实例）
+CREATE INDEX IF NOT EXISTS idx_instance_sync_states_next_due_at ON instance_sync_states(next_due_at);
+
 -- ============================================================================
 -- 10. 自动分类批次管理模块
 -- ============================================================================
@@ -8,7 +8,7 @@
 -- 此脚本用于记录默认任务配置，实际任务由应用启动时加载
 
 -- 默认任务配置说明
--- 1. sync_accounts - 账户同步任务（每30分钟执行一次）
+-- 1. sync_accounts - 账户同步任务（每5分钟触发一次，只同步已到期的实例，到期时间由 account_sync.yaml 的 cadence 配置决定）
 -- 2. cleanup_logs - 清理旧日志任务（每天凌晨2点执行）
 
 -- 任务配置参数说明：
@@ -0,0 +1,58 @@
+"""
+鲸落 - 同步工作进程入口
+队列模式下（account_sync.queue.enabled）从应用数据库认领实例同步任务并执行，可在多个节点上同时运行
+
+用法:
+    python sync_worker.py                  # 常驻运行
+    python sync_worker.py --concurrency 4  # 单进程4个工作线程
+    python sync_worker.py --burst          # 排空队列后退出
+"""
+
+import argparse
+import os
+import signal
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+# 设置环境变量（工作进程不运行定时任务调度器，由Web进程负责创建同步轮次）
+os.environ.setdefault("FLASK_APP", "app")
+os.environ.setdefault("FLASK_ENV", "production")
+os.environ["ENABLE_SCHEDULER"] = "false"
+
+from app import create_app  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="鲸落同步工作进程")
+    parser.add_argument("--concurrency", type=int, default=1, help="工作线程数（默认1）")
+    parser.add_argument("--worker-id", help="工作进程标识（默认 主机名:进程号）")
+    parser.add_argument("--burst", action="store_true", help="队列为空时退出")
+    return parser.parse_args()
+
+
+def main() -> int:
+    """主函数"""
+    args = parse_args()
+    app = create_app()
+
+    from app.services.sync_worker import SyncWorker
+
+    worker = SyncWorker(app, worker_id=args.worker_id, concurrency=args.concurrency)
+
+    # 收到停止信号后执行完当前任务再退出，未完成的租约到期后由其他工作进程接管
+    def handle_signal(signum: int, frame: object) -> None:  # noqa: ARG001
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.run(burst=args.burst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())